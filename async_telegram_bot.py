@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Asyncio Telegram Bot for Business Match
+Same behaviour as SimpleTelegramBot, but every Telegram, OpenAI and
+ElevenLabs call is non-blocking, so one process can keep thousands of
+conversations waiting on I/O without a thread per request.
+"""
+
+import asyncio
+import time
+import logging
+
+import aiohttp
+from aiohttp import web
+
+from config import (ASYNC_MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES, UPDATE_MODE, WEBHOOK_URL, WEBHOOK_PATH,
+                    WEBHOOK_SECRET_TOKEN, WEBHOOK_HOST, WEBHOOK_PORT, OUTBOUND_MAX_RETRIES,
+                    AUDIO_JOB_WORKERS, AUDIO_JOB_QUEUE_SIZE, AUDIO_JOB_MAX_RETRIES)
+from intent_classifier import CHITCHAT, UNCLEAR, classify
+from job_queue import AsyncJobQueue
+from media_cache import extract_file_id, is_invalid_file_id_error
+from outbound_queue import backoff_delay
+from progress_reporter import AsyncProgressReporter
+from webhook_server import SECRET_TOKEN_HEADER, SUBMIT_TIMEOUT, is_valid_secret_token
+from telegram_bot_simple import (
+    SimpleTelegramBot, BUSINESS_MATCH_IMAGE_URL, BUSINESS_MATCH_IMAGE_CAPTION,
+    START_MESSAGE, HELP_TEXT, CANCEL_MESSAGE, PROGRESS_STEPS, PROGRESS_STEP_DELAY,
+    SEARCH_ERROR_MESSAGE, UNCLEAR_QUERY_MESSAGE, FOLLOW_UP_MESSAGE,
+    format_limit_message, format_match_message
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTelegramBot(SimpleTelegramBot):
+    """
+    Asyncio runtime for the bot.
+
+    Reuses the session, quota and logging helpers of SimpleTelegramBot and
+    overrides every I/O method with a coroutine; blocking SQLite calls
+    (logs, quota, offsets, media cache) run in worker threads. Updates are
+    handled as independent tasks; a per-chat lock keeps each chat in order,
+    one semaphore caps the number of updates in flight and another the
+    number accepted but not yet finished.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.session = None
+        self.max_concurrent_updates = ASYNC_MAX_CONCURRENT_UPDATES
+        self.max_queued_updates = MAX_QUEUED_UPDATES
+        self._update_slots = None
+        self._pending_slots = None
+        self._chat_locks = {}
+        self._chat_lock_users = {}
+        self._tasks = set()
+
+    def _create_runtime(self, rate_share: float):
+        """Only the audio job queue - updates are tasks and sends go straight out"""
+        self.audio_jobs = AsyncJobQueue(
+            "audio",
+            max_concurrent=AUDIO_JOB_WORKERS,
+            max_pending=AUDIO_JOB_QUEUE_SIZE,
+            max_retries=AUDIO_JOB_MAX_RETRIES
+        )
+
+    async def _post(self, method: str, form_factory=None, **kwargs) -> dict:
+        """
+        POST to the Bot API and return the decoded JSON response.
+        Waits out 429 retry_after and retries network errors and 5xx with
+        jittered backoff. Multipart bodies are passed as `form_factory`,
+        since a FormData can only be sent once.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if form_factory is not None:
+                kwargs["data"] = form_factory()
+            try:
+                async with self.session.post(f"{self.base_url}/{method}", **kwargs) as response:
+                    result = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt > OUTBOUND_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"🔁 {method} failed ({e}), retry {attempt}/{OUTBOUND_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            error_code = result.get("error_code") if isinstance(result, dict) else None
+            if error_code == 429 and attempt <= OUTBOUND_MAX_RETRIES:
+                retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+                logger.warning(f"⏳ Telegram rate limit on {method}, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            if error_code is not None and error_code >= 500 and attempt <= OUTBOUND_MAX_RETRIES:
+                delay = backoff_delay(attempt)
+                logger.warning(f"🔁 {method} failed ({error_code}), retry {attempt}/{OUTBOUND_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            return result
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: str = "Markdown"):
+        """Send a message to a chat"""
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode
+        }
+
+        try:
+            return await self._post("sendMessage", json=data)
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
+            return None
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, parse_mode: str = "Markdown"):
+        """Replace the text of a previously sent message"""
+        data = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": parse_mode
+        }
+
+        try:
+            return await self._post("editMessageText", json=data)
+        except Exception as e:
+            logger.error(f"Error editing message: {e}")
+            return None
+
+    async def send_photo(self, chat_id: int, photo_url: str, caption: str = ""):
+        """Send a photo to a chat"""
+        data = {
+            "chat_id": chat_id,
+            "photo": photo_url,
+            "caption": caption,
+            "parse_mode": "Markdown"
+        }
+
+        try:
+            logger.info(f"Sending photo to chat {chat_id}: {photo_url}")
+            result = await self._post("sendPhoto", json=data)
+            if result.get("ok"):
+                logger.info(f"✅ Photo sent successfully to chat {chat_id}")
+            else:
+                logger.error(f"❌ Failed to send photo: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"Error sending photo: {e}")
+            return None
+
+    async def send_audio_stream(self, chat_id: int, summary_text: str) -> bool:
+        """Stream the audio of a summary to a chat while it is synthesized"""
+        if self.audio_handler.audio_format == "ogg":
+            method, field, extra = "sendVoice", "voice", {}
+        else:
+            method, field = "sendAudio", "audio"
+            extra = {'title': 'Підсумок збігу', 'performer': 'Business Match Bot'}
+
+        def build_form():
+            form = aiohttp.FormData()
+            form.add_field('chat_id', str(chat_id))
+            for name, value in extra.items():
+                form.add_field(name, value)
+            form.add_field(field, self.audio_handler.stream_audio_async(summary_text, self.session),
+                           filename=self.audio_handler.audio_filename(summary_text),
+                           content_type=self.audio_handler.content_type)
+            return form
+
+        data = {'chat_id': chat_id, **extra}
+        asset_key = f"{method}:{self.audio_handler.content_key(summary_text)}"
+        try:
+            result = await self.send_cached_media(method, field, asset_key, data, form_factory=build_form)
+        except Exception as e:
+            logger.error(f"Error sending audio: {e}")
+            return False
+        if result.get("ok"):
+            return True
+        logger.error(f"❌ Failed to send audio: {result}")
+        return False
+
+    async def send_cached_media(self, method: str, field: str, asset_key: str, data: dict,
+                                source: str = None, form_factory=None) -> dict:
+        """Send media by its cached Telegram file_id, falling back to `source` or an upload"""
+        file_id = await asyncio.to_thread(self.media_cache.get, asset_key)
+        if file_id:
+            result = await self._post(method, json={**data, field: file_id})
+            if not is_invalid_file_id_error(result):
+                return result
+            await asyncio.to_thread(self.media_cache.invalidate, asset_key, file_id)
+
+        if form_factory is not None:
+            result = await self._post(method, form_factory=form_factory)
+        else:
+            result = await self._post(method, json={**data, field: source})
+
+        file_id = extract_file_id(method, result)
+        if file_id:
+            await asyncio.to_thread(self.media_cache.store, asset_key, file_id)
+        return result
+
+    async def send_banner(self, chat_id: int):
+        """Send the Business Match image (by file_id after the first upload)"""
+        data = {
+            "chat_id": chat_id,
+            "caption": BUSINESS_MATCH_IMAGE_CAPTION,
+            "parse_mode": "Markdown"
+        }
+        try:
+            result = await self.send_cached_media("sendPhoto", "photo", f"photo:{BUSINESS_MATCH_IMAGE_URL}",
+                                                  data, source=BUSINESS_MATCH_IMAGE_URL)
+        except Exception as e:
+            logger.error(f"Error sending photo: {e}")
+            return None
+        if result.get("ok"):
+            logger.info(f"✅ Photo sent successfully to chat {chat_id}")
+        else:
+            logger.error(f"❌ Failed to send photo: {result}")
+        return result
+
+    async def send_typing(self, chat_id: int):
+        """Send typing indicator"""
+        data = {
+            "chat_id": chat_id,
+            "action": "typing"
+        }
+
+        try:
+            await self._post("sendChatAction", json=data)
+        except Exception as e:
+            logger.error(f"Error sending typing: {e}")
+
+    async def get_updates(self):
+        """Get new updates from Telegram (long polling)"""
+        params = {
+            "offset": self.last_update_id + 1,
+            "timeout": 10,
+            "allowed_updates": '["message"]'
+        }
+
+        try:
+            async with self.session.get(f"{self.base_url}/getUpdates", params=params,
+                                        timeout=aiohttp.ClientTimeout(total=35)) as response:
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                logger.error(f"HTTP {response.status}: {await response.text()}")
+                return None
+        except asyncio.TimeoutError:
+            # Timeout is normal for long polling
+            return {"ok": True, "result": []}
+        except Exception as e:
+            logger.error(f"Error getting updates: {e}")
+            return None
+
+    async def handle_start_command(self, chat_id: int, user_id: int, user_info: dict = None):
+        """Handle /start command"""
+        logger.info(f"🚀 Starting /start command for user {user_id} in chat {chat_id}")
+
+        if user_info:
+            await asyncio.to_thread(
+                self.log_user,
+                user_id,
+                user_info.get('username'),
+                user_info.get('first_name'),
+                user_info.get('last_name')
+            )
+
+        await asyncio.to_thread(self.log_message, user_id, "/start", False, "start")
+
+        await self.send_banner(chat_id)
+        await self.send_message(chat_id, START_MESSAGE)
+
+    async def handle_text_message(self, chat_id: int, user_id: int, text: str):
+        """Handle text messages"""
+        logger.info(f"🔍 Processing text message from user {user_id}: {text[:50]}...")
+
+        await asyncio.to_thread(self.log_message, user_id, text, False, "text")
+
+        # Check if user can search (24h limit)
+        can_search, remaining_time = await asyncio.to_thread(self.can_user_search, user_id)
+        if not can_search:
+            logger.info(f"🚫 Blocking user {user_id} due to 24h limit")
+            limit_message = format_limit_message(remaining_time)
+            await self.send_message(chat_id, limit_message)
+            await asyncio.to_thread(self.log_message, user_id, limit_message, True, "text")
+            return
+
+        chatgpt_handler = self.get_user_session(user_id)
+
+        intent = classify(text)
+
+        if intent.label == UNCLEAR:
+            logger.info(f"❓ Unclear message from user {user_id}")
+            await self.send_message(chat_id, UNCLEAR_QUERY_MESSAGE)
+            return
+
+        if intent.label == CHITCHAT:
+            logger.info(f"💬 Handling non-search message from user {user_id}")
+            response = await chatgpt_handler.handle_non_search_message_async(text, intent)
+            await self.send_message(chat_id, response)
+            return
+
+        logger.info(f"🔍 Handling search query from user {user_id}")
+
+        can_search, remaining_time = await asyncio.to_thread(self.reserve_search, user_id)
+        if not can_search:
+            logger.info(f"🚫 Blocking user {user_id} due to 24h limit")
+            limit_message = format_limit_message(remaining_time)
+            await self.send_message(chat_id, limit_message)
+            await asyncio.to_thread(self.log_message, user_id, limit_message, True, "text")
+            return
+
+        progress = AsyncProgressReporter(
+            send=lambda progress_text: self.send_message(chat_id, progress_text),
+            edit=lambda message_id, progress_text: self.edit_message_text(chat_id, message_id, progress_text),
+            steps=PROGRESS_STEPS,
+            interval=PROGRESS_STEP_DELAY
+        )
+
+        logger.info(f"🔄 Calling custom model for user {user_id}...")
+        try:
+            async with progress:
+                matches_response = await chatgpt_handler.analyze_user_preferences_async(text)
+            logger.info(f"✅ Custom model response received for user {user_id}")
+        except Exception as e:
+            logger.error(f"❌ Error calling custom model for user {user_id}: {e}")
+            await asyncio.to_thread(self.refund_search, user_id)
+            await self.send_message(chat_id, SEARCH_ERROR_MESSAGE)
+            return
+
+        await self.send_message(chat_id, format_match_message(matches_response))
+        logger.info(f"✅ Sent match result to user {user_id}")
+
+        await asyncio.to_thread(self.log_search, user_id, text, matches_response)
+
+        await self.send_message(chat_id, FOLLOW_UP_MESSAGE)
+        await asyncio.to_thread(self.log_message, user_id, FOLLOW_UP_MESSAGE, True, "text")
+
+        # Audio summary is generated in the background and sent when ready
+        job_id = self.audio_jobs.submit(self.deliver_audio_summary, chat_id, user_id, matches_response, text)
+        if job_id is not None:
+            logger.info(f"🎵 Queued audio summary job {job_id} for user {user_id}")
+
+    async def deliver_audio_summary(self, chat_id: int, user_id: int, matches_response: str, text: str):
+        """
+        Background job: create the audio summary text and stream its audio to the chat.
+        Raises if it could not be sent, so the job queue retries it and marks it failed.
+        """
+        started = time.monotonic()
+        logger.info(f"🎵 Generating audio summary for user {user_id}")
+        summary_text = await self.audio_handler.create_summary_async(matches_response, text)
+
+        if not await self.send_audio_stream(chat_id, summary_text):
+            raise RuntimeError(f"audio summary for user {user_id} was not sent")
+        self.audio_handler.record_time_to_audio(time.monotonic() - started)
+        logger.info(f"✅ Audio summary sent to user {user_id}")
+
+    async def handle_help_command(self, chat_id: int):
+        """Handle /help command"""
+        await self.send_message(chat_id, HELP_TEXT)
+
+    async def process_update(self, update):
+        """Process a single update"""
+        try:
+            if "message" not in update:
+                return
+
+            message = update["message"]
+            chat_id = message["chat"]["id"]
+            user_id = message["from"]["id"]
+            text = message.get("text", "")
+
+            logger.info(f"Received message from user {user_id}: {text[:50]}...")
+
+            if text.startswith("/start"):
+                await self.handle_start_command(chat_id, user_id, message.get("from", {}))
+            elif text.startswith("/help"):
+                await self.handle_help_command(chat_id)
+            elif text.startswith("/cancel"):
+                await self.send_message(chat_id, CANCEL_MESSAGE)
+            elif text.strip():
+                await self.handle_text_message(chat_id, user_id, text)
+
+        except Exception as e:
+            logger.error(f"Error processing update: {e}")
+
+    async def _run_update(self, update):
+        """Process an update in order with other updates from the same chat"""
+        chat_id = update.get("message", {}).get("chat", {}).get("id")
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        self._chat_lock_users[chat_id] = self._chat_lock_users.get(chat_id, 0) + 1
+
+        try:
+            async with lock:
+                async with self._update_slots:
+                    await self.process_update(update)
+                await asyncio.to_thread(self.offset_tracker.complete, update["update_id"])
+        finally:
+            self._chat_lock_users[chat_id] -= 1
+            if not self._chat_lock_users[chat_id]:
+                del self._chat_lock_users[chat_id]
+                del self._chat_locks[chat_id]
+
+    async def _schedule_update(self, update, timeout: float = None) -> bool:
+        """Start a task for an update once one of the pending slots is free"""
+        try:
+            await asyncio.wait_for(self._pending_slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        task = asyncio.create_task(self._run_update(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._pending_slots.release())
+        return True
+
+    async def accept_update(self, update: dict, timeout: float = None) -> bool:
+        """
+        Deduplicate an incoming update (polling or webhook) and schedule it.
+        Returns False if no pending slot freed up within `timeout` seconds.
+        """
+        update_id = update["update_id"]
+
+        if not self.processed_updates.add(update_id):
+            logger.info(f"🛡️ Skipping duplicate update {update_id}")
+            return True
+
+        await asyncio.to_thread(self.offset_tracker.begin, update)
+        if not await self._schedule_update(update, timeout):
+            logger.warning(f"⚠️ Update queue full, rejected update {update_id}")
+            await asyncio.to_thread(self.offset_tracker.cancel, update_id)
+            self.processed_updates.discard(update_id)
+            return False
+        return True
+
+    async def _replay_pending_updates(self):
+        """Re-schedule updates a previous process accepted but never finished"""
+        pending = await asyncio.to_thread(self.offset_tracker.load_pending)
+        if pending:
+            logger.info(f"♻️ Replaying {len(pending)} unfinished updates from the previous run")
+        for update in pending:
+            self.processed_updates.add(update["update_id"])
+            await self._schedule_update(update)
+        self.last_update_id = self.offset_tracker.resume_offset
+
+    async def run_async(self):
+        """Main bot loop"""
+        logger.info("🤖 Starting Business Match Telegram Bot (asyncio runtime)...")
+
+        self._update_slots = asyncio.Semaphore(self.max_concurrent_updates)
+        self._pending_slots = asyncio.Semaphore(self.max_queued_updates)
+        connector = aiohttp.TCPConnector(limit=100)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
+
+            try:
+                async with session.get(f"{self.base_url}/getMe") as response:
+                    bot_info = await response.json(content_type=None)
+                if bot_info.get("ok"):
+                    logger.info(f"✅ Bot connected: {bot_info['result']['first_name']} (@{bot_info['result']['username']})")
+                else:
+                    logger.error("❌ Failed to get bot info")
+                    return
+            except Exception as e:
+                logger.error(f"❌ Error connecting to Telegram: {e}")
+                return
+
+            await self._replay_pending_updates()
+            logger.info(f"📍 Resuming after update {self.last_update_id}")
+
+            try:
+                if UPDATE_MODE == "webhook":
+                    await self.run_webhook_async()
+                else:
+                    await self.run_polling_async()
+            finally:
+                if self._tasks:
+                    await asyncio.gather(*self._tasks, return_exceptions=True)
+                await self.audio_jobs.shutdown()
+
+    async def run_webhook_async(self):
+        """Receive updates through an aiohttp webhook endpoint"""
+        if not WEBHOOK_URL:
+            logger.error("❌ WEBHOOK_URL is not set - cannot start webhook mode")
+            return
+        if not WEBHOOK_SECRET_TOKEN:
+            logger.error("❌ WEBHOOK_SECRET_TOKEN is not set - refusing to accept unauthenticated webhook updates")
+            return
+
+        data = {
+            "url": f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            "allowed_updates": ["message"],
+            "secret_token": WEBHOOK_SECRET_TOKEN
+        }
+        result = await self._post("setWebhook", json=data)
+        if not result.get("ok"):
+            logger.error(f"❌ Failed to set webhook: {result}")
+            return
+        logger.info(f"🔗 Webhook set to {data['url']}")
+
+        async def telegram_webhook(request):
+            if not is_valid_secret_token(request.headers.get(SECRET_TOKEN_HEADER)):
+                logger.warning(f"🚫 Rejected webhook request with invalid secret token from {request.remote}")
+                return web.json_response({'error': 'Unauthorized'}, status=401)
+            try:
+                update = await request.json()
+            except ValueError:
+                update = None
+            if not isinstance(update, dict) or "update_id" not in update:
+                return web.json_response({'error': 'Invalid update'}, status=400)
+            if not await self.accept_update(update, timeout=SUBMIT_TIMEOUT):
+                # Non-2xx makes Telegram retry the delivery later
+                return web.json_response({'error': 'Busy'}, status=503)
+            return web.json_response({'ok': True})
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, telegram_webhook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+        await site.start()
+        logger.info(f"🌐 Listening for webhook updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def run_polling_async(self):
+        """Receive updates through getUpdates long polling"""
+        try:
+            await self._post("deleteWebhook")
+        except Exception as e:
+            logger.error(f"Error deleting webhook: {e}")
+
+        logger.info("🔄 Starting polling for messages...")
+
+        while True:
+            try:
+                updates_response = await self.get_updates()
+
+                if not updates_response or not updates_response.get("ok"):
+                    logger.warning("Failed to get updates")
+                    await asyncio.sleep(5)
+                    continue
+
+                for update in updates_response["result"]:
+                    self.last_update_id = update["update_id"]
+                    await self.accept_update(update)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in main loop: {e}")
+                await asyncio.sleep(5)
+
+    def run(self):
+        """Start the asyncio event loop"""
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            logger.info("🛑 Bot stopped by user")
+        finally:
+            self.data_handler.close()
+            self._cleanup_lock()
@@ -0,0 +1,158 @@
+"""
+Content-addressed disk cache for synthesized audio.
+Files are named by a stable digest of everything that affects the
+audio, written atomically and evicted least-recently-used once the
+cache grows past its byte budget. Safe to share between processes.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EVICTION_GRACE_SECONDS = 120  # Files used this recently are never evicted (they may be uploading)
+
+
+def tts_cache_key(text: str, voice_id: str, model_id: str, voice_settings: dict, audio_format: str) -> str:
+    """Stable digest of a TTS request"""
+    payload = json.dumps(
+        {"text": text, "voice_id": voice_id, "model_id": model_id,
+         "voice_settings": voice_settings, "format": audio_format},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheWriter:
+    """
+    Streams chunks into a temp file in the cache directory; `commit`
+    moves it into place atomically, `abort` throws it away.
+    """
+
+    def __init__(self, cache: "AudioCache", key: str, extension: str):
+        self.cache = cache
+        self.path = cache.path_for(key, extension)
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, prefix=".tmp-", suffix=f".{extension}")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+
+    def commit(self) -> str:
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        self.cache._committed()
+        return self.path
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class AudioCache:
+    """
+    LRU disk cache of audio files keyed by `tts_cache_key`.
+
+    Writes go to a temp file in the cache directory and are moved into
+    place with `os.replace`, so readers never see partial files. Last
+    use is tracked through the file mtime and eviction runs under an
+    `fcntl` lock, so several bot processes can share one directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock_path = os.path.join(self.directory, ".lock")
+        self._stats_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def get(self, key: str, extension: str) -> Optional[str]:
+        """Path of the cached file, or None on a miss"""
+        path = self.path_for(key, extension)
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            with self._stats_lock:
+                self._misses += 1
+            return None
+        with self._stats_lock:
+            self._hits += 1
+        return path
+
+    def writer(self, key: str, extension: str) -> "CacheWriter":
+        """Incremental writer for audio that arrives in chunks"""
+        return CacheWriter(self, key, extension)
+
+    def _committed(self):
+        with self._stats_lock:
+            self._writes += 1
+        self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until the cache fits its budget"""
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = []
+                total = 0
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if entry.name.startswith(".") or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+                if total <= self.max_bytes:
+                    return
+
+                entries.sort()
+                cutoff = time.time() - EVICTION_GRACE_SECONDS
+                evicted = 0
+                for mtime, size, path in entries:
+                    if total <= self.max_bytes or mtime > cutoff:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    evicted += 1
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        if evicted:
+            with self._stats_lock:
+                self._evictions += evicted
+            logger.info(f"🧹 Evicted {evicted} cached audio files ({total} bytes left)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate and eviction counters"""
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'writes': self._writes,
+                'evictions': self._evictions,
+                'max_bytes': self.max_bytes,
+            }
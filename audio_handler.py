@@ -1,45 +1,163 @@
-import requests
+import asyncio
+import hashlib
 import json
 import logging
-import openai
-from config import ELEVENLABS_API_KEY, OPENAI_API_KEY
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Iterator
+import aiohttp
+from config import (ELEVENLABS_API_KEY, AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, AUDIO_SUMMARY_MEMO_SIZE,
+                    AUDIO_FORMAT)
+from audio_cache import AudioCache, tts_cache_key
+from http_transport import get_transport
+from openai_client import get_openai_client, get_async_openai_client
 
 logger = logging.getLogger(__name__)
 
+# Output formats: ElevenLabs output_format, file extension and MIME type
+AUDIO_FORMATS = {
+    "mp3": {"output_format": "mp3_44100_128", "extension": "mp3", "content_type": "audio/mpeg"},
+    "ogg": {"output_format": "opus_48000_64", "extension": "ogg", "content_type": "audio/ogg"},
+}
+STREAM_CHUNK_SIZE = 16 * 1024  # Bytes per chunk piped from TTS into the upload
+METRIC_SAMPLES = 1000
+
 class AudioHandler:
     def __init__(self):
         self.api_key = ELEVENLABS_API_KEY
         self.base_url = "https://api.elevenlabs.io/v1"
+        self.http = get_transport()
         self.voice_id = "pNInz6obpgDQGcFmaJgB"  # Eleven3 alpha (Adam - male voice)
         
-        # Initialize OpenAI client for text generation
-        self.openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        self.model_id = "eleven_v3"  # Eleven3 alpha model
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
+        
+        if AUDIO_FORMAT not in AUDIO_FORMATS:
+            logger.warning(f"⚠️ Unknown AUDIO_FORMAT {AUDIO_FORMAT!r}, using mp3")
+        self.audio_format = AUDIO_FORMAT if AUDIO_FORMAT in AUDIO_FORMATS else "mp3"
+        self.extension = AUDIO_FORMATS[self.audio_format]["extension"]
+        self.content_type = AUDIO_FORMATS[self.audio_format]["content_type"]
+        
+        # Shared OpenAI client for text generation
+        self.openai_client = get_openai_client()
+        
+        # Synthesized audio is cached on disk; summary texts are memoized per match
+        # so a repeat match reuses the same text and therefore the cached audio
+        self.audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+        self._summary_memo = OrderedDict()
+        self._summary_memo_lock = threading.Lock()
         
-    def generate_audio_summary(self, match_result: str, user_query: str) -> str:
+        # Metrics
+        self._metrics_lock = threading.Lock()
+        self._first_byte_times = deque(maxlen=METRIC_SAMPLES)
+        self._time_to_audio = deque(maxlen=METRIC_SAMPLES)
+        
+    def create_summary(self, match_result: str, user_query: str) -> str:
         """
-        Generate audio summary starting with "Привіт! Я думаю, що..."
-        Returns the path to the generated audio file
+        Summary text for a match, starting with "Привіт! Я думаю, що..."
+        Memoized per match so repeat matches reuse the cached audio
         """
-        try:
+        memo_key = self._summary_memo_key(match_result, user_query)
+        summary_text = self._get_memoized_summary(memo_key)
+        if summary_text is None:
             # Create summary text using ChatGPT for better quality
             summary_text = self._create_summary_with_chatgpt(match_result, user_query)
-            logger.info(f"📝 Created audio summary text: {summary_text[:100]}...")
+            self._memoize_summary(memo_key, summary_text)
+        return summary_text
+    
+    async def create_summary_async(self, match_result: str, user_query: str) -> str:
+        """
+        Async version of create_summary
+        """
+        memo_key = self._summary_memo_key(match_result, user_query)
+        summary_text = self._get_memoized_summary(memo_key)
+        if summary_text is None:
+            summary_text = await self._create_summary_with_chatgpt_async(match_result, user_query)
+            self._memoize_summary(memo_key, summary_text)
+        return summary_text
+    
+    def _summary_memo_key(self, match_result: str, user_query: str) -> str:
+        """
+        Digest of the match (its JSON fields, or the whole text if it is not JSON)
+        and the query the summary is written for
+        """
+        try:
+            match = json.loads(match_result)
+        except (json.JSONDecodeError, TypeError):
+            match = match_result
+        payload = json.dumps([match, user_query], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _get_memoized_summary(self, memo_key: str):
+        with self._summary_memo_lock:
+            summary = self._summary_memo.get(memo_key)
+            if summary is not None:
+                self._summary_memo.move_to_end(memo_key)
+            return summary
+    
+    def _memoize_summary(self, memo_key: str, summary: str):
+        with self._summary_memo_lock:
+            self._summary_memo[memo_key] = summary
+            self._summary_memo.move_to_end(memo_key)
+            while len(self._summary_memo) > AUDIO_SUMMARY_MEMO_SIZE:
+                self._summary_memo.popitem(last=False)
+    
+    def _create_summary_text(self, match_result: str, user_query: str) -> str:
+        """
+        Create a summary text that paraphrases only the "Чому корисний для вас" part
+        """
+        expert_name, match_percentage, description, reason = self._extract_match_fields(match_result)
+        
+        # Create summary with paraphrased reason
+        summary = "Привіт! Я думаю, що знайшов для вас ідеального експерта. "
+        
+        if expert_name:
+            summary += f"Це {expert_name}. "
             
-            # Generate audio using ElevenLabs API
-            audio_path = self._generate_audio(summary_text)
-            logger.info(f"🎵 Generated audio file: {audio_path}")
+        if match_percentage:
+            summary += f"Збіг становить {match_percentage}. "
             
-            return audio_path
+        if description:
+            # Keep description as is, just clean emojis
+            clean_desc = description.replace("✅", "").replace("📋", "").replace("💼", "").replace("🧮", "").strip()
+            summary += f"Експерт {clean_desc}. "
             
-        except Exception as e:
-            logger.error(f"❌ Error generating audio summary: {e}")
-            return None
+        if reason:
+            # Paraphrase only the reason part
+            clean_reason = reason.replace("✨", "").replace("✅", "").strip()
+            # Simple paraphrasing for the reason
+            paraphrased_reason = self._paraphrase_reason(clean_reason)
+            summary += f"{paraphrased_reason}. "
+        else:
+            # If no reason found, add default
+            summary += "Корисний тому що має відповідний досвід та навички для вашого запиту. "
+            
+        summary += "Рекомендую звернутися до цього професіонала для подальшої співпраці."
+        
+        return summary
     
-    def _create_summary_text(self, match_result: str, user_query: str) -> str:
+    def _extract_match_fields(self, match_result: str) -> tuple:
         """
-        Create a summary text that paraphrases only the "Чому корисний для вас" part
+        Extract expert name, match percentage, description and reason from the
+        model's JSON match, or from a formatted match message
         """
-        # Extract key information from match result
+        try:
+            match_data = json.loads(match_result)
+        except (json.JSONDecodeError, TypeError):
+            match_data = None
+        if isinstance(match_data, dict):
+            match_percentage = match_data.get('match_percentage')
+            return (
+                str(match_data.get('name') or ""),
+                f"{str(match_percentage).rstrip('%')}%" if match_percentage else "",
+                str(match_data.get('description') or ""),
+                str(match_data.get('reason') or ""),
+            )
+        
         lines = match_result.split('\n')
         expert_name = ""
         match_percentage = ""
@@ -48,7 +166,6 @@ class AudioHandler:
         
         for line in lines:
             if "Знайдений експерт:" in line:
-                # Remove emoji and clean up the name
                 expert_name = line.replace("💼 Знайдений експерт:", "").strip()
                 expert_name = expert_name.replace("—", "-").strip()
             elif "Збіг —" in line:
@@ -58,108 +175,42 @@ class AudioHandler:
         desc_start = match_result.find("📋 Про експерта:")
         if desc_start != -1:
             desc_part = match_result[desc_start:]
-            desc_lines = desc_part.split('\n')[1:]  # Skip the header
-            # Find the end of description (before "Чому корисний")
+            desc_lines = desc_part.split('\n')[1:]
             desc_text = []
             for line in desc_lines:
                 if "Чому корисний для вас:" in line:
                     break
                 desc_text.append(line.strip())
-            description = ' '.join(desc_text[:2])  # Take first 2 lines
+            description = ' '.join(desc_text[:2])
         
         # Get reason part
         reason_start = match_result.find("Чому корисний для вас:")
         if reason_start != -1:
             reason_part = match_result[reason_start:]
-            reason_lines = reason_part.split('\n')[1:]  # Skip the header
+            reason_lines = reason_part.split('\n')[1:]
             reason_text = []
             for line in reason_lines:
                 if line.strip() and not line.startswith("📋") and not line.startswith("💼") and not line.startswith("✨"):
-                    # Clean the line from emojis
                     clean_line = line.replace("✅", "").strip()
                     if clean_line:
                         reason_text.append(clean_line)
-            reason = ' '.join(reason_text[:1])  # Take first line
-            
-        # Create summary with paraphrased reason
-        summary = "Привіт! Я думаю, що знайшов для вас ідеального експерта. "
+            reason = ' '.join(reason_text[:1])
         
-        if expert_name:
-            summary += f"Це {expert_name}. "
-            
-        if match_percentage:
-            summary += f"Збіг становить {match_percentage}. "
-            
-        if description:
-            # Keep description as is, just clean emojis
-            clean_desc = description.replace("✅", "").replace("📋", "").replace("💼", "").replace("🧮", "").strip()
-            summary += f"Експерт {clean_desc}. "
-            
-        if reason:
-            # Paraphrase only the reason part
-            clean_reason = reason.replace("✨", "").replace("✅", "").strip()
-            # Simple paraphrasing for the reason
-            paraphrased_reason = self._paraphrase_reason(clean_reason)
-            summary += f"{paraphrased_reason}. "
-        else:
-            # If no reason found, add default
-            summary += "Корисний тому що має відповідний досвід та навички для вашого запиту. "
-            
-        summary += "Рекомендую звернутися до цього професіонала для подальшої співпраці."
-        
-        return summary
+        return expert_name, match_percentage, description, reason
     
-    def _create_summary_with_chatgpt(self, match_result: str, user_query: str) -> str:
+    def _build_summary_messages(self, match_result: str, user_query: str) -> list:
         """
-        Create a realistic summary text using ChatGPT for better quality and naturalness
+        Build the ChatGPT messages for the audio summary
         """
-        try:
-            # Extract key information from match result
-            lines = match_result.split('\n')
-            expert_name = ""
-            match_percentage = ""
-            description = ""
-            reason = ""
-            
-            for line in lines:
-                if "Знайдений експерт:" in line:
-                    expert_name = line.replace("💼 Знайдений експерт:", "").strip()
-                    expert_name = expert_name.replace("—", "-").strip()
-                elif "Збіг —" in line:
-                    match_percentage = line.replace("🧮 Збіг —", "").strip()
-            
-            # Get description part
-            desc_start = match_result.find("📋 Про експерта:")
-            if desc_start != -1:
-                desc_part = match_result[desc_start:]
-                desc_lines = desc_part.split('\n')[1:]
-                desc_text = []
-                for line in desc_lines:
-                    if "Чому корисний для вас:" in line:
-                        break
-                    desc_text.append(line.strip())
-                description = ' '.join(desc_text[:2])
-            
-            # Get reason part
-            reason_start = match_result.find("Чому корисний для вас:")
-            if reason_start != -1:
-                reason_part = match_result[reason_start:]
-                reason_lines = reason_part.split('\n')[1:]
-                reason_text = []
-                for line in reason_lines:
-                    if line.strip() and not line.startswith("📋") and not line.startswith("💼") and not line.startswith("✨"):
-                        clean_line = line.replace("✅", "").strip()
-                        if clean_line:
-                            reason_text.append(clean_line)
-                reason = ' '.join(reason_text[:1])
-            
-            # Create prompt for ChatGPT
-            system_prompt = """Ти - дружній бізнес-консультант, який допомагає людям знаходити професіоналів для співпраці. 
+        expert_name, match_percentage, description, reason = self._extract_match_fields(match_result)
+        
+        # Create prompt for ChatGPT
+        system_prompt = """Ти - дружній бізнес-консультант, який допомагає людям знаходити професіоналів для співпраці. 
 Створи короткий, природний та переконливий текст-рекомендацію українською мовою, який почнеться з "Привіт! Я думаю, що...".
 Текст має звучати так, ніби ти особисто рекомендуєш цього експерта і радиш познайомитись з ним.
 Будь ентузіастичним, але не надто офіційним. Використовуй природну мову, як у розмові з другом."""
-            
-            user_prompt = f"""Користувач шукав: {user_query}
+        
+        user_prompt = f"""Користувач шукав: {user_query}
 
 Знайдений експерт: {expert_name}
 Збіг: {match_percentage}
@@ -167,13 +218,20 @@ class AudioHandler:
 Чому корисний: {reason}
 
 Створи короткий текст-рекомендацію (3-4 речення), який почнеться з "Привіт! Я думаю, що..." і звучатиме як особиста рекомендація від друга."""
-            
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def _create_summary_with_chatgpt(self, match_result: str, user_query: str) -> str:
+        """
+        Create a realistic summary text using ChatGPT for better quality and naturalness
+        """
+        try:
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._build_summary_messages(match_result, user_query),
                 max_tokens=150,
                 temperature=0.7
             )
@@ -188,6 +246,27 @@ class AudioHandler:
             # Fallback to original method
             return self._create_summary_text(match_result, user_query)
     
+    async def _create_summary_with_chatgpt_async(self, match_result: str, user_query: str) -> str:
+        """
+        Async version of _create_summary_with_chatgpt
+        """
+        try:
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-4o",
+                messages=self._build_summary_messages(match_result, user_query),
+                max_tokens=150,
+                temperature=0.7
+            )
+            
+            summary = response.choices[0].message.content.strip()
+            logger.info(f"🤖 ChatGPT generated summary: {summary[:100]}...")
+            
+            return summary
+            
+        except Exception as e:
+            logger.error(f"❌ Error creating summary with ChatGPT: {e}")
+            return self._create_summary_text(match_result, user_query)
+    
     def _paraphrase_reason(self, reason: str) -> str:
         """
         Paraphrase the reason text to make it sound more natural
@@ -217,51 +296,176 @@ class AudioHandler:
         
         return "має відповідний досвід та навички для вашого запиту"
     
-    def _generate_audio(self, text: str) -> str:
+    def _tts_request(self, text: str) -> tuple:
         """
-        Generate audio file using ElevenLabs API
+        Build URL, headers and payload for a streaming ElevenLabs TTS request
         """
-        url = f"{self.base_url}/text-to-speech/{self.voice_id}"
+        url = f"{self.base_url}/text-to-speech/{self.voice_id}/stream"
+        url += f"?output_format={AUDIO_FORMATS[self.audio_format]['output_format']}"
         
         headers = {
-            "Accept": "audio/mpeg",
+            "Accept": self.content_type,
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
         
         data = {
             "text": text,
-            "model_id": "eleven_v3",  # Eleven3 alpha model
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
         }
         
-        # Add timeout to prevent hanging
-        response = requests.post(url, json=data, headers=headers, timeout=30)
+        return url, headers, data
+    
+    def content_key(self, text: str) -> str:
+        """
+        Stable digest of the audio for `text` (cache key and media asset key)
+        """
+        return tts_cache_key(text, self.voice_id, self.model_id, self.voice_settings,
+                             AUDIO_FORMATS[self.audio_format]["output_format"])
+    
+    def audio_filename(self, text: str) -> str:
+        """
+        File name shown to the user for the audio of a summary
+        """
+        return f"summary_{self.content_key(text)[:12]}.{self.extension}"
+    
+    def iter_file(self, path: str) -> Iterator[bytes]:
+        """
+        Chunks of a cached audio file, for streaming it into an upload
+        """
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    
+    def _record_first_byte(self, started: float):
+        with self._metrics_lock:
+            self._first_byte_times.append(time.monotonic() - started)
+    
+    def synthesize(self, text: str) -> str:
+        """
+        Path of the cached audio for `text`, synthesized first on a miss.
+        The ElevenLabs stream is written to the cache chunk by chunk, so memory
+        stays at one chunk per job and the next request for the same text is a hit.
+        """
+        cache_key = self.content_key(text)
+        cached_path = self.audio_cache.get(cache_key, self.extension)
+        if cached_path:
+            logger.info(f"💾 Audio cache hit: {cached_path}")
+            return cached_path
         
-        if response.status_code == 200:
-            # Save audio file
-            audio_filename = f"audio_summary_{hash(text) % 10000}.mp3"
-            audio_path = f"/tmp/{audio_filename}"
+        url, headers, data = self._tts_request(text)
+        started = time.monotonic()
+        response = self.http.post(url, json=data, headers=headers, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(f"❌ ElevenLabs API error: {response.status_code} - {response.text}")
+                raise Exception(f"ElevenLabs API error: {response.status_code}")
             
-            with open(audio_path, 'wb') as f:
-                f.write(response.content)
-                
-            return audio_path
-        else:
-            logger.error(f"❌ ElevenLabs API error: {response.status_code} - {response.text}")
-            raise Exception(f"ElevenLabs API error: {response.status_code}")
+            writer = self.audio_cache.writer(cache_key, self.extension)
+            try:
+                for i, chunk in enumerate(response.iter_content(STREAM_CHUNK_SIZE)):
+                    if i == 0:
+                        self._record_first_byte(started)
+                    writer.write(chunk)
+            except BaseException:
+                # Never cache partial audio
+                writer.abort()
+                raise
+            return writer.commit()
+        finally:
+            response.close()
     
-    def cleanup_audio_file(self, audio_path: str):
+    async def stream_audio_async(self, text: str, session: aiohttp.ClientSession) -> AsyncIterator[bytes]:
         """
-        Clean up temporary audio file
+        Audio for `text` as chunks, from the cache or streamed from ElevenLabs.
+        Streamed chunks are passed on as they arrive and kept in memory; once
+        the stream is complete they are written to the cache in a worker
+        thread, so the next request for the same text is a hit. Disk I/O
+        never runs on the event loop.
         """
+        cache_key = self.content_key(text)
+        cached_path = await asyncio.to_thread(self.audio_cache.get, cache_key, self.extension)
+        if cached_path:
+            logger.info(f"💾 Audio cache hit: {cached_path}")
+            async for chunk in self._iter_file_async(cached_path):
+                yield chunk
+            return
+        
+        url, headers, data = self._tts_request(text)
+        started = time.monotonic()
+        async with session.post(url, json=data, headers=headers,
+                                timeout=aiohttp.ClientTimeout(sock_read=30)) as response:
+            if response.status != 200:
+                body = await response.text()
+                logger.error(f"❌ ElevenLabs API error: {response.status} - {body}")
+                raise Exception(f"ElevenLabs API error: {response.status}")
+            
+            chunks = []
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                if not chunks:
+                    self._record_first_byte(started)
+                chunks.append(chunk)
+                yield chunk
+        
+        # Only a complete stream is cached
         try:
-            import os
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-                logger.info(f"🗑️ Cleaned up audio file: {audio_path}")
-        except Exception as e:
-            logger.error(f"❌ Error cleaning up audio file: {e}")
+            await asyncio.to_thread(self._cache_chunks, cache_key, chunks)
+        except OSError as e:
+            logger.error(f"Error caching streamed audio: {e}")
+    
+    def _cache_chunks(self, cache_key: str, chunks: list):
+        writer = self.audio_cache.writer(cache_key, self.extension)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+    
+    async def _iter_file_async(self, path: str) -> AsyncIterator[bytes]:
+        """iter_file for the event loop: the reads run in a worker thread"""
+        f = await asyncio.to_thread(open, path, 'rb')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            f.close()
+    
+    def record_time_to_audio(self, seconds: float):
+        """
+        Record how long a user waited from the match to a delivered audio summary
+        """
+        with self._metrics_lock:
+            self._time_to_audio.append(seconds)
+    
+    def get_stats(self) -> dict:
+        """
+        TTS first-byte and time-to-audio latencies plus audio cache stats
+        """
+        with self._metrics_lock:
+            first_byte = sorted(self._first_byte_times)
+            to_audio = sorted(self._time_to_audio)
+        
+        def summary(values):
+            if not values:
+                return {'count': 0, 'avg': 0.0, 'p95': 0.0}
+            return {
+                'count': len(values),
+                'avg': sum(values) / len(values),
+                'p95': values[min(len(values) - 1, int(0.95 * len(values)))],
+            }
+        
+        return {
+            'format': self.audio_format,
+            'tts_first_byte_seconds': summary(first_byte),
+            'time_to_audio_seconds': summary(to_audio),
+            'cache': self.audio_cache.get_stats(),
+        }
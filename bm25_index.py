@@ -0,0 +1,103 @@
+"""
+BM25 inverted index over profile fields for candidate retrieval.
+Fields are weighted and length-normalised separately (BM25F), and each
+term's score contribution is precomputed at build time, so a query is a
+handful of NumPy scatter-adds followed by a partial sort.
+"""
+
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from text_processing import analyze, analyze_query
+
+logger = logging.getLogger(__name__)
+
+# Name under which the index is registered with DataHandler
+BM25_INDEX = "bm25"
+
+# Relative importance of each field. What a person works in counts most;
+# what they are looking for counts little, so a search for a developer
+# does not rank people who are themselves looking for developers.
+FIELD_WEIGHTS = {
+    'business_sector': 3.0,
+    'business_sectors': 2.5,
+    'companies': 2.0,
+    'self_description': 2.0,
+    'achievements': 1.5,
+    'open_to': 1.0,
+    'location': 1.0,
+    'goals': 0.7,
+    'interests': 0.5,
+    'reviews': 0.5,
+    'interesting_facts': 0.5,
+    'business_needs': 0.3,
+    'looking_for': 0.3,
+}
+
+K1 = 1.2
+B = 0.75
+
+
+class BM25Index:
+    """Immutable BM25F index built from a sequence of profile records"""
+
+    def __init__(self, records: Sequence, field_weights: Dict[str, float] = FIELD_WEIGHTS,
+                 k1: float = K1, b: float = B):
+        started = time.monotonic()
+        self.size = len(records)
+        fields = list(field_weights)
+
+        # Term frequencies per field and document
+        field_terms: Dict[str, List[Counter]] = {}
+        avg_lengths: Dict[str, float] = {}
+        for field in fields:
+            counters = [Counter(analyze(getattr(record, field))) for record in records]
+            field_terms[field] = counters
+            total = sum(sum(counter.values()) for counter in counters)
+            avg_lengths[field] = total / self.size if self.size else 0.0
+
+        # Length-normalised, weighted term frequency combined across fields
+        combined: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+        for field, weight in field_weights.items():
+            avg_length = avg_lengths[field] or 1.0
+            for doc_id, counter in enumerate(field_terms[field]):
+                if not counter:
+                    continue
+                norm = 1 - b + b * sum(counter.values()) / avg_length
+                for term, tf in counter.items():
+                    combined[term][doc_id] += weight * tf / norm
+
+        # term -> (doc ids, precomputed idf * saturated tf)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, docs in combined.items():
+            doc_ids = np.fromiter(docs.keys(), dtype=np.int32, count=len(docs))
+            tf = np.fromiter(docs.values(), dtype=np.float32, count=len(docs))
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._postings[term] = (doc_ids, (idf * tf * (k1 + 1) / (tf + k1)).astype(np.float32))
+
+        self.build_seconds = time.monotonic() - started
+        logger.info(f"🔎 Built BM25 index: {self.size} profiles, {len(self._postings)} terms "
+                    f"in {self.build_seconds:.2f}s")
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Top-k (record index, score) pairs for a query, best first; empty if nothing matches"""
+        postings = [self._postings[term] for term in set(analyze_query(query)) if term in self._postings]
+        if not postings or k <= 0:
+            return []
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for doc_ids, contributions in postings:
+            scores[doc_ids] += contributions
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
+
+    def get_stats(self) -> Dict[str, float]:
+        return {'profiles': self.size, 'terms': len(self._postings), 'build_seconds': self.build_seconds}
@@ -1,70 +1,170 @@
 import openai
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
 import json
-from config import OPENAI_API_KEY
+from config import MAX_HISTORY_MESSAGES, RETRIEVAL_TOP_K, FALLBACK_CONTEXT_TOKENS
 from data_handler import DataHandler
+from bm25_index import BM25_INDEX
+from embedding_index import EMBEDDING_INDEX
+from facet_index import FACET_INDEX
+from context_packer import MATCHING_FORMAT, ContextPacker
+from openai_client import get_openai_client, get_async_openai_client
+from intent_classifier import CHITCHAT, Intent, classify
+from reply_cache import ReplyCache, get_reply_cache
+from query_cache import CacheLookup, QueryCache, get_query_cache, normalize_query
+from single_flight import AsyncSingleFlight, SingleFlight
+
+CUSTOM_MODEL_PROMPT = {
+    "id": "pmpt_68caa4dc45e88195bbd73fc66ea17464072cc683f555624b",
+    "version": "2"
+}
+CUSTOM_MODEL_TIMEOUT = 120
+FALLBACK_MODEL_TIMEOUT = 60
+
+# Version of the matching prompts; part of every search cache key
+PROMPT_VERSION = f"{CUSTOM_MODEL_PROMPT['id']}:{CUSTOM_MODEL_PROMPT['version']}"
+
+# Longest a search waits for an identical one already in flight (the
+# custom model call plus a fallback, with slack). A search that still
+# times out fails rather than calling the model a second time.
+SEARCH_FLIGHT_TIMEOUT = CUSTOM_MODEL_TIMEOUT + FALLBACK_MODEL_TIMEOUT + 30
+
+NO_MATCHES_REPLY = "Збігів не знайдено."
+ANALYSIS_ERROR_PREFIX = "Sorry, I encountered an error while analyzing your preferences:"
+
+NON_SEARCH_SYSTEM_PROMPT = """Ви дружній бот для бізнес-нетворкінгу Business Match. 
+        Відповідайте українською мовою на повідомлення користувачів.
+        Якщо користувач дякує або пише привітання, відповідайте коротко та дружньо.
+        Якщо користувач запитує щось не пов'язане з пошуком експертів, вежливо направте їх до пошуку."""
+
+NON_SEARCH_FALLBACK_REPLY = "Дякую за звернення! Якщо потрібно знайти бізнес-експертів, просто опишіть, кого ви шукаєте."
+
+# Concurrent identical searches share one model call
+search_flights = SingleFlight()
+async_search_flights = AsyncSingleFlight()
+
+# Candidate profiles of the fallback matching prompt, packed into a token budget
+matching_packer = ContextPacker(MATCHING_FORMAT, FALLBACK_CONTEXT_TOKENS)
+
+# Damping constant of reciprocal rank fusion
+RRF_K = 60
+
+# How many more hits to rank when a place or "open to" option may lift deeper ones
+FACET_OVERFETCH = 5
+
+# Fused score added to candidates with a place or "open to" option the query
+# mentions - as much as a first place in one of the rankings
+FACET_BOOST = 1.0 / (RRF_K + 1)
+
+def retrieve_candidates(snapshot, query: str, k: int) -> List[int]:
+    """
+    Record indexes of the best k candidates for a query. Keyword (BM25) and
+    embedding rankings are merged by reciprocal rank fusion; either index
+    may be missing. Candidates with a city, country or "open to" option the
+    query names are ranked higher but nobody is excluded: the place may be
+    the user's own ("Я з Києва, шукаю...") and negated mentions ("не з
+    Києва") are ignored.
+    """
+    facets = snapshot.indexes.get(FACET_INDEX)
+    preferred = facets.query_filter(query) if facets else None
+    fetch = k * FACET_OVERFETCH if preferred else k
+    
+    rankings = []
+    for name in (BM25_INDEX, EMBEDDING_INDEX):
+        index = snapshot.indexes.get(name)
+        if index is None:
+            continue
+        try:
+            rankings.append(index.search(query, fetch))
+        except Exception as e:
+            print(f"Candidate retrieval with {name} failed: {e}")
+    
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    if preferred:
+        for doc_id in fused:
+            if preferred >> doc_id & 1:
+                fused[doc_id] += FACET_BOOST
+    candidates = sorted(fused, key=fused.get, reverse=True)
+    return candidates[:k]
 
 class ChatGPTHandler:
-    def __init__(self, data_handler: DataHandler):
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    def __init__(self, data_handler: DataHandler, client: openai.OpenAI = None,
+                 async_client: openai.AsyncOpenAI = None, reply_cache: ReplyCache = None,
+                 query_cache: QueryCache = None):
+        # Clients and caches default to the process-wide shared ones
+        self.client = client or get_openai_client()
+        self._async_client = async_client
+        self.reply_cache = reply_cache or get_reply_cache()
+        self.query_cache = query_cache or get_query_cache()
         self.data_handler = data_handler
         self.conversation_history = []
     
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """Async OpenAI client, created on first use by the async runtime"""
+        if self._async_client is None:
+            self._async_client = get_async_openai_client()
+        return self._async_client
+    
     def add_to_conversation(self, role: str, content: str):
-        """Add message to conversation history"""
+        """Add message to conversation history, keeping only the most recent messages"""
         self.conversation_history.append({"role": role, "content": content})
+        if len(self.conversation_history) > MAX_HISTORY_MESSAGES:
+            del self.conversation_history[:-MAX_HISTORY_MESSAGES]
+    
+    def _lookup_cached(self, user_preferences: str) -> Optional[CacheLookup]:
+        """Search cache lookup for the current profile version, or None without a cache"""
+        if self.query_cache is None:
+            return None
+        snapshot = self.data_handler.snapshot()
+        embedder = embed = None
+        index = snapshot.indexes.get(EMBEDDING_INDEX)
+        if index is not None:
+            embedder, embed = index.embedder.name, index.embed_query
+        return self.query_cache.lookup(user_preferences, snapshot.digest, PROMPT_VERSION, embedder, embed)
+    
+    def _store_cached(self, lookup: CacheLookup, result: str):
+        """Cache a fresh answer unless it is an error or an empty response"""
+        if lookup is None or not result or result == NO_MATCHES_REPLY or result.startswith(ANALYSIS_ERROR_PREFIX):
+            return
+        self.query_cache.store(lookup, result)
+    
+    def _flight_key(self, user_preferences: str, lookup: Optional[CacheLookup]) -> str:
+        """Key under which identical concurrent searches share one model call"""
+        if lookup is not None:
+            return lookup.key
+        snapshot = self.data_handler.snapshot()
+        return QueryCache.make_key(normalize_query(user_preferences), snapshot.digest, PROMPT_VERSION)
+    
+    def _remember_result(self, user_preferences: str, result: str) -> str:
+        """Add a search and its answer to the conversation history (errors are left out)"""
+        if not result.startswith(ANALYSIS_ERROR_PREFIX):
+            self.add_to_conversation("user", user_preferences)
+            self.add_to_conversation("assistant", result)
+        return result
     
-    def _is_query_unclear(self, query: str) -> bool:
-        """Check if the user query is unclear or irrelevant"""
-        query_lower = query.lower().strip()
-        
-        # Check if query is too short (less than 5 characters)
-        if len(query_lower) < 5:
-            return True
-        
-        # Check for clear business/professional keywords
-        business_keywords = [
-            "шукаю", "потрібен", "потрібні", "потрібна", "потрібно",
-            "експерт", "фахівець", "спеціаліст", "професіонал",
-            "маркетинг", "дизайн", "розробка", "програмування",
-            "інвестор", "інвестиції", "бізнес", "стартап",
-            "ментор", "консультант", "тренер", "коуч",
-            "продажі", "реклама", "PR", "брендинг",
-            "фінанси", "бухгалтер", "юрист", "HR",
-            "IT", "технології", "цифрові", "онлайн",
-            "e-commerce", "інтернет", "соціальні мережі"
-        ]
-        
-        # If query contains business keywords, it's likely clear
-        for keyword in business_keywords:
-            if keyword in query_lower:
-                return False
-        
-        # Check for very unclear indicators (only obvious ones)
-        unclear_indicators = [
-            "....", "...", "???", "??", "???",
-            "що робиш", "як справи", "що нового",
-            "тест", "перевірка", "працює",
-            "що можна", "можливості", "допоможи"
-        ]
-        
-        # Only check for unclear indicators if no business keywords found
-        for indicator in unclear_indicators:
-            if indicator in query_lower:
-                return True
-                
-        # If query is very short and has no business keywords, it's unclear
-        if len(query_lower) < 15:
-            return True
-                
-        return False
-
     def analyze_user_preferences(self, user_preferences: str) -> str:
-        """Analyze user preferences and find matches using optimized custom model"""
+        """
+        Analyze user preferences and find matches, reusing results of the same search.
+        Raises TimeoutError if an identical search in flight outlasts SEARCH_FLIGHT_TIMEOUT.
+        """
+        lookup = self._lookup_cached(user_preferences)
+        if lookup is not None and lookup.result is not None:
+            return self._remember_result(user_preferences, lookup.result)
         
-        # First check if the query is clear enough
-        if self._is_query_unclear(user_preferences):
-            return "unclear_query"
+        def analyze():
+            result = self._analyze_with_model(user_preferences)
+            self._store_cached(lookup, result)
+            return result
+        
+        result = search_flights.do(self._flight_key(user_preferences, lookup), analyze, SEARCH_FLIGHT_TIMEOUT)
+        return self._remember_result(user_preferences, result)
+    
+    def _analyze_with_model(self, user_preferences: str) -> str:
+        """Find matches using optimized custom model"""
         
         # Use the optimized custom model for matching with extended timeout
         import threading
@@ -77,10 +177,7 @@ class ChatGPTHandler:
             nonlocal response, exception
             try:
                 response = self.client.responses.create(
-                    prompt={
-                        "id": "pmpt_68caa4dc45e88195bbd73fc66ea17464072cc683f555624b",
-                        "version": "2"
-                    },
+                    prompt=CUSTOM_MODEL_PROMPT,
                     input=user_preferences
                 )
             except Exception as e:
@@ -93,7 +190,7 @@ class ChatGPTHandler:
             thread.start()
             
             # Wait for 120 seconds (increased from 60)
-            thread.join(timeout=120)
+            thread.join(timeout=CUSTOM_MODEL_TIMEOUT)
             
             if thread.is_alive():
                 # Request is still running, it timed out
@@ -102,58 +199,102 @@ class ChatGPTHandler:
             if exception:
                 raise exception
             
-            # Extract the actual text content from the response
-            if hasattr(response, 'output') and response.output:
-                # Find the message content in the output
-                for item in response.output:
-                    if hasattr(item, 'content') and item.content:
-                        for content_item in item.content:
-                            if hasattr(content_item, 'text'):
-                                result = content_item.text
-                                break
-                        else:
-                            continue
-                        break
-                else:
-                    result = "Збігів не знайдено."
-            else:
-                result = "Збігів не знайдено."
-            
-            # Add to conversation history
-            self.add_to_conversation("user", user_preferences)
-            self.add_to_conversation("assistant", result)
-            
-            return result
+            return self._extract_response_text(response)
             
         except Exception as e:
             # Fallback to original method if custom model fails
             print(f"Custom model failed: {e}, falling back to ChatGPT 3.5")
             return self._fallback_analyze_user_preferences(user_preferences)
     
+    def _extract_response_text(self, response) -> str:
+        """Extract the message text from a Responses API result"""
+        if hasattr(response, 'output') and response.output:
+            # Find the message content in the output
+            for item in response.output:
+                if hasattr(item, 'content') and item.content:
+                    for content_item in item.content:
+                        if hasattr(content_item, 'text'):
+                            return content_item.text
+        return NO_MATCHES_REPLY
+    
+    async def analyze_user_preferences_async(self, user_preferences: str) -> str:
+        """Async version of analyze_user_preferences for the asyncio runtime"""
+        # SQLite and the query embedding block, so keep them off the event loop
+        lookup = await asyncio.to_thread(self._lookup_cached, user_preferences)
+        if lookup is not None and lookup.result is not None:
+            return self._remember_result(user_preferences, lookup.result)
+        
+        async def analyze():
+            result = await self._analyze_with_model_async(user_preferences)
+            if lookup is not None:
+                await asyncio.to_thread(self._store_cached, lookup, result)
+            return result
+        
+        key = self._flight_key(user_preferences, lookup)
+        result = await async_search_flights.do(key, analyze, SEARCH_FLIGHT_TIMEOUT)
+        return self._remember_result(user_preferences, result)
+    
+    async def _analyze_with_model_async(self, user_preferences: str) -> str:
+        """Async version of _analyze_with_model"""
+        try:
+            response = await asyncio.wait_for(
+                self.async_client.responses.create(
+                    prompt=CUSTOM_MODEL_PROMPT,
+                    input=user_preferences
+                ),
+                timeout=CUSTOM_MODEL_TIMEOUT
+            )
+            return self._extract_response_text(response)
+            
+        except Exception as e:
+            print(f"Custom model failed: {e}, falling back to ChatGPT 3.5")
+            return await self._fallback_analyze_user_preferences_async(user_preferences)
+    
     def _fallback_analyze_user_preferences(self, user_preferences: str) -> str:
         """Fallback method using original ChatGPT approach"""
+        messages = self._build_fallback_messages(user_preferences)
         
-        # Get a sample of users for analysis (to avoid token limits)
-        all_users = self.data_handler.get_all_users()
-        
-        # Create a focused context with key information
-        users_sample = all_users[:20]  # Use first 20 users to avoid token limits
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7,
+                timeout=FALLBACK_MODEL_TIMEOUT
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            return f"{ANALYSIS_ERROR_PREFIX} {e}"
+    
+    async def _fallback_analyze_user_preferences_async(self, user_preferences: str) -> str:
+        """Async version of the ChatGPT fallback"""
+        # Retrieval may call the embeddings API, so keep it off the event loop
+        messages = await asyncio.to_thread(self._build_fallback_messages, user_preferences)
         
-        users_context = "Business Match Users Database (Sample):\n\n"
+        try:
+            response = await self.async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7,
+                timeout=FALLBACK_MODEL_TIMEOUT
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            return f"{ANALYSIS_ERROR_PREFIX} {e}"
+    
+    def _build_fallback_messages(self, user_preferences: str) -> List[Dict[str, str]]:
+        """Build the chat messages for the fallback matching prompt"""
         
-        for i, user in enumerate(users_sample, 1):
-            users_context += f"Професіонал {i}:\n"
-            users_context += f"Ім'я: {user['name']}\n"
-            users_context += f"Локація: {user['location']}\n"
-            users_context += f"Бізнес-сектор: {user['business_sector']}\n"
-            users_context += f"Цілі: {user['goals']}\n"
-            users_context += f"Шукає: {user['looking_for']}\n"
-            users_context += f"Відкритий до: {user['open_to']}\n"
-            users_context += f"Бізнес-потреби: {user['business_needs']}\n"
-            users_context += f"Інтереси: {user['interests']}\n"
-            users_context += f"Компанії: {user['companies']}\n"
-            users_context += f"Досягнення: {user['achievements']}\n"
-            users_context += "---\n\n"
+        # Retrieve the most relevant candidates so the model only has to rerank them
+        snapshot = self.data_handler.snapshot()
+        candidates = retrieve_candidates(snapshot, user_preferences, RETRIEVAL_TOP_K)
+        # Nothing matched: as many users as fit, in file order
+        users_context = matching_packer.pack(snapshot, candidates or range(len(snapshot.records))).text
         
         # Create system prompt in Ukrainian with improved logic
         system_prompt = """Ви професійний помічник з бізнес-нетворкінгу для Business Match. 
@@ -180,42 +321,47 @@ class ChatGPTHandler:
         Відповідайте ВИКЛЮЧНО українською мовою. Будьте професійними та зосередженими на бізнес-корисності."""
         
         # Prepare messages
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Ось наша база даних професіоналів:\n\n{users_context}\n\nКлієнт шукає: {user_preferences}\n\nБудь ласка, знайдіть 1 найкращий збіг та відповідайте у форматі JSON як зазначено в інструкціях."}
         ]
-        
+    
+    def _canned_reply(self, message: str, intent: Intent = None) -> str:
+        """Pre-generated reply for recognised chitchat, or None to ask the LLM"""
+        intent = intent or classify(message)
+        return self.reply_cache.get(intent.kind if intent.label == CHITCHAT else None)
+    
+    def handle_non_search_message(self, message: str, intent: Intent = None) -> str:
+        """Handle non-search messages with a canned reply, falling back to ChatGPT"""
+        reply = self._canned_reply(message, intent)
+        if reply:
+            return reply
         try:
             response = self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=1000,
+                messages=[
+                    {"role": "system", "content": NON_SEARCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": message}
+                ],
+                max_tokens=200,
                 temperature=0.7
             )
             
-            result = response.choices[0].message.content
-            
-            # Add to conversation history
-            self.add_to_conversation("user", user_preferences)
-            self.add_to_conversation("assistant", result)
-            
-            return result
+            return response.choices[0].message.content
             
         except Exception as e:
-            return f"Sorry, I encountered an error while analyzing your preferences: {str(e)}"
+            return NON_SEARCH_FALLBACK_REPLY
     
-    def handle_non_search_message(self, message: str) -> str:
-        """Handle non-search messages using ChatGPT"""
-        system_prompt = """Ви дружній бот для бізнес-нетворкінгу Business Match. 
-        Відповідайте українською мовою на повідомлення користувачів.
-        Якщо користувач дякує або пише привітання, відповідайте коротко та дружньо.
-        Якщо користувач запитує щось не пов'язане з пошуком експертів, вежливо направте їх до пошуку."""
-        
+    async def handle_non_search_message_async(self, message: str, intent: Intent = None) -> str:
+        """Async version of handle_non_search_message"""
+        reply = self._canned_reply(message, intent)
+        if reply:
+            return reply
         try:
-            response = self.client.chat.completions.create(
+            response = await self.async_client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": NON_SEARCH_SYSTEM_PROMPT},
                     {"role": "user", "content": message}
                 ],
                 max_tokens=200,
@@ -225,7 +371,7 @@ class ChatGPTHandler:
             return response.choices[0].message.content
             
         except Exception as e:
-            return "Дякую за звернення! Якщо потрібно знайти бізнес-експертів, просто опишіть, кого ви шукаєте."
+            return NON_SEARCH_FALLBACK_REPLY
     
     def get_greeting_message(self) -> str:
         """Generate personalized greeting message"""
@@ -14,6 +14,84 @@ ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
 
 # Data Configuration
 USERS_CSV_PATH = 'users.csv'
+PROFILE_STORE_PATH = os.getenv('PROFILE_STORE_PATH', 'users.profiles.bin')  # Compiled users.csv; empty disables
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '40'))  # Candidates retrieved for the fallback matcher
+FALLBACK_CONTEXT_TOKENS = int(os.getenv('FALLBACK_CONTEXT_TOKENS', '4000'))  # Prompt budget for those candidates
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai')  # 'openai', 'hashing' (offline) or 'off'
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIR = os.getenv('EMBEDDING_DIR', 'embeddings')  # Memory-mapped profile embedding matrices
+PROFILE_RELOAD_INTERVAL = float(os.getenv('PROFILE_RELOAD_INTERVAL', '5'))  # Seconds between checks for a changed CSV; 0 disables
 
 # Bot Configuration
 MAX_MATCHES = 3
+
+# Update Dispatcher Configuration
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '8'))
+MAX_QUEUED_UPDATES = int(os.getenv('MAX_QUEUED_UPDATES', '1000'))
+DISPATCHER_STATS_INTERVAL = int(os.getenv('DISPATCHER_STATS_INTERVAL', '300'))
+DEDUP_WINDOW_SIZE = int(os.getenv('DEDUP_WINDOW_SIZE', '10000'))  # Recent update ids remembered
+
+# Runtime Configuration ("sync" thread-based bot or "async" asyncio bot)
+BOT_RUNTIME = os.getenv('BOT_RUNTIME', 'sync')
+ASYNC_MAX_CONCURRENT_UPDATES = int(os.getenv('ASYNC_MAX_CONCURRENT_UPDATES', '1000'))
+
+# Update Ingestion Configuration ("polling" via getUpdates or "webhook")
+UPDATE_MODE = os.getenv('UPDATE_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Public HTTPS base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+
+# Search Quota Configuration (token bucket per plan)
+QUOTA_BACKEND = os.getenv('QUOTA_BACKEND', 'sqlite')  # "sqlite" (shared, persistent) or "memory"
+QUOTA_DB_PATH = os.getenv('QUOTA_DB_PATH', 'bot_chats.db')
+SEARCH_QUOTA_PLANS = {
+    'free': {'capacity': 1, 'period_hours': 24},
+    'pro': {'capacity': 10, 'period_hours': 24},
+}
+DEFAULT_SEARCH_PLAN = os.getenv('DEFAULT_SEARCH_PLAN', 'free')
+
+# Supervisor Mode (BOT_WORKERS > 1 runs one ingestion process plus N worker processes)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+WORKER_HEARTBEAT_INTERVAL = int(os.getenv('WORKER_HEARTBEAT_INTERVAL', '5'))
+WORKER_HEARTBEAT_TIMEOUT = int(os.getenv('WORKER_HEARTBEAT_TIMEOUT', '60'))
+
+# Outbound Send Queue (Telegram limits: ~30 msg/s overall, ~1 msg/s per chat, 20 msg/min per group)
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '4'))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', str(20 / 60)))
+TELEGRAM_CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+# HTTP Transport (shared pooled sessions for Telegram and ElevenLabs)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+
+# User Sessions
+SESSION_MAX_USERS = int(os.getenv('SESSION_MAX_USERS', '10000'))
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', str(6 * 3600)))
+MAX_HISTORY_MESSAGES = int(os.getenv('MAX_HISTORY_MESSAGES', '20'))
+
+# Background Audio Jobs
+AUDIO_JOB_WORKERS = int(os.getenv('AUDIO_JOB_WORKERS', '2'))
+AUDIO_JOB_QUEUE_SIZE = int(os.getenv('AUDIO_JOB_QUEUE_SIZE', '100'))
+AUDIO_JOB_MAX_RETRIES = int(os.getenv('AUDIO_JOB_MAX_RETRIES', '2'))
+
+# Audio Output and Cache
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', '/tmp/business_match_audio')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+AUDIO_SUMMARY_MEMO_SIZE = int(os.getenv('AUDIO_SUMMARY_MEMO_SIZE', '1000'))
+AUDIO_FORMAT = os.getenv('AUDIO_FORMAT', 'mp3')  # 'mp3' (audio file) or 'ogg' (OGG/Opus voice note)
+
+# Chitchat Replies
+CANNED_REPLIES_PATH = os.getenv('CANNED_REPLIES_PATH', 'canned_replies.json')
+
+# Search Result Cache (keyed by normalised query, profile version and prompt version)
+QUERY_CACHE_DB_PATH = os.getenv('QUERY_CACHE_DB_PATH', 'bot_chats.db')
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', str(24 * 3600)))  # 0 disables the cache
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '5000'))
+QUERY_CACHE_SIMILARITY = float(os.getenv('QUERY_CACHE_SIMILARITY', '0'))  # Cosine threshold for paraphrase hits; 0 disables
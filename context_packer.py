@@ -0,0 +1,227 @@
+"""
+Token-budget-aware prompt context builder.
+Ranked candidates are rendered into compact snippets (long fields
+truncated, multi-values joined on one line) and packed in rank order
+until the token budget is spent. Snippets are cached per profile
+version, so a repeat candidate costs a dict lookup.
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Characters kept per field; longer values are cut at a word boundary
+DEFAULT_FIELD_LIMIT = 160
+FIELD_LIMITS = {
+    'self_description': 300,
+    'achievements': 160,
+    'business_needs': 140,
+    'open_to': 120,
+    'goals': 100,
+    'reviews': 120,
+    'interesting_facts': 100,
+    'interests': 80,
+}
+
+# Packing stops when less than this is left or after this many candidates in a row did not fit
+MIN_USEFUL_TOKENS = 40
+MAX_SKIPS_IN_ROW = 10
+
+_SPACES = re.compile(r"[ \t]+")
+_LEADING_SYMBOLS = re.compile(r"^[^\w(\"'«]+")
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding of the chat models, or None to estimate"""
+    global _encoding
+    if tiktoken is None:
+        return None
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"⚠️ tiktoken unavailable, estimating tokens: {e}")
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in a text: exact with tiktoken, otherwise ~4 UTF-8 bytes per token"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def compact_value(value: str, limit: int) -> str:
+    """One-line field value: multi-values joined by commas without emoji bullets, cut to `limit` characters"""
+    parts = [_LEADING_SYMBOLS.sub("", _SPACES.sub(" ", part).strip()) for part in value.split("\n")]
+    value = ", ".join(part for part in parts if part)
+    if len(value) <= limit:
+        return value
+    cut = value.rfind(" ", 0, limit)
+    return value[:cut if cut > limit // 2 else limit].rstrip(" ,.;") + "…"
+
+
+class SnippetFormat(NamedTuple):
+    name: str                           # Cache key of rendered snippets
+    header: str                         # Text before the first profile
+    item: str                           # Numbered heading of each profile, e.g. "User {number}:\n"
+    fields: Tuple[Tuple[str, str], ...]  # (label, record field) per line
+    separator: str = "---\n\n"
+
+
+class PackedContext(NamedTuple):
+    text: str
+    doc_ids: List[int]   # Candidates included, in order
+    tokens: int          # Estimated tokens of `text`
+    skipped: int         # Candidates that did not fit
+
+
+class ContextPacker:
+    """
+    Packs ranked candidates of a ProfileSnapshot into a token budget.
+    Candidates are taken in rank order; one that does not fit is skipped
+    so a shorter one further down can still use the remaining budget.
+    """
+
+    def __init__(self, snippet_format: SnippetFormat, token_budget: Optional[int] = None,
+                 field_limits: Dict[str, int] = FIELD_LIMITS):
+        self.format = snippet_format
+        self.token_budget = token_budget
+        self.field_limits = field_limits
+        self._header_tokens = count_tokens(snippet_format.header)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._packs = 0
+        self._packed_candidates = 0
+        self._packed_tokens = 0
+        self._skipped = 0
+        self._snippet_hits = 0
+        self._snippet_misses = 0
+
+    def _render(self, record) -> str:
+        lines = []
+        for label, field in self.format.fields:
+            value = getattr(record, field)
+            if value:
+                value = compact_value(value, self.field_limits.get(field, DEFAULT_FIELD_LIMIT))
+            lines.append(f"{label}: {value}\n")
+        return "".join(lines) + self.format.separator
+
+    def pack(self, snapshot, doc_ids: Iterable[int], token_budget: Optional[int] = None) -> PackedContext:
+        """Context text with as many of the ranked candidates as fit into the budget"""
+        budget = token_budget if token_budget is not None else self.token_budget
+        remaining = budget - self._header_tokens if budget is not None else None
+        # Rendered snippets and their token counts, cached for the snapshot's version
+        cache = snapshot.get_view(f"snippets:{self.format.name}", lambda records: {})
+
+        parts = [self.format.header]
+        included = []
+        skipped = 0
+        skipped_in_row = 0
+        hits = 0
+        for doc_id in doc_ids:
+            cached = cache.get(doc_id)
+            if cached is None:
+                text = self._render(snapshot.records[doc_id])
+                cached = cache[doc_id] = (text, count_tokens(text))
+            else:
+                hits += 1
+            body, body_tokens = cached
+
+            heading = self.format.item.format(number=len(included) + 1)
+            # A heading is a few tokens; estimating it saves a tokenizer call per candidate
+            tokens = body_tokens + len(heading) // 3 + 1
+            if remaining is not None:
+                if tokens > remaining:
+                    skipped += 1
+                    skipped_in_row += 1
+                    if remaining < MIN_USEFUL_TOKENS or skipped_in_row >= MAX_SKIPS_IN_ROW:
+                        break
+                    continue
+                remaining -= tokens
+            skipped_in_row = 0
+            parts.append(heading)
+            parts.append(body)
+            included.append(doc_id)
+
+        text = "".join(parts)
+        used = budget - remaining if budget is not None else count_tokens(text)
+        with self._lock:
+            self._packs += 1
+            self._packed_candidates += len(included)
+            self._packed_tokens += used
+            self._skipped += skipped
+            self._snippet_hits += hits
+            self._snippet_misses += len(included) + skipped - hits
+        return PackedContext(text, included, used, skipped)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Average candidates and tokens per packed context, snippet cache hit rate"""
+        with self._lock:
+            lookups = self._snippet_hits + self._snippet_misses
+            return {
+                'packs': self._packs,
+                'avg_candidates': self._packed_candidates / self._packs if self._packs else 0.0,
+                'avg_tokens': self._packed_tokens / self._packs if self._packs else 0.0,
+                'skipped_candidates': self._skipped,
+                'snippet_hit_rate': self._snippet_hits / lookups if lookups else 0.0,
+                'tokenizer': 'tiktoken' if _get_encoding() is not None else 'estimate',
+            }
+
+
+# Candidate list of the fallback matching prompt
+MATCHING_FORMAT = SnippetFormat(
+    name="matching",
+    header="Business Match Users Database (Sample):\n\n",
+    item="Професіонал {number}:\n",
+    fields=(
+        ("Ім'я", 'name'),
+        ("Локація", 'location'),
+        ("Бізнес-сектор", 'business_sector'),
+        ("Цілі", 'goals'),
+        ("Шукає", 'looking_for'),
+        ("Відкритий до", 'open_to'),
+        ("Бізнес-потреби", 'business_needs'),
+        ("Компанії", 'companies'),
+        ("Досягнення", 'achievements'),
+    ),
+)
+
+# Full profile listing (every field)
+DATABASE_FORMAT = SnippetFormat(
+    name="database",
+    header="Business Match Users Database:\n\n",
+    item="User {number}:\n",
+    fields=(
+        ("Name", 'name'),
+        ("Location", 'location'),
+        ("Business Sector", 'business_sector'),
+        ("Goals", 'goals'),
+        ("Interests", 'interests'),
+        ("Business Needs", 'business_needs'),
+        ("Looking for", 'looking_for'),
+        ("Open to", 'open_to'),
+        ("Self Description", 'self_description'),
+        ("Achievements", 'achievements'),
+        ("Interesting Facts", 'interesting_facts'),
+        ("Reviews", 'reviews'),
+        ("Social Links", 'social_links'),
+        ("Companies", 'companies'),
+        ("Business Sectors", 'business_sectors'),
+    ),
+)
@@ -1,64 +1,298 @@
-import pandas as pd
+import hashlib
+import io
 import json
-from typing import List, Dict, Any
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from context_packer import DATABASE_FORMAT, ContextPacker
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = {
+    'name': 'Імʼя і прізвище',
+    'location': 'Локація',
+    'goals': 'Цілі',
+    'business_sector': 'Сфера бізнесу',
+    'interests': 'Захоплення',
+    'business_needs': 'Бізнес потреби',
+    'reviews': 'Відгуки про людину',
+    'social_links': 'Посилання на соц.мережі',
+    'achievements': 'Досягнення, якими пишається',
+    'business_sectors': 'Сфери бізнесу',
+    'companies': 'Компанії',
+    'self_description': 'Опис від людини',
+    'looking_for': 'Кого шукає',
+    'open_to': 'Відкритий до',
+    'interesting_facts': 'Цікаві факти про мене'
+}
+
+
+_database_packer = ContextPacker(DATABASE_FORMAT)
+
+
+class UserRecord(namedtuple('UserRecord', list(USER_COLUMNS))):
+    """Immutable profile row; fields are also readable by key (`user['name']`)"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+
+class ProfileRecords(tuple):
+    """Records of one profile version; `facet_members` holds facets precomputed by the profile store"""
+    facet_members = None
+
+
+class ProfileSnapshot:
+    """
+    One immutable version of the profile base: the records, the indexes
+    built on them and lazily derived views. A request that holds a
+    snapshot keeps seeing the same version while newer ones are swapped in.
+    """
+
+    __slots__ = ('version', 'digest', '_df', 'records', 'indexes', '_views', '_views_lock')
+
+    def __init__(self, version: int, digest: str, df: Optional["pandas.DataFrame"],
+                 records: Tuple[UserRecord, ...], indexes: Dict[str, Any]):
+        self.version = version
+        self.digest = digest
+        self._df = df
+        self.records = records
+        self.indexes: Mapping[str, Any] = MappingProxyType(indexes)
+        self._views: Dict[str, Any] = {}
+        self._views_lock = threading.Lock()
+
+    def get_view(self, name: str, builder: Callable[[Tuple[UserRecord, ...]], Any]) -> Any:
+        """Value derived from the records, built once for this snapshot"""
+        view = self._views.get(name)
+        if view is None:
+            with self._views_lock:
+                view = self._views.get(name)
+                if view is None:
+                    view = self._views[name] = builder(self.records)
+        return view
+
+    @property
+    def df(self) -> "pandas.DataFrame":
+        """Records as a DataFrame; pandas is only imported when this is used"""
+        if self._df is None:
+            import pandas as pd
+            self._df = pd.DataFrame(self.records, columns=list(USER_COLUMNS.values()))
+        return self._df
+
+
+def parse_profiles(data: bytes) -> Tuple["pandas.DataFrame", ProfileRecords]:
+    """Parse and validate CSV contents; raises ValueError if they are unusable"""
+    import pandas as pd
+
+    df = pd.read_csv(io.BytesIO(data))
+    missing = [column for column in USER_COLUMNS.values() if column not in df.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    if df.empty:
+        raise ValueError("no profiles")
+
+    frame = df[list(USER_COLUMNS.values())]
+    # Whole-frame conversion instead of per-cell str() in a Python loop
+    frame = frame.astype(str).mask(frame.isna(), "")
+    records = ProfileRecords(map(UserRecord._make, frame.itertuples(index=False, name=None)))
+    return df, records
+
 
 class DataHandler:
-    def __init__(self, csv_path: str):
-        self.df = pd.read_csv(csv_path)
-        self.columns = {
-            'name': 'Імʼя і прізвище',
-            'location': 'Локація', 
-            'goals': 'Цілі',
-            'business_sector': 'Сфера бізнесу',
-            'interests': 'Захоплення',
-            'business_needs': 'Бізнес потреби',
-            'reviews': 'Відгуки про людину',
-            'social_links': 'Посилання на соц.мережі',
-            'achievements': 'Досягнення, якими пишається',
-            'business_sectors': 'Сфери бізнесу',
-            'companies': 'Компанії',
-            'self_description': 'Опис від людини',
-            'looking_for': 'Кого шукає',
-            'open_to': 'Відкритий до',
-            'interesting_facts': 'Цікаві факти про мене'
-        }
-    
-    def get_all_users(self) -> List[Dict[str, Any]]:
-        """Get all users as list of dictionaries"""
-        users = []
-        for _, row in self.df.iterrows():
-            user = {}
-            for key, column in self.columns.items():
-                user[key] = str(row[column]) if pd.notna(row[column]) else ""
-            users.append(user)
-        return users
-    
-    def get_user_context_for_chatgpt(self) -> str:
-        """Create context string for ChatGPT about all users"""
-        users = self.get_all_users()
-        context = "Business Match Users Database:\n\n"
-        
-        for i, user in enumerate(users, 1):
-            context += f"User {i}:\n"
-            context += f"Name: {user['name']}\n"
-            context += f"Location: {user['location']}\n"
-            context += f"Business Sector: {user['business_sector']}\n"
-            context += f"Goals: {user['goals']}\n"
-            context += f"Interests: {user['interests']}\n"
-            context += f"Business Needs: {user['business_needs']}\n"
-            context += f"Looking for: {user['looking_for']}\n"
-            context += f"Open to: {user['open_to']}\n"
-            context += f"Self Description: {user['self_description']}\n"
-            context += f"Achievements: {user['achievements']}\n"
-            context += f"Interesting Facts: {user['interesting_facts']}\n"
-            context += f"Reviews: {user['reviews']}\n"
-            context += f"Social Links: {user['social_links']}\n"
-            context += f"Companies: {user['companies']}\n"
-            context += f"Business Sectors: {user['business_sectors']}\n"
-            context += "---\n\n"
-        
-        return context
+    """
+    Profile base loaded from the users CSV.
+
+    The current ProfileSnapshot is replaced as a whole: a watcher thread
+    notices a changed file, parses and validates it and builds every
+    registered index off the request path, then swaps the new snapshot in
+    with a single assignment. A broken file is logged and the previous
+    version keeps serving.
+    """
+
+    def __init__(self, csv_path: str, reload_interval: float = 0, store_path: str = None,
+                 compile_store: bool = True):
+        self.csv_path = csv_path
+        self.store_path = store_path  # Compiled profile store, used while it matches the CSV
+        # Off in supervisor workers: they wait for the store the supervisor compiles
+        # instead of each parsing and indexing a changed CSV themselves
+        self.compile_store = compile_store
+        self.columns = USER_COLUMNS
+        self.reload_interval = reload_interval
+        self._index_builders: Dict[str, Callable[[Tuple[UserRecord, ...]], Any]] = {}
+        self._reload_lock = threading.Lock()  # One reload or index registration at a time
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._waiting_for: Optional[Tuple[int, int]] = None  # CSV signature without a compiled store yet
+
+        # Metrics
+        self._reloads = 0
+        self._failed_reloads = 0
+        self._last_reload_seconds = 0.0
+
+        signature = self._file_signature()
+        with open(self.csv_path, 'rb') as f:
+            data = f.read()
+        self._signature = signature
+        self._snapshot = self._build_snapshot(1, data)
+
+        if reload_interval > 0:
+            self._watcher = threading.Thread(target=self._watch_loop, name="profile-watcher", daemon=True)
+            self._watcher.start()
+
+    @property
+    def df(self) -> "pandas.DataFrame":
+        return self._snapshot.df
+
+    def snapshot(self) -> ProfileSnapshot:
+        """Current profile version; hold on to it for a consistent view across a request"""
+        return self._snapshot
+
+    def get_all_users(self) -> Tuple[UserRecord, ...]:
+        """All users as an immutable tuple of records"""
+        return self._snapshot.records
+
+    def get_view(self, name: str, builder: Callable[[Tuple[UserRecord, ...]], Any]) -> Any:
+        """Value derived from the current records, built once per version"""
+        return self._snapshot.get_view(name, builder)
+
+    def get_index(self, name: str) -> Any:
+        """Index registered under `name`, built on the current records"""
+        return self._snapshot.indexes[name]
 
+    def register_index(self, name: str, builder: Callable[[Tuple[UserRecord, ...]], Any],
+                       optional: bool = False) -> bool:
+        """
+        Build an index for the current records now and rebuild it for
+        every new version before that version is swapped in. An `optional`
+        index whose first build returns None is left out; returns whether
+        the index was registered.
+        """
+        with self._reload_lock:
+            current = self._snapshot
+            index = builder(current.records)
+            if index is None and optional:
+                logger.warning(f"⚠️ Index {name} unavailable, continuing without it")
+                return False
+            self._index_builders[name] = builder
+            indexes = dict(current.indexes)
+            indexes[name] = index
+            snapshot = ProfileSnapshot(current.version, current.digest, current._df, current.records, indexes)
+            snapshot._views = current._views
+            self._snapshot = snapshot
+            return True
 
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
 
+    def _read_records(self, data: bytes, digest: str,
+                      parse: bool = True) -> Optional[Tuple[Optional["pandas.DataFrame"], ProfileRecords]]:
+        """Records from the compiled store if it was built from this CSV, else parsed (None without `parse`)"""
+        if not self.store_path:
+            return parse_profiles(data)
+
+        from profile_store import load_store
+
+        records = load_store(self.store_path, digest)
+        if records is not None:
+            return None, records
+        if not parse:
+            return None
+        return parse_profiles(data)
+
+    def _build_snapshot(self, version: int, data: bytes, parse: bool = True) -> Optional[ProfileSnapshot]:
+        digest = hashlib.sha256(data).hexdigest()
+        loaded = self._read_records(data, digest, parse)
+        if loaded is None:
+            return None
+        df, records = loaded
+        indexes = {name: builder(records) for name, builder in self._index_builders.items()}
+        if df is not None and self.store_path and self.compile_store:
+            # Written after the indexes (and the embeddings they store), so a
+            # worker that finds the store for this CSV finds those as well
+            from profile_store import write_store
+            try:
+                write_store(self.store_path, digest, records)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error writing profile store {self.store_path}: {e}")
+        return ProfileSnapshot(version, digest, df, records, indexes)
+
+    def reload(self) -> bool:
+        """Load the CSV again if it changed; returns whether a new version was swapped in"""
+        with self._reload_lock:
+            try:
+                signature = self._file_signature()
+            except OSError as e:
+                logger.error(f"Error checking {self.csv_path}: {e}")
+                return False
+            if signature == self._signature:
+                return False
+
+            started = time.monotonic()
+            try:
+                with open(self.csv_path, 'rb') as f:
+                    data = f.read()
+                current = self._snapshot
+                if hashlib.sha256(data).hexdigest() == current.digest:
+                    # Touched but not changed
+                    self._signature = signature
+                    return False
+                snapshot = self._build_snapshot(current.version + 1, data, parse=self.compile_store)
+                if snapshot is None:
+                    # Checked again next time until the compiled store shows up
+                    if self._waiting_for != signature:
+                        self._waiting_for = signature
+                        logger.info(f"⏳ {self.csv_path} changed, waiting for its compiled profile store")
+                    return False
+            except Exception as e:
+                # The previous version keeps serving until the file changes again
+                self._signature = signature
+                self._failed_reloads += 1
+                logger.error(f"❌ Rejected new version of {self.csv_path}: {e}")
+                return False
+
+            self._snapshot = snapshot
+            self._signature = signature
+            self._reloads += 1
+            self._last_reload_seconds = time.monotonic() - started
+            logger.info(f"🔄 Loaded profiles v{snapshot.version}: {len(snapshot.records)} users "
+                        f"in {self._last_reload_seconds:.2f}s")
+            return True
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Error in profile watcher: {e}")
+
+    def close(self):
+        """Stop watching the CSV"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current version and reload counters"""
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'users': len(snapshot.records),
+            'indexes': list(snapshot.indexes),
+            'reloads': self._reloads,
+            'failed_reloads': self._failed_reloads,
+            'last_reload_seconds': self._last_reload_seconds,
+        }
 
+    def get_user_context_for_chatgpt(self, token_budget: int = None) -> str:
+        """Create context string for ChatGPT about all users (as many as fit, given a budget)"""
+        snapshot = self._snapshot
+        return _database_packer.pack(snapshot, range(len(snapshot.records)), token_budget).text
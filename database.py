@@ -51,6 +51,128 @@ class Database:
             )
         ''')
         
+        # Bot runtime state (e.g. committed update offset)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Updates accepted but not yet handled (replayed after a crash)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_updates (
+                update_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Telegram file_ids of media already uploaded (reused instead of re-uploading)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_files (
+                asset_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    def get_bot_state(self, key: str, default: str = None) -> Optional[str]:
+        """Get a persisted bot state value"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT value FROM bot_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        
+        conn.close()
+        return row[0] if row else default
+    
+    def set_bot_state(self, key: str, value):
+        """Persist a bot state value"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO bot_state (key, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (key, str(value)))
+        
+        conn.commit()
+        conn.close()
+    
+    def add_pending_update(self, update_id: int, payload: str):
+        """Journal an update that has been accepted but not handled yet"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO pending_updates (update_id, payload)
+            VALUES (?, ?)
+        ''', (update_id, payload))
+        
+        conn.commit()
+        conn.close()
+    
+    def remove_pending_update(self, update_id: int):
+        """Remove a handled update from the journal"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM pending_updates WHERE update_id = ?', (update_id,))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_pending_updates(self) -> List[str]:
+        """Get journaled update payloads in update order"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT payload FROM pending_updates ORDER BY update_id')
+        payloads = [row[0] for row in cursor.fetchall()]
+        
+        conn.close()
+        return payloads
+    
+    def get_media_file_id(self, asset_key: str) -> Optional[str]:
+        """Get the Telegram file_id stored for a media asset"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT file_id FROM media_files WHERE asset_key = ?', (asset_key,))
+        row = cursor.fetchone()
+        
+        conn.close()
+        return row[0] if row else None
+    
+    def set_media_file_id(self, asset_key: str, file_id: str):
+        """Store the Telegram file_id of an uploaded media asset"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO media_files (asset_key, file_id, created_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (asset_key, file_id))
+        
+        conn.commit()
+        conn.close()
+    
+    def delete_media_file_id(self, asset_key: str, file_id: str = None):
+        """Forget a media file_id (only if it still matches `file_id`, when given)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if file_id is None:
+            cursor.execute('DELETE FROM media_files WHERE asset_key = ?', (asset_key,))
+        else:
+            cursor.execute('DELETE FROM media_files WHERE asset_key = ? AND file_id = ?', (asset_key, file_id))
+        
         conn.commit()
         conn.close()
     
@@ -0,0 +1,186 @@
+"""
+Concurrent update dispatcher for the Telegram bot.
+Fans updates out to a bounded worker pool while keeping updates
+from the same chat strictly in order.
+"""
+
+import threading
+import logging
+import queue
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key_for_update(update: dict) -> Any:
+    """Return the ordering key for an update (chat id, or update id as a fallback)"""
+    for field in ("message", "edited_message", "channel_post", "callback_query"):
+        payload = update.get(field)
+        if not payload:
+            continue
+        if field == "callback_query":
+            payload = payload.get("message") or {}
+        chat = payload.get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+    return ("update", update.get("update_id"))
+
+
+class UpdateDispatcher:
+    """
+    Bounded worker pool with per-chat ordering.
+
+    Each chat gets its own FIFO of pending updates; at most one worker
+    processes a given chat at a time, so replies to one user never
+    overtake each other while different users are served in parallel.
+    The total number of pending updates is capped - `submit` blocks
+    (backpressure) once `max_queue_size` updates are waiting.
+    """
+
+    def __init__(self, handler: Callable[[dict], None], max_workers: int = 8,
+                 max_queue_size: int = 1000,
+                 key_func: Callable[[dict], Any] = chat_key_for_update,
+                 on_complete: Optional[Callable[[dict], None]] = None):
+        self.handler = handler
+        self.on_complete = on_complete
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.key_func = key_func
+
+        self._lock = threading.Lock()
+        self._chat_queues: Dict[Any, deque] = {}
+        self._ready = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_queue_size)
+        self._workers = []
+        self._running = False
+
+        # Metrics
+        self._pending = 0
+        self._max_pending = 0
+        self._active = 0
+        self._submitted = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_handle = 0.0
+
+    def start(self):
+        """Start worker threads"""
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"update-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"🧵 Update dispatcher started with {self.max_workers} workers (queue limit {self.max_queue_size})")
+
+    def submit(self, update: dict, timeout: Optional[float] = None) -> bool:
+        """
+        Queue an update for processing.
+        Blocks while the queue is full; returns False if `timeout` expires first.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"⚠️ Dispatcher queue full, rejected update {update.get('update_id')}")
+            return False
+
+        key = self.key_func(update)
+        with self._lock:
+            self._submitted += 1
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+            chat_queue = self._chat_queues.get(key)
+            item = (update, time.monotonic())
+            if chat_queue is None:
+                # Chat is idle - schedule it
+                self._chat_queues[key] = deque([item])
+                self._ready.put(key)
+            else:
+                # A worker already owns this chat, it will pick the update up in order
+                chat_queue.append(item)
+        return True
+
+    def _worker_loop(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                break
+
+            with self._lock:
+                update, queued_at = self._chat_queues[key].popleft()
+                self._active += 1
+
+            started = time.monotonic()
+            try:
+                self.handler(update)
+                failed = False
+            except Exception as e:
+                failed = True
+                logger.error(f"Error handling update {update.get('update_id')}: {e}")
+            finished = time.monotonic()
+
+            if self.on_complete:
+                try:
+                    self.on_complete(update)
+                except Exception as e:
+                    logger.error(f"Error in completion callback for update {update.get('update_id')}: {e}")
+
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self._processed += 1
+                if failed:
+                    self._failed += 1
+                self._total_wait += started - queued_at
+                self._total_handle += finished - started
+
+                if self._chat_queues[key]:
+                    # More updates for this chat - requeue behind other chats for fairness
+                    self._ready.put(key)
+                else:
+                    del self._chat_queues[key]
+            self._slots.release()
+
+    def shutdown(self, wait: bool = True):
+        """Stop workers after the queued updates are processed"""
+        if not self._running:
+            return
+        self._running = False
+        if wait:
+            while True:
+                with self._lock:
+                    if self._pending == 0:
+                        break
+                time.sleep(0.05)
+        for _ in self._workers:
+            self._ready.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        self._workers = []
+        logger.info("🧵 Update dispatcher stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get dispatcher metrics"""
+        with self._lock:
+            processed = self._processed
+            return {
+                'workers': self.max_workers,
+                'queue_limit': self.max_queue_size,
+                'queue_depth': self._pending - self._active,
+                'pending': self._pending,
+                'max_pending': self._max_pending,
+                'active': self._active,
+                'active_chats': len(self._chat_queues),
+                'submitted': self._submitted,
+                'processed': processed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'avg_wait_seconds': self._total_wait / processed if processed else 0.0,
+                'avg_handle_seconds': self._total_handle / processed if processed else 0.0,
+            }
@@ -0,0 +1,265 @@
+"""
+Dense-embedding profile index for matching by meaning.
+Profile vectors are kept in one L2-normalised float32 matrix saved as
+.npy and opened with mmap, so a restart loads it instead of embedding
+every profile again; cosine top-k is a single matrix-vector product.
+The embedder is pluggable: OpenAI embeddings in production, a hashed
+n-gram embedder offline and in tests.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_DIR
+from text_processing import analyze_query
+
+logger = logging.getLogger(__name__)
+
+# Name under which the index is registered with DataHandler
+EMBEDDING_INDEX = "embeddings"
+
+# Profile fields embedded, in order of importance
+PROFILE_FIELDS = ('business_sector', 'business_sectors', 'companies', 'self_description',
+                  'achievements', 'open_to', 'goals')
+
+# Profile texts sent to the embeddings API per request
+EMBEDDING_BATCH_SIZE = 256
+
+# Seconds one embeddings request may take - a hanging API must not hold up startup
+EMBEDDING_REQUEST_TIMEOUT = 30
+
+
+def profile_text(record) -> str:
+    """Text that represents a profile for embedding"""
+    return "\n".join(value for value in (getattr(record, field) for field in PROFILE_FIELDS) if value)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: stemmed terms and their character trigrams hashed
+    into a fixed number of signed buckets. Deterministic and free, good
+    enough for tests and as a fallback without API access.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term in analyze_query(text):
+            features = [(term, 1.0)]
+            padded = f"<{term}>"
+            features.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        return vector
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize_rows(np.stack([self._vector(text) for text in texts]))
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings, with a small memo for repeated queries"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, client=None, memo_size: int = 1000):
+        self.model = model
+        self.name = f"openai-{model}"
+        self._client = client
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai_client import get_openai_client
+            self._client = get_openai_client()
+        return self._client
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            # The API rejects empty strings
+            batch = [text or " " for text in texts[start:start + EMBEDDING_BATCH_SIZE]]
+            response = self.client.embeddings.create(model=self.model, input=batch,
+                                                     timeout=EMBEDDING_REQUEST_TIMEOUT)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        with self._lock:
+            vector = self._memo.get(text)
+            if vector is not None:
+                self._memo.move_to_end(text)
+                return vector
+        vector = self.embed([text])[0]
+        with self._lock:
+            self._memo[text] = vector
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return vector
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND):
+    """Embedder for the configured backend, or None if embeddings are off"""
+    if backend == "openai":
+        return OpenAIEmbedder()
+    if backend == "hashing":
+        return HashingEmbedder()
+    return None
+
+
+class EmbeddingIndex:
+    """Cosine top-k over a (profiles x dim) float32 matrix of unit vectors"""
+
+    def __init__(self, matrix: np.ndarray, embedder, dataset_key: str):
+        self.matrix = matrix
+        self.embedder = embedder
+        self.dataset_key = dataset_key
+
+    @property
+    def size(self) -> int:
+        return self.matrix.shape[0]
+
+    def embed_query(self, text: str) -> np.ndarray:
+        embed_query = getattr(self.embedder, "embed_query", None)
+        return embed_query(text) if embed_query else self.embedder.embed([text])[0]
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Top-k (record index, cosine similarity) pairs for a query, best first"""
+        if not self.size or k <= 0:
+            return []
+        scores = self.matrix @ self.embed_query(query)
+        if self.size > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(self.size)
+        ranked = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
+
+    def get_stats(self) -> Dict[str, object]:
+        return {'profiles': self.size, 'dim': int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+                'embedder': self.embedder.name, 'dataset_key': self.dataset_key[:16]}
+
+
+class EmbeddingStore:
+    """
+    On-disk matrices, one per embedder and dataset. Each `.npy` has a JSON
+    sidecar naming the dataset key it was built for and the digest of
+    every row's text, so a changed CSV only re-embeds the changed profiles.
+    """
+
+    def __init__(self, directory: str = EMBEDDING_DIR):
+        self.directory = directory
+
+    def _paths(self, embedder_name: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"profiles-{embedder_name}")
+        return f"{base}.npy", f"{base}.json"
+
+    def load(self, embedder_name: str) -> Tuple[Optional[np.ndarray], Dict]:
+        """Memory-mapped matrix and sidecar of the latest build, or (None, {})"""
+        matrix_path, meta_path = self._paths(embedder_name)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None, {}
+        if matrix.shape[0] != len(meta.get("row_digests", ())):
+            logger.warning(f"⚠️ Ignoring inconsistent embedding matrix {matrix_path}")
+            return None, {}
+        return matrix, meta
+
+    def save(self, embedder_name: str, matrix: np.ndarray, meta: Dict) -> np.ndarray:
+        """Write the matrix and sidecar atomically; returns the memory-mapped copy"""
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path, meta_path = self._paths(embedder_name)
+        tmp_matrix = f"{matrix_path}.{os.getpid()}.tmp.npy"
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        np.save(tmp_matrix, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # The sidecar goes last; a reader seeing a new matrix with the old
+        # sidecar finds the digests inconsistent and rebuilds
+        os.replace(tmp_matrix, matrix_path)
+        os.replace(tmp_meta, meta_path)
+        return np.load(matrix_path, mmap_mode="r")
+
+
+def build_embedding_index(records: Sequence, embedder=None, store: EmbeddingStore = None,
+                          load_only: bool = False) -> Optional[EmbeddingIndex]:
+    """
+    Embedding index for the records: loaded from disk when the stored
+    matrix matches them, otherwise built, reusing the stored vectors of
+    unchanged profiles. Returns None (and logs) if embedding fails, so a
+    profile update is never rejected because the embeddings API is down.
+    With `load_only` (supervisor workers) it never embeds, only loads.
+    """
+    embedder = embedder or create_embedder()
+    if embedder is None:
+        return None
+    store = store or EmbeddingStore()
+    started = time.monotonic()
+
+    texts = [profile_text(record) for record in records]
+    row_digests = [hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] for text in texts]
+    dataset_key = hashlib.sha256("\n".join(row_digests).encode("ascii")).hexdigest()
+
+    stored, meta = store.load(embedder.name)
+    if stored is not None and meta.get("dataset_key") == dataset_key:
+        logger.info(f"🧭 Loaded {stored.shape[0]} profile embeddings ({embedder.name}) "
+                    f"in {time.monotonic() - started:.2f}s")
+        return EmbeddingIndex(stored, embedder, dataset_key)
+    if load_only:
+        logger.warning(f"⚠️ No stored profile embeddings ({embedder.name}) match the profiles - "
+                       f"matching without them")
+        return None
+
+    previous = {}
+    if stored is not None:
+        previous = {digest: row for row, digest in enumerate(meta["row_digests"])}
+    missing = [i for i, digest in enumerate(row_digests) if digest not in previous]
+
+    try:
+        fresh = embedder.embed([texts[i] for i in missing])
+    except Exception as e:
+        logger.error(f"❌ Error embedding profiles with {embedder.name}: {e}")
+        return None
+
+    dim = fresh.shape[1] if len(missing) else stored.shape[1]
+    matrix = np.empty((len(records), dim), dtype=np.float32)
+    for row, i in enumerate(missing):
+        matrix[i] = fresh[row]
+    for i, digest in enumerate(row_digests):
+        if digest in previous:
+            matrix[i] = stored[previous[digest]]
+
+    meta = {"dataset_key": dataset_key, "embedder": embedder.name, "dim": dim,
+            "count": len(records), "row_digests": row_digests}
+    try:
+        matrix = store.save(embedder.name, matrix, meta)
+    except OSError as e:
+        logger.error(f"Error saving profile embeddings: {e}")
+
+    logger.info(f"🧭 Built {len(records)} profile embeddings ({embedder.name}), "
+                f"{len(missing)} embedded, in {time.monotonic() - started:.2f}s")
+    return EmbeddingIndex(matrix, embedder, dataset_key)
@@ -0,0 +1,272 @@
+"""
+Faceted bitmap index over multi-valued profile fields.
+Newline-separated values (sectors, goals, "open to" options) and the
+city/country of each profile are normalised into facet values, each with
+an int bitmap of the profiles that have it, so a filter is a few bitwise
+ANDs/ORs and facet counts are popcounts.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from text_processing import TOKEN_RE, analyze, expand_terms, normalize
+
+logger = logging.getLogger(__name__)
+
+# Name under which the index is registered with DataHandler
+FACET_INDEX = "facets"
+
+# Facet -> profile fields its values come from
+FACET_FIELDS = {
+    'city': ('location',),
+    'country': ('location',),
+    'sector': ('business_sector', 'business_sectors'),
+    'goal': ('goals',),
+    'open_to': ('open_to',),
+    'looking_for': ('looking_for',),
+}
+
+# Bump whenever normalize_value or facet_values key values differently, so
+# facets precomputed into a profile store are rebuilt
+FACET_NORMALIZER_VERSION = 1
+
+# Facets a query may prefer candidates by. Sectors, goals and "looking
+# for" are left to the search indexes: a profile whose goal is "Find an
+# investor" is not an investor.
+QUERY_FACETS = ('city', 'country', 'open_to')
+
+# Words that negate the next few words of a query ("не з Києва", "not in Kyiv")
+NEGATIONS = frozenset({"не", "ні", "без", "крім", "окрім", "not", "without", "except", "no"})
+NEGATION_SCOPE = 2
+
+# Normalised place name -> prefixes of the stemmed words it is written with
+# in queries (Ukrainian forms in any case, other spellings). English names
+# match by their own stems.
+LOCATION_ALIASES = {
+    'kyiv': ["київ", "києв", "kiev"],
+    'lviv': ["львів", "львов"],
+    'odesa': ["одес", "odessa"],
+    'kharkiv': ["харк"],
+    'dnipro': ["дніпр"],
+    'vinnytsia': ["вінниц"],
+    'ternopil': ["терноп"],
+    'zaporizhzhia': ["запоріж"],
+    'rivne': ["рівн"],
+    'chernivtsi': ["чернівц"],
+    'uzhhorod': ["ужгород"],
+    'cherkasy': ["черкас"],
+    'khmelnytskyi': ["хмельниц"],
+    'ivano-frankivsk': ["івано-франків"],
+    'lutsk': ["луцьк"],
+    'poltava': ["полтав"],
+    'zhytomyr': ["житомир"],
+    'mykolaiv': ["миколаїв", "миколаєв"],
+    'irpin': ["ірп"],
+    'bila tserkva': ["біл церкв"],
+    'warsaw': ["варшав"],
+    'kraków': ["крак", "krakow"],
+    'munich': ["мюнхе"],
+    'london': ["лондо"],
+    'dubai': ["дуба"],
+    'ukraine': ["украї"],
+    'poland': ["польщ", "польськ"],
+    'germany': ["німеччи", "німецьк"],
+    'united kingdom': ["великобритан", "британ"],
+    'united arab emirates': ["оае", "емірат", "uae"],
+    'usa': ["сша", "амери", "unit stat"],
+}
+
+_LEADING_SYMBOLS = re.compile(r"^[^\w]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_value(value: str) -> str:
+    """Facet key of a raw value: emoji prefix dropped, casefolded, spacing collapsed"""
+    value = unicodedata.normalize("NFKC", value).replace("’", "'").replace("ʼ", "'")
+    return _SPACES.sub(" ", _LEADING_SYMBOLS.sub("", value)).strip().casefold()
+
+
+def _display_value(value: str) -> str:
+    return _SPACES.sub(" ", _LEADING_SYMBOLS.sub("", value)).strip()
+
+
+def facet_values(record, facet: str) -> Iterable[Tuple[str, str]]:
+    """(key, label) pairs of a profile for a facet"""
+    for field in FACET_FIELDS[facet]:
+        text = getattr(record, field)
+        if not text:
+            continue
+        if facet in ('city', 'country'):
+            city, _, country = text.rpartition(",")
+            values = [city if facet == 'city' else country] if city else ([] if facet == 'city' else [text])
+        else:
+            values = text.split("\n")
+        for value in values:
+            key = normalize_value(value)
+            if key:
+                yield key, _display_value(value)
+
+
+def facet_schema() -> str:
+    """Digest of the facet definitions and normaliser version that facet keys depend on"""
+    payload = json.dumps([FACET_NORMALIZER_VERSION, FACET_FIELDS], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _bitmap(doc_ids: List[int], size: int) -> int:
+    flags = np.zeros(size, dtype=bool)
+    flags[doc_ids] = True
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+def popcount(bitmap: int) -> int:
+    return bin(bitmap).count("1")
+
+
+def affirmed_terms(query: str) -> List[str]:
+    """Stemmed query terms (with crosswalk expansions) outside the scope of a negation"""
+    terms = []
+    negated_until = -1
+    for position, word in enumerate(TOKEN_RE.findall(normalize(query))):
+        if word in NEGATIONS:
+            negated_until = position + NEGATION_SCOPE
+            continue
+        if position <= negated_until:
+            continue
+        terms.extend(analyze(word))
+    return expand_terms(terms)
+
+
+class FacetIndex:
+    """Immutable facet -> value -> bitmap index built from profile records"""
+
+    def __init__(self, records: Sequence):
+        started = time.monotonic()
+        self.size = len(records)
+        self.all = (1 << self.size) - 1
+
+        self._bitmaps: Dict[str, Dict[str, int]] = {}
+        self._labels: Dict[str, Dict[str, str]] = {}
+        # Memberships precomputed by the profile store, if the records came from one
+        precomputed = getattr(records, 'facet_members', None) or {}
+        for facet in FACET_FIELDS:
+            if facet in precomputed:
+                entries = precomputed[facet]
+            else:
+                members: Dict[str, List[int]] = defaultdict(list)
+                labels: Dict[str, str] = {}
+                for doc_id, record in enumerate(records):
+                    for key, label in facet_values(record, facet):
+                        if not members[key] or members[key][-1] != doc_id:
+                            members[key].append(doc_id)
+                        labels.setdefault(key, label)
+                entries = [(key, labels[key], ids) for key, ids in members.items()]
+            self._bitmaps[facet] = {key: _bitmap(ids, self.size) for key, _, ids in entries}
+            self._labels[facet] = {key: label for key, label, _ in entries}
+
+        self._query_terms = self._build_query_terms()
+        self.build_seconds = time.monotonic() - started
+        logger.info(f"🏷️ Built facet index: {self.size} profiles, "
+                    f"{sum(len(values) for values in self._bitmaps.values())} values "
+                    f"in {self.build_seconds:.2f}s")
+
+    def _build_query_terms(self) -> Dict[str, List[Tuple[str, Tuple[str, ...], bool]]]:
+        """Per query facet: (key, words that must all appear in a query, whether they are prefixes)"""
+        terms = {}
+        for facet in QUERY_FACETS:
+            entries = []
+            for key in self._bitmaps[facet]:
+                stems = tuple(analyze(key))
+                if stems:
+                    entries.append((key, stems, False))
+                if facet in ('city', 'country'):
+                    entries.extend((key, tuple(alias.split()), True) for alias in LOCATION_ALIASES.get(key, ()))
+            terms[facet] = entries
+        return terms
+
+    def values(self, facet: str) -> List[str]:
+        """Known values of a facet, as displayed"""
+        return list(self._labels[facet].values())
+
+    def bitmap(self, facet: str, value: str) -> int:
+        """Profiles with a facet value (0 if unknown)"""
+        return self._bitmaps[facet].get(normalize_value(value), 0)
+
+    def filter(self, **facets: Iterable[str]) -> int:
+        """
+        Profiles matching every given facet (AND) with any of its values (OR),
+        e.g. filter(city=["Kyiv"], open_to=["Partnership"]).
+        """
+        result = self.all
+        for facet, values in facets.items():
+            if isinstance(values, str):
+                values = [values]
+            any_value = 0
+            for value in values:
+                any_value |= self.bitmap(facet, value)
+            result &= any_value
+        return result
+
+    def ids(self, bitmap: int) -> List[int]:
+        """Record indexes set in a bitmap, ascending"""
+        if not bitmap:
+            return []
+        data = np.frombuffer(bitmap.to_bytes((self.size + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(data, bitorder="little")[:self.size]).tolist()
+
+    def counts(self, facet: str, within: int = None) -> Dict[str, int]:
+        """Profiles per value of a facet, optionally inside a filter bitmap; largest first"""
+        labels = self._labels[facet]
+        counts = {}
+        for key, bitmap in self._bitmaps[facet].items():
+            count = popcount(bitmap if within is None else bitmap & within)
+            if count:
+                counts[labels[key]] = count
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def match_query(self, query: str) -> Dict[str, List[str]]:
+        """Query facet values mentioned (and not negated) in a search query, as facet -> keys"""
+        terms = affirmed_terms(query)
+        if not terms:
+            return {}
+        term_set = set(terms)
+        matched = {}
+        for facet, entries in self._query_terms.items():
+            keys = []
+            for key, words, prefixes in entries:
+                if key in keys:
+                    continue
+                if prefixes:
+                    found = all(any(term.startswith(word) for term in terms) for word in words)
+                else:
+                    found = term_set.issuperset(words)
+                if found:
+                    keys.append(key)
+            if keys:
+                matched[facet] = keys
+        return matched
+
+    def query_filter(self, query: str) -> Optional[int]:
+        """Bitmap of profiles satisfying the facets a query mentions, or None if it mentions none"""
+        matched = self.match_query(query)
+        if not matched:
+            return None
+        result = self.all
+        for facet, keys in matched.items():
+            any_value = 0
+            for key in keys:
+                any_value |= self._bitmaps[facet][key]
+            result &= any_value
+        return result
+
+    def get_stats(self) -> Dict[str, object]:
+        return {'profiles': self.size, 'values': {facet: len(values) for facet, values in self._bitmaps.items()},
+                'build_seconds': self.build_seconds}
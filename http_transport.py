@@ -0,0 +1,209 @@
+"""
+Shared HTTP transport for outgoing API traffic.
+One pooled keep-alive session per host, default connect/read timeouts,
+connection-level retries and per-endpoint latency histograms.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE, HTTP_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_BOT_TOKEN_RE = re.compile(r"/bot[^/]+")
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Metric label for a request, with the bot token redacted from the path"""
+    parts = urlsplit(url)
+    path = _BOT_TOKEN_RE.sub("/bot<token>", parts.path, count=1)
+    return f"{method.upper()} {parts.netloc}{path}"
+
+
+def iter_multipart(fields: Dict[str, Any], files: Dict[str, Tuple[str, str, Iterable[bytes]]],
+                   boundary: str = None) -> Tuple[str, Iterator[bytes]]:
+    """
+    Stream a multipart/form-data body without buffering file contents.
+    `files` maps field names to (filename, content_type, chunks).
+    Returns the Content-Type header value and the body iterator.
+    """
+    boundary = boundary or uuid.uuid4().hex
+
+    def body():
+        for name, value in (fields or {}).items():
+            yield (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                   f'{value}\r\n').encode('utf-8')
+        for name, (filename, content_type, chunks) in files.items():
+            yield (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+            for chunk in chunks:
+                if chunk:
+                    yield chunk
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode('utf-8')
+
+    return f'multipart/form-data; boundary={boundary}', body()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; not thread-safe (callers hold the transport lock)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket containing the p-th percentile"""
+        if not self.total:
+            return 0.0
+        rank = p * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            'requests': self.total,
+            'errors': self.errors,
+            'avg_seconds': self.sum / self.total if self.total else 0.0,
+            'p50_seconds': self.percentile(0.5),
+            'p95_seconds': self.percentile(0.95),
+            'max_seconds': self.max,
+            'buckets': buckets,
+        }
+
+
+class HttpTransport:
+    """
+    Pooled HTTP client shared by every component that talks to an external API.
+
+    Sessions are created per host so each upstream gets its own keep-alive
+    pool. Failed connection attempts are retried for every method (nothing
+    was sent yet); read errors are only retried for idempotent methods so
+    a POST such as sendMessage is never delivered twice. HTTP status codes
+    are returned to the caller, which knows whether a retry is safe.
+    """
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._sessions: Dict[str, requests.Session] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _session_for(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                retry = Retry(
+                    total=self.max_retries,
+                    connect=self.max_retries,
+                    read=self.max_retries,
+                    status=0,
+                    backoff_factor=0.3,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount(host, adapter)
+                self._sessions[host] = session
+                logger.info(f"🔌 Opened connection pool for {parts.netloc}")
+            return session
+
+    def request(self, method: str, url: str, timeout: Optional[Tuple[float, float]] = None,
+                **kwargs) -> requests.Response:
+        """
+        Send a request through the pooled session for the URL's host.
+        `timeout` defaults to (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT); a single
+        number is treated as the read timeout.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        elif isinstance(timeout, (int, float)):
+            timeout = (self.timeout[0], timeout)
+
+        session = self._session_for(url)
+        name = endpoint_name(method, url)
+        started = time.monotonic()
+        error = True
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+            error = response.status_code >= 500
+            return response
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = LatencyHistogram()
+                histogram.observe(elapsed, error)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-endpoint latency histograms"""
+        with self._lock:
+            return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Process-wide shared transport"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpTransport()
+    return _transport
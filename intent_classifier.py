@@ -0,0 +1,177 @@
+"""
+Intent classification for incoming messages.
+One compiled regex covers every keyword list, so a message is classified
+in a single pass as a search, chitchat (with its kind) or unclear.
+Run `python intent_classifier.py` to check the labelled corpus and time it.
+"""
+
+import re
+from typing import NamedTuple, Optional
+
+SEARCH = "search"
+CHITCHAT = "chitchat"
+UNCLEAR = "unclear"
+
+# Messages shorter than this need a search keyword to count as a search
+MIN_SEARCH_LENGTH = 15
+
+# Stems matched at the start of a word, so inflected forms match too
+# ("експерт" matches "експерта", "експертів")
+SEARCH_STEMS = [
+    "шука", "потріб", "експерт", "фахів", "спеціаліст", "професіонал",
+    "маркет", "дизайн", "розроб", "програм",
+    "інвест", "бізнес", "стартап",
+    "ментор", "консульт", "тренер", "коуч",
+    "продаж", "реклам", "брендинг",
+    "фінанс", "бухгалт", "юрист",
+    "технолог", "цифров", "онлайн",
+    "e-commerce", "інтернет", r"соціальн\w*\s+мереж",
+]
+
+# Acronyms only count in capitals ("IT", not the English word "it")
+SEARCH_ACRONYMS = ["PR", "IT", "HR"]
+
+# Whole words or phrases, by kind of chitchat
+CHITCHAT_PHRASES = {
+    "greeting": ["привіт", "вітаю", "добрий день", "доброго дня", "hello", "hi"],
+    "thanks": ["дякую", "спасибі", "thank you", "thanks"],
+    "smalltalk": ["як справи", "що нового", "how are you", "що робиш"],
+    "help": ["допоможи", "help", "допомога", "що можна", "можливості", "робота", "work"],
+    "test": ["тест", "test", "перевірка", "працює"],
+    "start": ["старт", "start", "почати"],
+    "info": ["інформація", "information", "інфо", "info"],
+}
+
+# Punctuation-only noise ("...", "???")
+UNCLEAR_PATTERNS = [r"\.{3,}", r"\?{2,}"]
+
+
+def _phrase(phrase: str) -> str:
+    return r"\s+".join(re.escape(word) for word in phrase.split())
+
+
+def _build_pattern() -> "re.Pattern":
+    stems = "|".join(stem if "\\" in stem else re.escape(stem) for stem in SEARCH_STEMS)
+    acronyms = "|".join(SEARCH_ACRONYMS)
+    branches = [
+        rf"(?P<search>(?:{stems})\w*)",
+        rf"(?P<acronym>(?-i:{acronyms})\b)",
+    ]
+    for kind, phrases in CHITCHAT_PHRASES.items():
+        # Longest first so "thank you" wins over a shorter overlapping phrase
+        words = "|".join(_phrase(p) for p in sorted(phrases, key=len, reverse=True))
+        branches.append(rf"(?P<{kind}>(?:{words})\b)")
+    # A single word-start check in front of every keyword branch lets the scan
+    # skip positions inside words without trying each branch
+    keywords = "|".join(branches)
+    return re.compile(rf"\b(?:{keywords})|(?P<unclear>{'|'.join(UNCLEAR_PATTERNS)})", re.IGNORECASE)
+
+
+INTENT_PATTERN = _build_pattern()
+
+
+class Intent(NamedTuple):
+    label: str                  # SEARCH, CHITCHAT or UNCLEAR
+    kind: Optional[str] = None  # Chitchat kind ("greeting", "thanks", ...) if any
+
+
+def classify(text: str) -> Intent:
+    """
+    Classify a message in one pass over the text.
+    Search keywords win over everything else; otherwise the first chitchat
+    phrase decides; short or punctuation-only messages are unclear; longer
+    messages without any keyword are treated as searches.
+    """
+    text = text.strip()
+    chitchat_kind = None
+    noisy = False
+    for match in INTENT_PATTERN.finditer(text):
+        group = match.lastgroup
+        if group in ("search", "acronym"):
+            return Intent(SEARCH)
+        if group == "unclear":
+            noisy = True
+        elif chitchat_kind is None:
+            chitchat_kind = group
+
+    if chitchat_kind is not None:
+        return Intent(CHITCHAT, chitchat_kind)
+    if noisy or len(text) < MIN_SEARCH_LENGTH:
+        return Intent(UNCLEAR)
+    return Intent(SEARCH)
+
+
+def is_search(text: str) -> bool:
+    """Whether a message should be handled as an expert search"""
+    return classify(text).label == SEARCH
+
+
+# Labelled corpus: (message, expected label, expected chitchat kind)
+LABELLED_EXAMPLES = [
+    ("Шукаю маркетолога для запуску продукту", SEARCH, None),
+    ("Потрібен експерт з інвестицій у нерухомість", SEARCH, None),
+    ("потрібна допомога з брендингом", SEARCH, None),
+    ("Хочу знайти ментора для стартапу", SEARCH, None),
+    ("Є ідея мобільного застосунку, хто може розробити MVP?", SEARCH, None),
+    ("Дякую, а ще шукаю юриста", SEARCH, None),
+    ("Need a PR specialist", SEARCH, None),
+    ("шукаю HR", SEARCH, None),
+    ("IT", SEARCH, None),
+    ("людина яка розбирається в e-commerce", SEARCH, None),
+    ("просування в соціальних мережах", SEARCH, None),
+    ("Хто допоможе налаштувати рекламні кампанії?", SEARCH, None),
+    ("Кого порадите для виходу на ринок США з SaaS продуктом", SEARCH, None),
+    ("Привіт!", CHITCHAT, "greeting"),
+    ("hi", CHITCHAT, "greeting"),
+    ("Добрий   день", CHITCHAT, "greeting"),
+    ("Дякую!", CHITCHAT, "thanks"),
+    ("thank you so much", CHITCHAT, "thanks"),
+    ("Як справи?", CHITCHAT, "smalltalk"),
+    ("how are you doing today", CHITCHAT, "smalltalk"),
+    ("допоможи", CHITCHAT, "help"),
+    ("Що можна тут робити?", CHITCHAT, "help"),
+    ("тест", CHITCHAT, "test"),
+    ("бот працює?", CHITCHAT, "test"),
+    ("start", CHITCHAT, "start"),
+    ("інфо", CHITCHAT, "info"),
+    ("does it work", CHITCHAT, "help"),
+    ("ok", UNCLEAR, None),
+    ("...", UNCLEAR, None),
+    ("???", UNCLEAR, None),
+    ("а що далі", UNCLEAR, None),
+    ("machine", UNCLEAR, None),
+]
+
+
+def _run_corpus() -> int:
+    failures = 0
+    for text, label, kind in LABELLED_EXAMPLES:
+        intent = classify(text)
+        if intent.label != label or intent.kind != kind:
+            failures += 1
+            print(f"FAIL {text!r}: got {intent}, expected ({label}, {kind})")
+    print(f"{len(LABELLED_EXAMPLES) - failures}/{len(LABELLED_EXAMPLES)} labelled examples classified correctly")
+    return failures
+
+
+def _run_benchmark(rounds: int = 2000):
+    import timeit
+
+    texts = [text for text, _, _ in LABELLED_EXAMPLES]
+    seconds = timeit.timeit(lambda: [classify(text) for text in texts], number=rounds)
+    per_message = seconds / (rounds * len(texts))
+    print(f"classify: {per_message * 1e6:.2f} µs per message over {rounds * len(texts)} messages")
+
+    # No search keyword, so the whole message is scanned
+    long_text = " ".join(text for text, label, _ in LABELLED_EXAMPLES if label != SEARCH) * 20
+    seconds = timeit.timeit(lambda: classify(long_text), number=rounds // 10)
+    per_char = seconds / (rounds // 10) / len(long_text)
+    print(f"classify: {per_char * 1e9:.1f} ns per character on a {len(long_text)}-character message")
+
+
+if __name__ == "__main__":
+    import sys
+
+    failed = _run_corpus()
+    _run_benchmark()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,306 @@
+"""
+Background job queue for the Telegram bot.
+Slow best-effort work (audio summaries) runs on its own worker pool
+with a concurrency limit and retries, so handlers can reply at once.
+"""
+
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+from outbound_queue import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000  # Recent job latencies kept for percentiles
+JOB_HISTORY = 1000      # Finished jobs whose status can still be looked up
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class Job:
+    __slots__ = ("job_id", "name", "func", "args", "kwargs", "status", "attempts",
+                 "created_at", "started_at", "finished_at", "error")
+
+    def __init__(self, job_id: int, name: str, func: Callable, args: tuple, kwargs: dict):
+        self.job_id = job_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.attempts = 0
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'age_seconds': round(end - self.created_at, 3),
+            'error': str(self.error) if self.error else None,
+        }
+
+
+class _JobBook:
+    """Job registry and metrics shared by the thread and asyncio queues"""
+
+    def __init__(self, name: str, max_retries: int):
+        self.name = name
+        self.max_retries = max_retries
+        self._ids = itertools.count(1)
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._retried = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=LATENCY_SAMPLES)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def _new_job(self, func: Callable, args: tuple, kwargs: dict) -> Job:
+        job = Job(next(self._ids), getattr(func, '__name__', self.name), func, args, kwargs)
+        with self._stats_lock:
+            self._jobs[job.job_id] = job
+            self._submitted += 1
+        return job
+
+    def _record_start(self, job: Job):
+        job.attempts += 1
+        job.status = RUNNING
+        if job.started_at is None:
+            job.started_at = time.monotonic()
+            with self._stats_lock:
+                self._waits.append(job.started_at - job.created_at)
+
+    def _record_failure(self, job: Job, error: Exception) -> Optional[float]:
+        """Returns the retry delay, or None if the job has failed for good"""
+        job.error = error
+        if job.attempts <= self.max_retries:
+            delay = backoff_delay(job.attempts)
+            job.status = RETRYING
+            with self._stats_lock:
+                self._retried += 1
+            logger.warning(f"🔁 Job {job.job_id} ({job.name}) failed: {error}, "
+                           f"retry {job.attempts}/{self.max_retries} in {delay:.1f}s")
+            return delay
+        logger.error(f"❌ Job {job.job_id} ({job.name}) failed after {job.attempts} attempts: {error}")
+        self._record_end(job, FAILED)
+        return None
+
+    def _record_end(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.monotonic()
+        job.args = job.kwargs = None  # Release payloads of finished jobs
+        with self._stats_lock:
+            if status == SUCCEEDED:
+                self._succeeded += 1
+            else:
+                self._failed += 1
+            self._latencies.append(job.finished_at - job.created_at)
+            while len(self._jobs) > JOB_HISTORY:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.finished_at is None:
+                    break
+                del self._jobs[oldest_id]
+
+    def _has_unfinished(self) -> bool:
+        with self._stats_lock:
+            return any(job.finished_at is None for job in self._jobs.values())
+
+    def _record_rejected(self):
+        with self._stats_lock:
+            self._rejected += 1
+
+    def get_status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Status of a recent job, or None if it is unknown or long finished"""
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Job counters plus queue-wait and end-to-end latency percentiles"""
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+            active = [job.status for job in self._jobs.values() if job.finished_at is None]
+
+        def percentile(values, p):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        return {
+            'queued': active.count(QUEUED) + active.count(RETRYING),
+            'running': active.count(RUNNING),
+            'submitted': self._submitted,
+            'succeeded': self._succeeded,
+            'failed': self._failed,
+            'retried': self._retried,
+            'rejected': self._rejected,
+            'wait_avg_seconds': sum(waits) / len(waits) if waits else 0.0,
+            'latency_avg_seconds': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p95_seconds': percentile(latencies, 0.95),
+            'latency_max_seconds': latencies[-1] if latencies else 0.0,
+        }
+
+
+class JobQueue(_JobBook):
+    """
+    Thread pool for background jobs.
+
+    At most `workers` jobs run at once and at most `max_pending` wait;
+    `submit` rejects new jobs when the queue is full instead of blocking
+    the caller. A job fails by raising and is retried with backoff up to
+    `max_retries` times.
+    """
+
+    def __init__(self, name: str = "jobs", workers: int = 2, max_pending: int = 100, max_retries: int = 2):
+        super().__init__(name, max_retries)
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._threads = []
+        self._timers = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Optional[int]:
+        """Queue `func(*args, **kwargs)`; returns the job id, or None if the queue is full"""
+        self._ensure_started()
+        job = self._new_job(func, args, kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._record_rejected()
+            self._record_end(job, FAILED)
+            logger.warning(f"⚠️ {self.name} queue full, dropped job {job.job_id}")
+            return None
+        return job.job_id
+
+    def _requeue(self, job: Job):
+        with self._lock:
+            self._timers.discard(threading.current_thread())
+            if not self._started:
+                return
+        job.status = QUEUED
+        # A retry already holds its place - never drop it for a full queue
+        self._queue.put(job)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._record_start(job)
+            try:
+                job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                delay = self._record_failure(job, e)
+                if delay is not None:
+                    timer = threading.Timer(delay, self._requeue, args=(job,))
+                    timer.daemon = True
+                    with self._lock:
+                        self._timers.add(timer)
+                    timer.start()
+                continue
+            self._record_end(job, SUCCEEDED)
+
+    def shutdown(self, wait: bool = True):
+        """Stop workers; with `wait` queued jobs and pending retries finish first"""
+        if not self._started:
+            return
+        if wait:
+            while self._has_unfinished():
+                time.sleep(0.05)
+        else:
+            with self._lock:
+                for timer in self._timers:
+                    timer.cancel()
+                self._timers.clear()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+        self._started = False
+
+
+class AsyncJobQueue(_JobBook):
+    """
+    Asyncio counterpart of JobQueue: each job is a task and a semaphore
+    caps how many run at once. Jobs are coroutine functions.
+    """
+
+    def __init__(self, name: str = "jobs", max_concurrent: int = 2, max_pending: int = 100, max_retries: int = 2):
+        super().__init__(name, max_retries)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_pending = max(1, max_pending)
+        self._slots = None
+        self._tasks = set()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Optional[int]:
+        """Schedule `await func(*args, **kwargs)`; returns the job id, or None if too many are pending"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = self._new_job(func, args, kwargs)
+        if len(self._tasks) >= self.max_pending:
+            self._record_rejected()
+            self._record_end(job, FAILED)
+            logger.warning(f"⚠️ {self.name} queue full, dropped job {job.job_id}")
+            return None
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job.job_id
+
+    async def _run(self, job: Job):
+        while True:
+            async with self._slots:
+                self._record_start(job)
+                try:
+                    await job.func(*job.args, **job.kwargs)
+                except asyncio.CancelledError:
+                    self._record_end(job, FAILED)
+                    raise
+                except Exception as e:
+                    delay = self._record_failure(job, e)
+                else:
+                    self._record_end(job, SUCCEEDED)
+                    return
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+
+    async def shutdown(self, wait: bool = True):
+        """Wait for (or cancel) outstanding jobs"""
+        tasks = list(self._tasks)
+        if not wait:
+            for task in tasks:
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -10,9 +10,16 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import and run the bot
+from config import BOT_RUNTIME, BOT_WORKERS
 from telegram_bot_simple import SimpleTelegramBot
 
 if __name__ == "__main__":
-    bot = SimpleTelegramBot()
-    bot.run()
-
+    if BOT_WORKERS > 1:
+        from supervisor import run_supervisor
+        run_supervisor()
+    elif BOT_RUNTIME == "async":
+        from async_telegram_bot import AsyncTelegramBot
+        AsyncTelegramBot().run()
+    else:
+        bot = SimpleTelegramBot()
+        bot.run()
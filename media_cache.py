@@ -0,0 +1,142 @@
+"""
+Telegram file_id cache for repeated media.
+Once Telegram has a file (the start banner, a cached audio summary)
+it is sent again by file_id instead of by URL or by upload. The ids
+are persisted in the database so they survive restarts.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Where each send method puts the uploaded file in its result
+MEDIA_RESULT_FIELDS = {
+    "sendPhoto": "photo",
+    "sendAudio": "audio",
+    "sendVoice": "voice",
+    "sendDocument": "document",
+    "sendVideo": "video",
+    "sendAnimation": "animation",
+}
+
+
+def extract_file_id(method: str, result: Optional[dict]) -> Optional[str]:
+    """file_id of the media in a send* API response"""
+    if not result or not result.get("ok"):
+        return None
+    media = (result.get("result") or {}).get(MEDIA_RESULT_FIELDS.get(method, ""))
+    if isinstance(media, list):
+        # Photos come in several sizes - the last one is the largest
+        media = media[-1] if media else None
+    return media.get("file_id") if media else None
+
+
+# Parts of the 400 descriptions Telegram gives for a file_id it no longer accepts,
+# e.g. "Bad Request: wrong file identifier/HTTP URL specified"
+INVALID_FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "invalid file_id",
+    "file reference",
+    "type of file mismatch",
+)
+
+
+def is_invalid_file_id_error(result: Optional[dict]) -> bool:
+    """
+    Whether Telegram rejected a request because of the file_id it referenced.
+    Other 400s (bad caption markup, chat not found, ...) are not, and would
+    fail the same way on a fresh upload.
+    """
+    if not result or result.get("ok") or result.get("error_code") != 400:
+        return False
+    description = (result.get("description") or "").lower()
+    return any(error in description for error in INVALID_FILE_ID_ERRORS)
+
+
+class MediaCache:
+    """
+    Asset key -> Telegram file_id, persisted in the `media_files` table
+    with a bounded in-memory layer in front.
+    """
+
+    def __init__(self, database: Database, max_memory_entries: int = 1000):
+        self.database = database
+        self.max_memory_entries = max(1, max_memory_entries)
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._invalidated = 0
+
+    def get(self, asset_key: str) -> Optional[str]:
+        """Known file_id for an asset, or None"""
+        with self._lock:
+            file_id = self._memory.get(asset_key)
+            if file_id is not None:
+                self._memory.move_to_end(asset_key)
+                self._hits += 1
+                return file_id
+
+        try:
+            file_id = self.database.get_media_file_id(asset_key)
+        except Exception as e:
+            logger.error(f"Error reading media cache for {asset_key}: {e}")
+            file_id = None
+
+        with self._lock:
+            if file_id is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._remember(asset_key, file_id)
+        return file_id
+
+    def _remember(self, asset_key: str, file_id: str):
+        self._memory[asset_key] = file_id
+        self._memory.move_to_end(asset_key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def store(self, asset_key: str, file_id: str):
+        """Remember the file_id Telegram returned for an asset"""
+        with self._lock:
+            self._remember(asset_key, file_id)
+            self._stored += 1
+        try:
+            self.database.set_media_file_id(asset_key, file_id)
+        except Exception as e:
+            logger.error(f"Error saving media cache for {asset_key}: {e}")
+
+    def invalidate(self, asset_key: str, file_id: str = None):
+        """Forget a file_id Telegram no longer accepts"""
+        with self._lock:
+            if file_id is None or self._memory.get(asset_key) == file_id:
+                self._memory.pop(asset_key, None)
+            self._invalidated += 1
+        try:
+            self.database.delete_media_file_id(asset_key, file_id)
+        except Exception as e:
+            logger.error(f"Error invalidating media cache for {asset_key}: {e}")
+        logger.warning(f"🗑️ Invalidated cached file_id for {asset_key}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate and invalidation counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'stored': self._stored,
+                'invalidated': self._invalidated,
+                'in_memory': len(self._memory),
+            }
@@ -0,0 +1,35 @@
+"""
+Shared OpenAI clients.
+Every handler uses the same client so all requests share one
+connection pool instead of opening a pool per user session.
+"""
+
+import threading
+
+import openai
+
+from config import OPENAI_API_KEY
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def get_openai_client() -> openai.OpenAI:
+    """Process-wide OpenAI client"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    """Process-wide async OpenAI client, created on first use by the async runtime"""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _async_client
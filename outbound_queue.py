@@ -0,0 +1,296 @@
+"""
+Outbound Telegram send queue.
+Handlers enqueue Bot API calls and keep going; sender threads deliver
+them while enforcing Telegram's global and per-chat limits, honouring
+429 retry_after and retrying transient failures with jittered backoff.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 1000  # Recent queue latencies kept for percentiles
+PRUNE_EVERY = 1000  # Finished requests between sweeps of idle chat state
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (1-based)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class _TokenBucket:
+    """Simple token bucket; not thread-safe (callers hold the sender lock)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """When the next token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _OutboundRequest:
+    __slots__ = ("method", "data", "files", "future", "enqueued_at", "attempts")
+
+    def __init__(self, method: str, data: dict, files: Optional[Dict[str, Callable]]):
+        self.method = method
+        self.data = data
+        self.files = files
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class _ChatState:
+    __slots__ = ("queue", "bucket", "blocked_until", "busy")
+
+    def __init__(self, bucket: _TokenBucket):
+        self.queue = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+
+
+class OutboundSender:
+    """
+    Per-chat FIFO send queue with global and per-chat rate limiting.
+
+    `api_call(method, data, files)` performs one Bot API request and returns
+    the decoded response (including error responses); it raises on network
+    errors. At most one request per chat is in flight, so messages to a chat
+    are delivered in the order they were enqueued.
+    """
+
+    def __init__(self, api_call: Callable[[str, dict, Optional[Dict[str, Callable]]], dict],
+                 workers: int = 4, global_rate: float = 30, chat_rate: float = 1,
+                 group_rate: float = 20 / 60, chat_burst: float = 3, max_retries: int = 3):
+        self.api_call = api_call
+        self.workers = max(1, workers)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._chats: Dict[Any, _ChatState] = {}
+        self._ready = []  # heap of (ready_at, seq, chat_id)
+        self._seq = itertools.count()
+        self._global = _TokenBucket(global_rate, global_rate)
+        self._global_blocked_until = 0.0
+        self._threads = []
+        self._started = False
+        self._stopping = False
+        self._finished_since_prune = 0
+
+        # Metrics
+        self._queued = 0
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._rate_limited = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"outbound-sender-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, chat_id: Any, method: str, data: dict, files: Optional[Dict[str, Callable]] = None) -> Future:
+        """
+        Enqueue a Bot API call for `chat_id`.
+        `files` maps form field names to upload sources (called at send time).
+        The returned future resolves to the API response, or None if it could not be sent.
+        """
+        request = _OutboundRequest(method, data, files)
+        with self._cond:
+            if not self._started:
+                self._ensure_started()
+            state = self._chats.get(chat_id)
+            if state is None:
+                rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+                state = self._chats[chat_id] = _ChatState(_TokenBucket(rate, self.chat_burst))
+            state.queue.append(request)
+            self._queued += 1
+            if len(state.queue) == 1 and not state.busy:
+                self._schedule(chat_id, state, time.monotonic())
+            self._cond.notify()
+        return request.future
+
+    def _schedule(self, chat_id, state: _ChatState, now: float):
+        ready_at = max(state.bucket.ready_at(now), state.blocked_until)
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+
+    def _next_request(self):
+        """Wait for a chat whose head request may be sent now (called with the lock held)"""
+        while True:
+            now = time.monotonic()
+            if not self._ready:
+                if self._stopping:
+                    return None, None, None
+                self._cond.wait()
+                continue
+
+            ready_at = max(self._ready[0][0], self._global.ready_at(now), self._global_blocked_until)
+            if ready_at > now:
+                self._cond.wait(ready_at - now)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            state = self._chats[chat_id]
+            state.busy = True
+            state.bucket.take(now)
+            self._global.take(now)
+            return chat_id, state, state.queue[0]
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                chat_id, state, request = self._next_request()
+            if request is None:
+                return
+
+            request.attempts += 1
+            response = None
+            error = None
+            try:
+                response = self.api_call(request.method, request.data, request.files)
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                self._finish(chat_id, state, request, response, error)
+                self._cond.notify_all()
+
+    def _finish(self, chat_id, state: _ChatState, request: _OutboundRequest, response: Optional[dict], error):
+        """Record the outcome of one attempt (called with the lock held)"""
+        now = time.monotonic()
+        error_code = response.get("error_code") if isinstance(response, dict) else None
+        done = True
+
+        if error_code == 429:
+            retry_after = (response.get("parameters") or {}).get("retry_after", 1)
+            self._rate_limited += 1
+            state.blocked_until = now + retry_after
+            if retry_after > 1:
+                # Long flood waits apply to the whole bot, not just this chat
+                self._global_blocked_until = max(self._global_blocked_until, now + retry_after)
+            if request.attempts <= self.max_retries:
+                logger.warning(f"⏳ Telegram rate limit on {request.method} for chat {chat_id}, "
+                               f"retry {request.attempts}/{self.max_retries} in {retry_after}s")
+                done = False
+            else:
+                logger.error(f"❌ Giving up on {request.method} to chat {chat_id} after "
+                             f"{request.attempts} rate-limited attempts")
+        elif error is not None or (error_code is not None and error_code >= 500):
+            if request.attempts <= self.max_retries:
+                delay = backoff_delay(request.attempts)
+                self._retried += 1
+                state.blocked_until = now + delay
+                logger.warning(f"🔁 {request.method} to chat {chat_id} failed ({error or error_code}), "
+                               f"retry {request.attempts}/{self.max_retries} in {delay:.1f}s")
+                done = False
+            else:
+                logger.error(f"❌ Giving up on {request.method} to chat {chat_id}: {error or response}")
+
+        if done:
+            state.queue.popleft()
+            self._latencies.append(now - request.enqueued_at)
+            if response is not None and response.get("ok"):
+                self._sent += 1
+            else:
+                self._failed += 1
+            request.future.set_result(response)
+
+        state.busy = False
+        if state.queue:
+            self._schedule(chat_id, state, now)
+
+        self._finished_since_prune += 1
+        if self._finished_since_prune >= PRUNE_EVERY:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        """Drop state of idle chats whose limits have fully recovered"""
+        self._finished_since_prune = 0
+        idle = [chat_id for chat_id, state in self._chats.items()
+                if not state.queue and not state.busy and state.blocked_until <= now
+                and state.bucket.is_full(now)]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def shutdown(self, wait: bool = True):
+        """Stop sender threads; with `wait` queued requests are delivered first"""
+        with self._cond:
+            if not self._started:
+                return
+            if wait:
+                while any(state.queue for state in self._chats.values()):
+                    self._cond.wait(0.1)
+            self._stopping = True
+            self._ready.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._cond:
+            # Anything still queued (e.g. waiting out a retry) is dropped
+            for state in self._chats.values():
+                while state.queue:
+                    state.queue.popleft().future.set_result(None)
+            self._chats.clear()
+        self._threads = []
+        self._started = False
+        self._stopping = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, delivery counters and queue latency percentiles"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            depth = sum(len(state.queue) for state in self._chats.values())
+
+            def percentile(p):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+            return {
+                'queue_depth': depth,
+                'chats_waiting': sum(1 for state in self._chats.values() if state.queue),
+                'queued': self._queued,
+                'sent': self._sent,
+                'failed': self._failed,
+                'retried': self._retried,
+                'rate_limited': self._rate_limited,
+                'latency_avg_seconds': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p95_seconds': percentile(0.95),
+                'latency_max_seconds': latencies[-1] if latencies else 0.0,
+            }
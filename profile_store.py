@@ -0,0 +1,188 @@
+"""
+Compact binary profile store.
+users.csv is compiled into one file of interned UTF-8 strings, an offset
+array, a row x field matrix of string ids and precomputed facet
+memberships. Loading it is an mmap plus one decode per distinct string:
+no pandas, no CSV parsing. Build it with:
+
+    python profile_store.py [users.csv] [users.profiles.bin]
+
+DataHandler also writes it whenever it had to parse the CSV.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from data_handler import USER_COLUMNS, ProfileRecords, UserRecord
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BMPROF1\n"
+FORMAT_VERSION = 1
+_HEADER_LENGTH = struct.Struct("<I")
+_ALIGNMENT = 8
+
+
+def _pad(length: int) -> bytes:
+    return b"\0" * (-length % _ALIGNMENT)
+
+
+def write_store(path: str, source_digest: str, records: Sequence[UserRecord]):
+    """Compile records into a store file, atomically replacing `path`"""
+    from facet_index import FACET_FIELDS, facet_schema, facet_values
+
+    fields = list(USER_COLUMNS)
+    string_ids: Dict[str, int] = {}
+    blob = bytearray()
+    offsets = array("I", [0])
+
+    def intern(value: str) -> int:
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = string_ids[value] = len(offsets) - 1
+            blob.extend(value.encode("utf-8"))
+            offsets.append(len(blob))
+        return string_id
+
+    cells = array("I", (intern(value) for record in records for value in record))
+
+    sections: List[Tuple[str, bytes]] = []
+    facets = {}
+    for facet in FACET_FIELDS:
+        members: Dict[str, List[int]] = {}
+        labels: Dict[str, str] = {}
+        for doc_id, record in enumerate(records):
+            for key, label in facet_values(record, facet):
+                doc_ids = members.setdefault(key, [])
+                if not doc_ids or doc_ids[-1] != doc_id:
+                    doc_ids.append(doc_id)
+                labels.setdefault(key, label)
+        keys = list(members)
+        indptr = array("I", [0])
+        flat = array("I")
+        for key in keys:
+            flat.extend(members[key])
+            indptr.append(len(flat))
+        sections.append((f"facet.{facet}.keys", array("I", map(intern, keys)).tobytes()))
+        sections.append((f"facet.{facet}.labels", array("I", (intern(labels[key]) for key in keys)).tobytes()))
+        sections.append((f"facet.{facet}.indptr", indptr.tobytes()))
+        sections.append((f"facet.{facet}.members", flat.tobytes()))
+        facets[facet] = len(keys)
+
+    if len(blob) >= 2 ** 32:
+        raise ValueError("profile strings exceed 4 GB")
+    sections[:0] = [("strings", bytes(blob)), ("offsets", offsets.tobytes()), ("cells", cells.tobytes())]
+
+    layout = {}
+    position = 0
+    for name, data in sections:
+        layout[name] = [position, len(data)]
+        position += len(data) + len(_pad(len(data)))
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "source_digest": source_digest,
+        "rows": len(records),
+        "fields": fields,
+        "strings": len(offsets) - 1,
+        "facets": facets,
+        "facet_schema": facet_schema(),
+        "sections": layout,
+    }).encode("utf-8")
+    # Whitespace keeps the padded header valid JSON
+    header += b" " * (-(len(MAGIC) + _HEADER_LENGTH.size + len(header)) % _ALIGNMENT)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for _, data in sections:
+            f.write(data)
+            f.write(_pad(len(data)))
+    os.replace(tmp_path, path)
+    logger.info(f"📦 Wrote profile store {path}: {len(records)} profiles, "
+                f"{len(offsets) - 1} distinct strings, {os.path.getsize(path) / 1024:.0f} KB")
+
+
+def load_store(path: str, source_digest: str = None) -> Optional[ProfileRecords]:
+    """
+    Records from a store file, with its precomputed facets attached as
+    `facet_members`. Returns None if the file is missing, unreadable, in
+    another format, with other facet definitions or (given
+    `source_digest`) built from a different CSV.
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _read(mapped, source_digest)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"⚠️ Profile store {path} unusable: {e}")
+        return None
+
+
+def _read(mapped: mmap.mmap, source_digest: Optional[str]) -> Optional[ProfileRecords]:
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a profile store")
+    start = len(MAGIC) + _HEADER_LENGTH.size
+    (header_length,) = _HEADER_LENGTH.unpack_from(mapped, len(MAGIC))
+    header = json.loads(mapped[start:start + header_length])
+    if header["format"] != FORMAT_VERSION or header["fields"] != list(USER_COLUMNS):
+        raise ValueError("different format or fields")
+    from facet_index import facet_schema
+
+    if header.get("facet_schema") != facet_schema():
+        raise ValueError("facets built with different facet definitions")
+    if source_digest is not None and header["source_digest"] != source_digest:
+        return None
+    base = start + header_length
+
+    def section(name: str) -> memoryview:
+        offset, length = header["sections"][name]
+        return memoryview(mapped[base + offset:base + offset + length])
+
+    strings_data = section("strings")
+    offsets = section("offsets").cast("I")
+    # One decode per distinct string; repeated values share one object
+    strings = [str(strings_data[offsets[i]:offsets[i + 1]], "utf-8") for i in range(header["strings"])]
+    cells = section("cells").cast("I")
+    width = len(header["fields"])
+    make = UserRecord._make
+    records = ProfileRecords(
+        make([strings[string_id] for string_id in cells[row * width:(row + 1) * width]])
+        for row in range(header["rows"])
+    )
+
+    facet_members = {}
+    for facet in header["facets"]:
+        keys = section(f"facet.{facet}.keys").cast("I")
+        labels = section(f"facet.{facet}.labels").cast("I")
+        indptr = section(f"facet.{facet}.indptr").cast("I")
+        members = section(f"facet.{facet}.members").cast("I")
+        facet_members[facet] = [
+            (strings[keys[i]], strings[labels[i]], members[indptr[i]:indptr[i + 1]].tolist())
+            for i in range(len(keys))
+        ]
+    records.facet_members = facet_members
+    return records
+
+
+if __name__ == "__main__":
+    import hashlib
+    import sys
+
+    from config import USERS_CSV_PATH, PROFILE_STORE_PATH
+    from data_handler import parse_profiles
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else USERS_CSV_PATH
+    store_path = sys.argv[2] if len(sys.argv) > 2 else PROFILE_STORE_PATH
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    _, parsed = parse_profiles(data)
+    write_store(store_path, hashlib.sha256(data).hexdigest(), parsed)
@@ -0,0 +1,141 @@
+"""
+Progress reporting for long-running searches.
+Shows progress on a single Telegram message that is edited on a timer
+while the model call runs, instead of sending one message per step.
+"""
+
+import asyncio
+import threading
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _message_id(response) -> Optional[int]:
+    """Extract message_id from a sendMessage API response"""
+    if isinstance(response, dict) and response.get("ok"):
+        return response.get("result", {}).get("message_id")
+    return None
+
+
+class ProgressReporter:
+    """
+    Edits one progress message through the given steps while work runs in the caller's thread.
+
+    `send(text)` and `edit(message_id, text)` wrap the Bot API calls.
+    The reporter's thread sends the first step right after `start()`, so
+    the work does not wait for it, and applies later steps every
+    `interval` seconds until `stop()` is called; a fast result skips the
+    remaining steps entirely.
+    """
+
+    def __init__(self, send: Callable[[str], dict], edit: Callable[[int, str], dict],
+                 steps: List[str], interval: float):
+        self.send = send
+        self.edit = edit
+        self.steps = steps
+        self.interval = interval
+        self.message_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread that sends the first step and then edits it"""
+        if not self.steps:
+            return
+        self._thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        if self._stopped.is_set():
+            # Finished before the thread got going - nothing to show
+            return
+        try:
+            self.message_id = _message_id(self.send(self.steps[0]))
+        except Exception as e:
+            logger.error(f"Error sending progress message: {e}")
+            return
+        if self.message_id is None:
+            return
+        for step in self.steps[1:]:
+            if self._stopped.wait(self.interval):
+                return
+            try:
+                self.edit(self.message_id, step)
+            except Exception as e:
+                logger.error(f"Error updating progress message: {e}")
+
+    def stop(self):
+        """Skip the remaining steps; waits for an in-flight edit so it cannot land after the result"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class AsyncProgressReporter:
+    """
+    Asyncio version of ProgressReporter - the timer runs as a task next to the model call.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[dict]], edit: Callable[[int, str], Awaitable[dict]],
+                 steps: List[str], interval: float):
+        self.send = send
+        self.edit = edit
+        self.steps = steps
+        self.interval = interval
+        self.message_id = None
+        self._stopped = None
+        self._task = None
+
+    async def start(self):
+        """Start the task that sends the first step and then edits it"""
+        if not self.steps:
+            return
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        if self._stopped.is_set():
+            # Finished before the task got going - nothing to show
+            return
+        try:
+            self.message_id = _message_id(await self.send(self.steps[0]))
+        except Exception as e:
+            logger.error(f"Error sending progress message: {e}")
+            return
+        if self.message_id is None:
+            return
+        for step in self.steps[1:]:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.edit(self.message_id, step)
+            except Exception as e:
+                logger.error(f"Error updating progress message: {e}")
+
+    async def stop(self):
+        """Skip the remaining steps; waits for an in-flight edit so it cannot land after the result"""
+        if self._stopped:
+            self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
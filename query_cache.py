@@ -0,0 +1,299 @@
+"""
+Persistent result cache for match searches.
+A search is keyed by its normalised text (case, punctuation, spacing
+and word endings ignored) together with the profile dataset version and
+the matching prompt version, so new profiles or a new prompt never serve
+an old answer. Entries expire after a TTL and the least recently used
+ones are evicted past a size bound. Optionally a miss is looked up again
+by query embedding, so close paraphrases also hit. Backed by SQLite, so
+the cache survives deploys and is shared by every bot worker.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import (QUERY_CACHE_DB_PATH, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_MAX_ENTRIES,
+                    QUERY_CACHE_SIMILARITY)
+from text_processing import TOKEN_RE, normalize, stem
+
+logger = logging.getLogger(__name__)
+
+# Seconds the in-memory copy of stored query embeddings is reused before
+# rereading it (entries added by other workers show up after this)
+NEAR_INDEX_REFRESH_SECONDS = 30
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key text of a search: every word stemmed, in order. No word is
+    dropped - "шукаю"/"I am"/"need" say which side of the match the user
+    is on, and "не" reverses a place or a requirement.
+    """
+    words = [stem(word) for word in TOKEN_RE.findall(normalize(query))]
+    return " ".join(words) if words else " ".join(normalize(query).split())
+
+
+class CacheLookup(NamedTuple):
+    key: str                              # Digest of the normalised query and versions
+    normalized: str
+    dataset_version: str
+    prompt_version: str
+    result: Optional[str]                 # Cached answer, None on a miss
+    similarity: float                     # 1.0 for an exact hit, cosine similarity for a near hit
+    embedder: Optional[str] = None        # Name of the embedder of `vector`
+    vector: Optional[np.ndarray] = None   # Query embedding, stored with the answer
+
+
+class QueryCache:
+    """
+    Search results in the `query_results` table. `lookup` returns a
+    CacheLookup whether or not it hit; pass it to `store` with the fresh
+    answer after a miss.
+    """
+
+    def __init__(self, db_path: str = QUERY_CACHE_DB_PATH, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES, similarity: float = QUERY_CACHE_SIMILARITY):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # (dataset, prompt, embedder) -> (loaded at, cache keys, unit vectors)
+        self._near_index: Dict[Tuple[str, str, str], Tuple[float, List[str], np.ndarray]] = {}
+
+        # Metrics
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._expired = 0
+        self._evicted = 0
+        self._errors = 0
+
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_database(self):
+        """Initialize query cache table"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS query_results (
+                    cache_key TEXT PRIMARY KEY,
+                    normalized_query TEXT NOT NULL,
+                    dataset_version TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    embedder TEXT,
+                    embedding BLOB
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_query_results_last_used ON query_results (last_used)')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_query_results_versions
+                ON query_results (dataset_version, prompt_version, embedder)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(normalized: str, dataset_version: str, prompt_version: str) -> str:
+        payload = json.dumps([normalized, dataset_version, prompt_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, query: str, dataset_version: str, prompt_version: str, embedder: str = None,
+               embed: Callable[[str], np.ndarray] = None) -> CacheLookup:
+        """
+        Cached answer for a search. With a similarity threshold set and an
+        `embed` function (query -> unit vector), a miss is retried against
+        the stored query embeddings of the same versions.
+        """
+        normalized = normalize_query(query)
+        key = self.make_key(normalized, dataset_version, prompt_version)
+        miss = CacheLookup(key, normalized, dataset_version, prompt_version, None, 0.0)
+        now = time.time()
+
+        try:
+            result = self._read(key, now)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading query cache: {e}")
+            with self._lock:
+                self._errors += 1
+            return miss
+        if result is not None:
+            with self._lock:
+                self._hits += 1
+            return miss._replace(result=result, similarity=1.0)
+
+        if self.similarity > 0 and embed is not None and embedder:
+            try:
+                vector = np.asarray(embed(query), dtype=np.float32)
+                miss = miss._replace(embedder=embedder, vector=vector)
+                near = self._nearest(miss, now)
+            except Exception as e:
+                logger.error(f"Error in near-duplicate query lookup: {e}")
+                near = None
+            if near is not None:
+                near_key, similarity = near
+                try:
+                    result = self._read(near_key, now)
+                except sqlite3.Error as e:
+                    logger.error(f"Error reading query cache: {e}")
+                    result = None
+                if result is not None:
+                    with self._lock:
+                        self._near_hits += 1
+                    logger.info(f"🗃️ Near-duplicate search hit ({similarity:.3f}): {normalized!r}")
+                    return miss._replace(result=result, similarity=similarity)
+
+        with self._lock:
+            self._misses += 1
+        return miss
+
+    def _read(self, key: str, now: float) -> Optional[str]:
+        """Result of a live entry, refreshing its recency; expired entries are dropped"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT result, created_at FROM query_results WHERE cache_key = ?',
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute('DELETE FROM query_results WHERE cache_key = ?', (key,))
+                conn.commit()
+                with self._lock:
+                    self._expired += 1
+                return None
+            conn.execute('UPDATE query_results SET last_used = ? WHERE cache_key = ?', (now, key))
+            conn.commit()
+            return row[0]
+        finally:
+            conn.close()
+
+    def _nearest(self, lookup: CacheLookup, now: float) -> Optional[Tuple[str, float]]:
+        """Most similar stored query of the same versions above the threshold"""
+        group = (lookup.dataset_version, lookup.prompt_version, lookup.embedder)
+        with self._lock:
+            cached = self._near_index.get(group)
+        if cached is None or now - cached[0] > NEAR_INDEX_REFRESH_SECONDS:
+            cached = self._load_near_index(group, now)
+        _, keys, matrix = cached
+        if not keys or matrix.shape[1] != lookup.vector.shape[0]:
+            return None
+        scores = matrix @ lookup.vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return keys[best], float(scores[best])
+
+    def _load_near_index(self, group: Tuple[str, str, str], now: float) -> Tuple[float, List[str], np.ndarray]:
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT cache_key, embedding FROM query_results
+                WHERE dataset_version = ? AND prompt_version = ? AND embedder = ?
+                  AND embedding IS NOT NULL AND created_at >= ?
+            ''', (*group, now - self.ttl_seconds)).fetchall()
+        finally:
+            conn.close()
+        keys = [row[0] for row in rows]
+        vectors = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        if vectors and len({len(vector) for vector in vectors}) == 1:
+            matrix = np.stack(vectors)
+        else:
+            keys, matrix = [], np.zeros((0, 0), dtype=np.float32)
+        loaded = (now, keys, matrix)
+        with self._lock:
+            # Only the versions in use are kept
+            self._near_index = {group: loaded}
+        return loaded
+
+    def store(self, lookup: CacheLookup, result: str):
+        """Remember the answer to a missed search and evict past the size bound"""
+        now = time.time()
+        embedding = lookup.vector.astype(np.float32).tobytes() if lookup.vector is not None else None
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO query_results
+                    (cache_key, normalized_query, dataset_version, prompt_version, result,
+                     created_at, last_used, embedder, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (lookup.key, lookup.normalized, lookup.dataset_version, lookup.prompt_version, result,
+                  now, now, lookup.embedder, embedding))
+            expired = conn.execute('DELETE FROM query_results WHERE created_at < ?',
+                                   (now - self.ttl_seconds,)).rowcount
+            evicted = conn.execute('''
+                DELETE FROM query_results WHERE cache_key IN (
+                    SELECT cache_key FROM query_results ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,)).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error saving query cache: {e}")
+            with self._lock:
+                self._errors += 1
+            return
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._stored += 1
+            self._expired += expired
+            self._evicted += evicted
+            if embedding is not None:
+                self._near_index.pop((lookup.dataset_version, lookup.prompt_version, lookup.embedder), None)
+
+    def clear(self):
+        """Drop every cached result"""
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM query_results')
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._near_index = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate (exact and near-duplicate), stores and evictions"""
+        with self._lock:
+            lookups = self._hits + self._near_hits + self._misses
+            return {
+                'hits': self._hits,
+                'near_hits': self._near_hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits + self._near_hits) / lookups if lookups else 0.0,
+                'stored': self._stored,
+                'expired': self._expired,
+                'evicted': self._evicted,
+                'errors': self._errors,
+            }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Process-wide query cache, or None if QUERY_CACHE_TTL_SECONDS is 0"""
+    global _query_cache
+    if QUERY_CACHE_TTL_SECONDS <= 0:
+        return None
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache()
+    return _query_cache
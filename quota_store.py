@@ -0,0 +1,193 @@
+"""
+Search quota storage for the Telegram bot.
+Token-bucket limits per plan with atomic check-and-consume, backed by
+SQLite so the quota survives deploys and is shared by every bot worker.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class QuotaPlan(NamedTuple):
+    """Token bucket: `capacity` searches, refilled evenly over `period_seconds`"""
+    capacity: float
+    period_seconds: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period_seconds
+
+
+class QuotaResult(NamedTuple):
+    allowed: bool
+    retry_after: float  # Seconds until the next search is available (0 if allowed)
+    remaining: float    # Tokens left after the operation
+
+
+def plans_from_config(plans: Dict[str, dict]) -> Dict[str, QuotaPlan]:
+    """Build QuotaPlan objects from the SEARCH_QUOTA_PLANS config mapping"""
+    return {
+        name: QuotaPlan(float(plan['capacity']), float(plan['period_hours']) * 3600)
+        for name, plan in plans.items()
+    }
+
+
+class QuotaStore:
+    """
+    Token-bucket quota logic shared by all backends.
+    Subclasses implement `_transaction`, an atomic read-modify-write of one bucket.
+    """
+
+    def __init__(self, plans: Dict[str, QuotaPlan], default_plan: str):
+        if default_plan not in plans:
+            raise ValueError(f"Unknown default quota plan: {default_plan}")
+        self.plans = plans
+        self.default_plan = default_plan
+
+    def _transaction(self, user_id: int,
+                     update: Callable[[Optional[tuple]], Tuple[tuple, QuotaResult]]) -> QuotaResult:
+        """
+        Atomically load the bucket row `(plan, tokens, updated_at)` (None if missing),
+        pass it to `update` and store the row it returns.
+        """
+        raise NotImplementedError
+
+    def set_plan(self, user_id: int, plan: str):
+        """Assign a user to a quota plan, keeping the searches they have left"""
+        if plan not in self.plans:
+            raise ValueError(f"Unknown quota plan: {plan}")
+        now = time.time()
+
+        def update(row):
+            plan_name, current_plan, tokens = self._refilled(row, now)
+            if row is None:
+                tokens = self.plans[plan].capacity
+            return (plan, min(tokens, self.plans[plan].capacity), now), self._result(self.plans[plan], tokens, True)
+
+        self._transaction(user_id, update)
+
+    def _refilled(self, row: Optional[tuple], now: float) -> Tuple[str, QuotaPlan, float]:
+        plan_name = row[0] if row and row[0] in self.plans else self.default_plan
+        plan = self.plans[plan_name]
+        if row is None:
+            return plan_name, plan, plan.capacity
+        tokens = min(plan.capacity, row[1] + max(0.0, now - row[2]) * plan.refill_rate)
+        return plan_name, plan, tokens
+
+    def _result(self, plan: QuotaPlan, tokens: float, allowed: bool) -> QuotaResult:
+        retry_after = 0.0 if tokens >= 1 else (1 - tokens) / plan.refill_rate
+        return QuotaResult(allowed, retry_after, tokens)
+
+    def peek(self, user_id: int) -> QuotaResult:
+        """Check whether a search is available without consuming it"""
+        now = time.time()
+
+        def update(row):
+            plan_name, plan, tokens = self._refilled(row, now)
+            return None, self._result(plan, tokens, tokens >= 1)
+
+        return self._transaction(user_id, update)
+
+    def consume(self, user_id: int, cost: float = 1) -> QuotaResult:
+        """Atomically check and consume `cost` searches"""
+        now = time.time()
+
+        def update(row):
+            plan_name, plan, tokens = self._refilled(row, now)
+            if tokens < cost:
+                return None, self._result(plan, tokens, False)
+            tokens -= cost
+            return (plan_name, tokens, now), self._result(plan, tokens, True)
+
+        return self._transaction(user_id, update)
+
+    def refund(self, user_id: int, cost: float = 1):
+        """Give back searches consumed for a request that did not complete"""
+        now = time.time()
+
+        def update(row):
+            plan_name, plan, tokens = self._refilled(row, now)
+            tokens = min(plan.capacity, tokens + cost)
+            return (plan_name, tokens, now), self._result(plan, tokens, True)
+
+        self._transaction(user_id, update)
+
+
+class MemoryQuotaStore(QuotaStore):
+    """In-process backend - quota is per process and lost on restart"""
+
+    def __init__(self, plans: Dict[str, QuotaPlan], default_plan: str):
+        super().__init__(plans, default_plan)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _transaction(self, user_id, update):
+        with self._lock:
+            new_row, result = update(self._buckets.get(user_id))
+            if new_row is not None:
+                self._buckets[user_id] = new_row
+            return result
+
+
+class SQLiteQuotaStore(QuotaStore):
+    """
+    SQLite backend - `BEGIN IMMEDIATE` serializes check-and-consume
+    across threads and processes sharing the database file.
+    """
+
+    def __init__(self, plans: Dict[str, QuotaPlan], default_plan: str, db_path: str = "bot_chats.db"):
+        super().__init__(plans, default_plan)
+        self.db_path = db_path
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode so transactions are controlled explicitly
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def init_database(self):
+        """Initialize quota table"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS search_quota (
+                user_id INTEGER PRIMARY KEY,
+                plan TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.close()
+
+    def _transaction(self, user_id, update):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT plan, tokens, updated_at FROM search_quota WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            new_row, result = update(row)
+            if new_row is not None:
+                conn.execute('''
+                    INSERT OR REPLACE INTO search_quota (user_id, plan, tokens, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, *new_row))
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+def create_quota_store(backend: str, plans: Dict[str, dict], default_plan: str,
+                       db_path: str = "bot_chats.db") -> QuotaStore:
+    """Create the quota store selected by QUOTA_BACKEND"""
+    quota_plans = plans_from_config(plans)
+    if backend == "memory":
+        return MemoryQuotaStore(quota_plans, default_plan)
+    if backend == "sqlite":
+        return SQLiteQuotaStore(quota_plans, default_plan, db_path)
+    raise ValueError(f"Unknown quota backend: {backend}")
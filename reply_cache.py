@@ -0,0 +1,154 @@
+"""
+Canned replies for chitchat.
+Greetings, thanks and other small talk are answered from a pool of
+pre-generated variants per intent kind instead of an LLM call.
+The pool lives in canned_replies.json and can be regenerated offline:
+
+    python reply_cache.py --refresh [--variants 5]
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from config import CANNED_REPLIES_PATH
+
+logger = logging.getLogger(__name__)
+
+RELOAD_CHECK_INTERVAL = 30  # Seconds between checks for a refreshed replies file
+
+
+class ReplyCache:
+    """
+    Chitchat kind -> reply variants, loaded from a JSON file.
+    The file is reloaded when it changes on disk, so a refresh is picked
+    up by running bots without a restart.
+    """
+
+    def __init__(self, path: str = CANNED_REPLIES_PATH):
+        self.path = path
+        self._replies: Dict[str, List[str]] = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = Counter()
+        self._misses = Counter()
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            if self._mtime is not None:
+                logger.warning(f"⚠️ Canned replies file {self.path} disappeared, keeping loaded replies")
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                replies = json.load(f).get("replies", {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading canned replies from {self.path}: {e}")
+            return
+        self._replies = {kind: [reply for reply in variants if reply] for kind, variants in replies.items()}
+        self._mtime = mtime
+        logger.info(f"💬 Loaded canned replies for {len(self._replies)} chitchat kinds")
+
+    def get(self, kind: Optional[str]) -> Optional[str]:
+        """A random reply variant for a chitchat kind, or None if there is none"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check >= RELOAD_CHECK_INTERVAL:
+                self._last_check = now
+                self._reload()
+            variants = self._replies.get(kind) if kind else None
+            if not variants:
+                self._misses[kind or "unknown"] += 1
+                return None
+            self._hits[kind] += 1
+            return random.choice(variants)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate overall and per chitchat kind"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                'hits': hits,
+                'llm_fallbacks': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'hits_by_kind': dict(self._hits),
+                'fallbacks_by_kind': dict(self._misses),
+            }
+
+
+_reply_cache = None
+_reply_cache_lock = threading.Lock()
+
+
+def get_reply_cache() -> ReplyCache:
+    """Process-wide reply cache"""
+    global _reply_cache
+    if _reply_cache is None:
+        with _reply_cache_lock:
+            if _reply_cache is None:
+                _reply_cache = ReplyCache()
+    return _reply_cache
+
+
+def refresh_replies(path: str = CANNED_REPLIES_PATH, variants: int = 5):
+    """Regenerate the reply variants of every chitchat kind with the LLM"""
+    from intent_classifier import CHITCHAT_PHRASES
+    from chatgpt_handler import NON_SEARCH_SYSTEM_PROMPT
+    from openai_client import get_openai_client
+
+    client = get_openai_client()
+    replies = {}
+    for kind, phrases in CHITCHAT_PHRASES.items():
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": NON_SEARCH_SYSTEM_PROMPT},
+                {"role": "user", "content": (
+                    f"Напишіть {variants} різних коротких відповідей (1-2 речення) на повідомлення на кшталт: "
+                    f"{', '.join(phrases)}. Кожна відповідь має запрошувати описати, якого експерта шукає людина. "
+                    "Поверніть лише JSON-масив рядків."
+                )}
+            ],
+            max_tokens=600,
+            temperature=0.9
+        )
+        generated = json.loads(response.choices[0].message.content)
+        replies[kind] = [reply.strip() for reply in generated if isinstance(reply, str) and reply.strip()]
+        print(f"{kind}: {len(replies[kind])} variants")
+
+    payload = {"version": int(time.time()), "replies": replies}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage canned chitchat replies")
+    parser.add_argument("--refresh", action="store_true", help="regenerate reply variants with the LLM")
+    parser.add_argument("--variants", type=int, default=5, help="variants per chitchat kind")
+    args = parser.parse_args()
+
+    if args.refresh:
+        refresh_replies(variants=args.variants)
+    else:
+        cache = ReplyCache()
+        for kind, variants in sorted(cache._replies.items()):
+            print(f"{kind}: {len(variants)} variants")
@@ -0,0 +1,116 @@
+"""
+Per-user session store for the Telegram bot.
+Sessions are evicted least-recently-used once the store is full and
+after they have been idle for a while, so memory stays bounded no
+matter how many users the bot has seen.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 60  # Seconds between idle-session sweeps
+
+
+def _history_size(history: list) -> int:
+    """Approximate bytes held by a conversation history"""
+    size = sys.getsizeof(history)
+    for message in history:
+        size += sys.getsizeof(message)
+        for value in message.values():
+            size += sys.getsizeof(value)
+    return size
+
+
+class SessionManager:
+    """
+    LRU + TTL store of user sessions.
+
+    `factory()` builds a new session for an unknown user. Sessions idle for
+    longer than `ttl_seconds` are dropped on the next sweep, and the least
+    recently used session is dropped when `max_sessions` is exceeded.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 10000, ttl_seconds: float = 6 * 3600):
+        self.factory = factory
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[int, list]" = OrderedDict()  # user_id -> [session, last_used]
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        # Metrics
+        self._created = 0
+        self._evicted_lru = 0
+        self._evicted_idle = 0
+
+    def get(self, user_id: int):
+        """Get the user's session, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+
+            entry = self._sessions.get(user_id)
+            if entry is not None:
+                entry[1] = now
+                self._sessions.move_to_end(user_id)
+                return entry[0]
+
+            session = self.factory()
+            self._sessions[user_id] = [session, now]
+            self._created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evicted_lru += 1
+            return session
+
+    def _sweep(self, now: float):
+        """Drop idle sessions (called with the lock held)"""
+        self._last_sweep = now
+        cutoff = now - self.ttl_seconds
+        expired = 0
+        # Ordered by last use, so idle sessions are at the front
+        while self._sessions:
+            user_id, (session, last_used) = next(iter(self._sessions.items()))
+            if last_used > cutoff:
+                break
+            del self._sessions[user_id]
+            expired += 1
+        if expired:
+            self._evicted_idle += expired
+            logger.info(f"🧹 Evicted {expired} idle user sessions")
+
+    def discard(self, user_id: int):
+        """Forget a user's session"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Session counts, evictions and approximate memory held by conversation histories"""
+        with self._lock:
+            sizes = [
+                _history_size(getattr(session, 'conversation_history', []))
+                for session, _ in self._sessions.values()
+            ]
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'created': self._created,
+                'evicted_lru': self._evicted_lru,
+                'evicted_idle': self._evicted_idle,
+                'history_bytes_total': sum(sizes),
+                'history_bytes_avg': sum(sizes) // len(sizes) if sizes else 0,
+                'history_bytes_max': max(sizes) if sizes else 0,
+            }
@@ -9,11 +9,13 @@ setup(
     install_requires=[
         "python-telegram-bot==20.8",
         "pandas==2.1.4",
+        "numpy",
         "openai==1.3.7",
         "python-dotenv==1.0.0",
         "openpyxl==3.1.2",
         "flask==3.0.0",
         "requests==2.31.0",
+        "aiohttp==3.9.1",
     ],
     python_requires=">=3.8",
 )
@@ -0,0 +1,155 @@
+"""
+Request coalescing for slow calls.
+While a call for a key is in flight, further callers with the same key
+wait for it and share its result (or its exception) instead of starting
+their own. Nothing is kept once the call finishes - results are cached
+elsewhere - so a failed call is retried by the next caller.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class _Metrics:
+    """Counters shared by both implementations"""
+
+    def __init__(self):
+        self._metrics_lock = threading.Lock()
+        self._calls = 0
+        self._shared = 0
+        self._failed = 0
+        self._timeouts = 0
+
+    def _count(self, name: str, amount: int = 1):
+        with self._metrics_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls made, callers served by another caller's call, failures and wait timeouts"""
+        with self._metrics_lock:
+            callers = self._calls + self._shared
+            return {
+                'calls': self._calls,
+                'shared': self._shared,
+                'shared_rate': self._shared / callers if callers else 0.0,
+                'failed': self._failed,
+                'timeouts': self._timeouts,
+                'in_flight': len(self._in_flight),
+            }
+
+
+class SingleFlight(_Metrics):
+    """Thread version: the first caller runs the function in its own thread"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Any:
+        """
+        Result of `fn()`, shared with concurrent callers of the same key.
+        A caller that waits longer than `timeout` for another caller's
+        call gets TimeoutError; the call itself keeps running for the rest.
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                self._count('_timeouts')
+                raise TimeoutError(f"Shared call still running after {timeout}s")
+            self._count('_shared')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count('_calls')
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            self._count('_failed')
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+            if call.waiters:
+                logger.info(f"🔗 Shared one call with {call.waiters} concurrent callers")
+
+
+class AsyncSingleFlight(_Metrics):
+    """
+    asyncio version: the first caller awaits the coroutine, the others
+    await its future. If the first caller is cancelled, a waiting caller
+    takes over and starts the call again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._in_flight: Dict[Hashable, "asyncio.Future"] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float = None) -> Any:
+        """Async version of SingleFlight.do"""
+        while True:
+            future = self._in_flight.get(key)
+            if future is None:
+                return await self._lead(key, fn)
+            try:
+                # Shielded so a caller's timeout or cancellation does not cancel the shared call
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self._count('_timeouts')
+                raise TimeoutError(f"Shared call still running after {timeout}s") from None
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # The first caller was cancelled - retry, possibly as the new first caller
+                    continue
+                raise
+            except BaseException:
+                self._count('_shared')
+                raise
+            self._count('_shared')
+            return result
+
+    async def _lead(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self._count('_calls')
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._count('_failed')
+            future.set_exception(e)
+            # Retrieved here so an exception nobody else waited for is not logged as lost
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
@@ -0,0 +1,272 @@
+"""
+Supervisor mode for the Telegram bot.
+One process owns ingestion (polling or webhook) and routes updates to
+N worker processes by hashing chat_id, so the bot can use every core
+while each chat is still handled in order by a single worker.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from config import (BOT_WORKERS, MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES, QUOTA_BACKEND,
+                    WORKER_HEARTBEAT_INTERVAL, WORKER_HEARTBEAT_TIMEOUT)
+from dispatcher import UpdateDispatcher, chat_key_for_update
+
+logger = logging.getLogger(__name__)
+
+# Spawned (not forked) workers - the supervisor has threads running when it restarts one
+_mp = multiprocessing.get_context("spawn")
+
+
+def shard_for_key(key: Any, num_shards: int) -> int:
+    """Stable shard index for a chat key (same result in every process)"""
+    return zlib.crc32(str(key).encode()) % num_shards
+
+
+def worker_main(index: int, num_workers: int, task_queue, result_queue, queue_size: int):
+    """Entry point of a worker process: handle routed updates with a local dispatcher"""
+    from telegram_bot_simple import SimpleTelegramBot
+
+    # Every worker sends on its own, so each gets an equal share of the global
+    # rate; chats are sharded, so per-chat limits need no splitting. The
+    # supervisor has already compiled the profile store and embeddings.
+    bot = SimpleTelegramBot(single_instance=False, rate_share=1 / num_workers, compile_stores=False)
+    # The supervisor owns dedupe and offsets - only report completions back
+    bot.dispatcher = UpdateDispatcher(
+        bot.process_update,
+        max_workers=MAX_CONCURRENT_UPDATES,
+        max_queue_size=queue_size,
+        on_complete=lambda update: result_queue.put(("done", index, update["update_id"]))
+    )
+    bot.dispatcher.start()
+    logger.info(f"👷 Worker {index} ready")
+
+    last_heartbeat = 0.0
+    try:
+        while True:
+            now = time.monotonic()
+            if now - last_heartbeat >= WORKER_HEARTBEAT_INTERVAL:
+                result_queue.put(("heartbeat", index, bot.dispatcher.get_stats()))
+                last_heartbeat = now
+
+            try:
+                update = task_queue.get(timeout=WORKER_HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            if update is None:
+                break
+            bot.dispatcher.submit(update)
+    except KeyboardInterrupt:
+        pass
+
+    bot.dispatcher.shutdown()
+    bot.audio_jobs.shutdown()
+    bot.outbound.shutdown()
+    bot.data_handler.close()
+    logger.info(f"👷 Worker {index} stopped")
+
+
+class _WorkerSlot:
+    """Supervisor-side state of one worker shard"""
+
+    def __init__(self, index: int, capacity: int):
+        self.index = index
+        self.process = None
+        self.task_queue = None
+        self.in_flight: Dict[int, dict] = {}  # update_id -> update, until the worker reports it done
+        self.slots = threading.BoundedSemaphore(capacity)
+        self.last_heartbeat = 0.0
+        self.stats: Dict[str, Any] = {}
+        self.restarts = 0
+        self.routed = 0
+        self.completed = 0
+
+
+class ShardRouter:
+    """
+    Drop-in replacement for UpdateDispatcher that routes updates to worker processes.
+
+    Routing is by `crc32(chat_id) % workers`, so a chat always lands on the
+    same worker and keeps its ordering. Each shard has a bounded number of
+    unacknowledged updates (backpressure). A monitor thread restarts workers
+    that exit or stop sending heartbeats and re-sends their unfinished updates.
+    """
+
+    def __init__(self, num_workers: int = BOT_WORKERS, max_queue_size: int = MAX_QUEUED_UPDATES,
+                 on_complete: Optional[Callable[[dict], None]] = None,
+                 key_func: Callable[[dict], Any] = chat_key_for_update):
+        self.num_workers = max(1, num_workers)
+        self.shard_capacity = max(1, max_queue_size // self.num_workers)
+        self.on_complete = on_complete
+        self.key_func = key_func
+        self._lock = threading.Lock()
+        self._workers = [_WorkerSlot(i, self.shard_capacity) for i in range(self.num_workers)]
+        self._result_queue = _mp.Queue()
+        self._running = False
+        self._stopping = False
+        self._threads = []
+        self._rejected = 0
+
+    def start(self):
+        """Start worker processes plus the result collector and health monitor"""
+        if self._running:
+            return
+        self._running = True
+        for slot in self._workers:
+            self._spawn(slot)
+        for target, name in ((self._collect_results, "shard-results"), (self._monitor, "shard-monitor")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"🧭 Supervisor started {self.num_workers} workers "
+                    f"({MAX_CONCURRENT_UPDATES} threads each, {self.shard_capacity} queued updates per shard)")
+
+    def _spawn(self, slot: _WorkerSlot):
+        slot.task_queue = _mp.Queue()
+        slot.process = _mp.Process(
+            target=worker_main,
+            args=(slot.index, self.num_workers, slot.task_queue, self._result_queue, self.shard_capacity),
+            name=f"bot-worker-{slot.index}",
+            daemon=True
+        )
+        slot.process.start()
+        slot.last_heartbeat = time.monotonic()
+
+    def submit(self, update: dict, timeout: Optional[float] = None) -> bool:
+        """Route an update to its worker; blocks while that shard is full"""
+        slot = self._workers[shard_for_key(self.key_func(update), self.num_workers)]
+        if not slot.slots.acquire(timeout=timeout):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"⚠️ Worker {slot.index} queue full, rejected update {update.get('update_id')}")
+            return False
+
+        with self._lock:
+            slot.in_flight[update["update_id"]] = update
+            slot.routed += 1
+            slot.task_queue.put(update)
+        return True
+
+    def _collect_results(self):
+        while True:
+            try:
+                kind, index, payload = self._result_queue.get(timeout=1)
+            except queue.Empty:
+                if not self._running:
+                    # Stopped and drained
+                    break
+                continue
+            except (EOFError, OSError):
+                break
+
+            slot = self._workers[index]
+            if kind == "heartbeat":
+                with self._lock:
+                    slot.last_heartbeat = time.monotonic()
+                    slot.stats = payload
+                continue
+
+            with self._lock:
+                update = slot.in_flight.pop(payload, None)
+                if update is None:
+                    continue
+                slot.completed += 1
+            slot.slots.release()
+            if self.on_complete:
+                try:
+                    self.on_complete(update)
+                except Exception as e:
+                    logger.error(f"Error in completion callback for update {payload}: {e}")
+
+    def _monitor(self):
+        while not self._stopping:
+            time.sleep(WORKER_HEARTBEAT_INTERVAL)
+            for slot in self._workers:
+                if self._stopping:
+                    break
+                alive = slot.process.is_alive()
+                silent_for = time.monotonic() - slot.last_heartbeat
+                if alive and silent_for < WORKER_HEARTBEAT_TIMEOUT:
+                    continue
+
+                if alive:
+                    logger.error(f"💀 Worker {slot.index} sent no heartbeat for {silent_for:.0f}s - restarting")
+                    slot.process.terminate()
+                    slot.process.join(5)
+                else:
+                    logger.error(f"💀 Worker {slot.index} exited with code {slot.process.exitcode} - restarting")
+                self._restart(slot)
+
+    def _restart(self, slot: _WorkerSlot):
+        with self._lock:
+            slot.restarts += 1
+            self._spawn(slot)
+            # The old queue may have died with the worker - resend everything unacknowledged in order
+            unfinished = [slot.in_flight[update_id] for update_id in sorted(slot.in_flight)]
+            for update in unfinished:
+                slot.task_queue.put(update)
+        if unfinished:
+            logger.info(f"♻️ Re-sent {len(unfinished)} unfinished updates to worker {slot.index}")
+
+    def shutdown(self, wait: bool = True):
+        """Stop workers; with `wait` they finish their queued updates first"""
+        if not self._running:
+            return
+        self._stopping = True
+        for slot in self._workers:
+            slot.task_queue.put(None)
+        for slot in self._workers:
+            slot.process.join(None if wait else 5)
+            if slot.process.is_alive():
+                slot.process.terminate()
+        # The collector drains remaining completions before it exits
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        logger.info("🧭 Supervisor stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aggregated stats of all workers plus per-worker health"""
+        totals = {'submitted': 0, 'processed': 0, 'failed': 0, 'pending': 0, 'active': 0}
+        workers = []
+        now = time.monotonic()
+        with self._lock:
+            for slot in self._workers:
+                for key in totals:
+                    totals[key] += slot.stats.get(key, 0)
+                workers.append({
+                    'index': slot.index,
+                    'pid': slot.process.pid if slot.process else None,
+                    'alive': bool(slot.process and slot.process.is_alive()),
+                    'heartbeat_age_seconds': round(now - slot.last_heartbeat, 1),
+                    'routed': slot.routed,
+                    'completed': slot.completed,
+                    'unacknowledged': len(slot.in_flight),
+                    'restarts': slot.restarts,
+                })
+            return {
+                'workers': self.num_workers,
+                'queue_limit': self.shard_capacity * self.num_workers,
+                'rejected': self._rejected,
+                'restarts': sum(slot.restarts for slot in self._workers),
+                **totals,
+                'per_worker': workers,
+            }
+
+
+def run_supervisor():
+    """Run the bot in supervisor mode with BOT_WORKERS worker processes"""
+    from telegram_bot_simple import SimpleTelegramBot
+
+    if QUOTA_BACKEND == "memory":
+        logger.warning("⚠️ QUOTA_BACKEND=memory is per process - use sqlite so workers share the search quota")
+
+    bot = SimpleTelegramBot()
+    bot.dispatcher = ShardRouter(on_complete=bot._on_update_complete)
+    bot.run()
@@ -10,12 +10,33 @@ import time
 import logging
 import fcntl
 import os
-from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable
 from data_handler import DataHandler
-from chatgpt_handler import ChatGPTHandler
-from config import TELEGRAM_BOT_TOKEN, USERS_CSV_PATH
+from bm25_index import BM25_INDEX, BM25Index
+from embedding_index import EMBEDDING_INDEX, build_embedding_index
+from facet_index import FACET_INDEX, FacetIndex
+from chatgpt_handler import ChatGPTHandler, matching_packer, search_flights
+from config import (TELEGRAM_BOT_TOKEN, USERS_CSV_PATH, PROFILE_RELOAD_INTERVAL, PROFILE_STORE_PATH,
+                    MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES, DISPATCHER_STATS_INTERVAL, DEDUP_WINDOW_SIZE, UPDATE_MODE,
+                    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_HOST, WEBHOOK_PORT,
+                    QUOTA_BACKEND, QUOTA_DB_PATH, SEARCH_QUOTA_PLANS, DEFAULT_SEARCH_PLAN,
+                    OUTBOUND_WORKERS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE,
+                    TELEGRAM_CHAT_BURST, OUTBOUND_MAX_RETRIES, SESSION_MAX_USERS, SESSION_TTL_SECONDS,
+                    AUDIO_JOB_WORKERS, AUDIO_JOB_QUEUE_SIZE, AUDIO_JOB_MAX_RETRIES)
 from database import Database
 from audio_handler import AudioHandler
+from dispatcher import UpdateDispatcher
+from progress_reporter import ProgressReporter
+from update_tracker import UpdateDeduplicator, OffsetTracker
+from quota_store import create_quota_store
+from outbound_queue import OutboundSender
+from http_transport import get_transport, iter_multipart
+from session_manager import SessionManager
+from job_queue import JobQueue
+from media_cache import MediaCache, extract_file_id, is_invalid_file_id_error
+from intent_classifier import CHITCHAT, UNCLEAR, classify
+from reply_cache import get_reply_cache
 
 # Enable logging
 logging.basicConfig(
@@ -24,23 +45,173 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+APP_STORE_URL = "https://apps.apple.com/ua/app/business-match-social-app/id1547614364"
+
+# Use your Business Match image from Postimage
+BUSINESS_MATCH_IMAGE_URL = "https://i.postimg.cc/mtFChPhV/ChatGPT-Image-15-вер-2025-р-18-52-13.png"
+BUSINESS_MATCH_IMAGE_CAPTION = "🚀 Business Match - Ваш асистент з нетворкінгу"
+
+START_MESSAGE = """Вітаємо у Business Match 🚀
+Я — ваш асистент зі структурованого нетворкінгу. У нашій базі понад 50 000+ перевірених професіоналів, відкритих до співпраці. Допоможу швидко знайти релевантних партнерів та можливості для розвитку бізнесу 📈
+
+🤝 Як це працює:
+Опишіть, кого шукаєте: галузь, роль, рівень, географія, формат співпраці.
+
+📌 Приклади запитів:
+• «Шукаю маркетологів для IT-стартапу»
+• «Потрібні інвестори для e-commerce проєкту»
+• «Хочу зустрітися з підприємцями у сфері охорони здоров'я»
+• «Шукаю ментора з digital-маркетингу»
+
+Я зіставлю ваш запит із базою та надам короткий список релевантних контактів із обґрунтуванням ✅"""
+
+HELP_TEXT = """
+*🤖 Допомога Business Match Bot*
+
+*Команди:*
+/start - Почати роботу з ботом та отримати інструкції
+/help - Показати це повідомлення допомоги
+/cancel - Скасувати поточну розмову
+
+*Як знайти бізнес-зв'язки:*
+Просто напишіть, що ви шукаєте! Наприклад:
+• "Шукаю експертів з маркетингу в IT-стартапах"
+• "Потрібні інвестори для мого e-commerce бізнесу"
+• "Хочу зустрітися з підприємцями в сфері охорони здоров'я"
+
+Бот проаналізує нашу базу з 500+ професіоналів і надасть вам топ-3 найкращих збігів з детальними поясненнями!
+
+*Функції:*
+✅ AI-збіги за допомогою ChatGPT
+✅ 500+ бізнес-професіоналів у базі даних
+✅ Детальний аналіз сумісності
+✅ Контактна інформація та посилання на соцмережі
+✅ Обробка природної мови
+"""
+
+CANCEL_MESSAGE = "✅ Розмову скасовано. Використовуйте /start для початку нового пошуку!"
+
+PROGRESS_STEPS = [
+    "📥 **Отримання інформації...**",
+    "🤖 **Обробка інформації за допомогою AI...**",
+    "🔍 **Пошук користувачів, які підходять під ваш запит...**",
+    "⏳ **Детальний аналіз збігів... (це може зайняти до 2 хвилин)**",
+]
+PROGRESS_STEP_DELAY = 3
+
+SEARCH_ERROR_MESSAGE = ("😔 **Виникла помилка при обробці запиту.**\n\n"
+    "Спробуйте ще раз або зверніться до підтримки.")
+
+UNCLEAR_QUERY_MESSAGE = ("🤔 **Ваш запит не зовсім зрозумілий.**\n\n"
+    "Будь ласка, сформулюйте точніше, яких бізнес-професіоналів ви шукаєте.\n\n"
+    "**Приклади чітких запитів:**\n"
+    "• «Шукаю фахівців із маркетингу для IT-стартапу»\n"
+    "• «Потрібні інвестори для e-commerce проєкту»\n"
+    "• «Хочу зустрітися з підприємцями у сфері охорони здоров'я»\n"
+    "• «Шукаю менторів із digital-маркетингу»")
+
+FOLLOW_UP_MESSAGE = ("Дякую, що скористались ботом. Ви маєте можливість робити один такий запит раз на 24 години.\n\n"
+    "💡 Для доступу до більшої бази професіоналів та повного функціоналу встановіть додаток Business Match!\n\n"
+    f"📱 [Встановити Business Match]({APP_STORE_URL})")
+
+
+def format_limit_message(remaining_time: str) -> str:
+    """Build the 24h search limit message"""
+    return (f"⏰ **Ліміт пошуку!**\n\n"
+        f"Ви вже зробили пошук менше ніж 24 години тому.\n"
+        f"**Доступно через:** {remaining_time}\n\n"
+        f"🚀 **Для необмеженого доступу встановіть додаток Business Match:**\n\n"
+        f"📱 [Business Match App]({APP_STORE_URL})\n\n"
+        f"✨ Там ви зможете робити необмежену кількість пошуків та знайти всіх експертів!")
+
+
+def format_match_message(matches_response: str) -> str:
+    """Format the model's JSON match as a chat message (raw text if it is not JSON)"""
+    try:
+        # Try to parse JSON response
+        logger.info(f"🔍 Attempting to parse JSON response: {matches_response[:200]}...")
+        match_data = json.loads(matches_response)
+        
+        # Send structured match information
+        match_message = f"💼 **Знайдений експерт: {match_data['name']}**\n"
+        match_message += f"🧮 **Збіг - {match_data.get('match_percentage', '85')}%**\n\n"
+        
+        match_message += f"📋 **Про експерта:**\n{match_data['description']}\n\n"
+        
+        # Add contact information if available
+        if match_data.get('contact_info') and match_data['contact_info'] != 'Не вказано':
+            match_message += f"📞 **Контактна інформація:** {match_data['contact_info']}\n\n"
+        
+        match_message += f"✨ **Чому корисний для вас:** {match_data['reason']}"
+        return match_message
+        
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        # Fallback to direct text format
+        logger.info("📝 Using direct text format for match result")
+        return matches_response
+
 class SimpleTelegramBot:
-    def __init__(self):
+    def __init__(self, single_instance: bool = True, rate_share: float = 1.0, compile_stores: bool = True):
+        # Supervisor workers pass their share of TELEGRAM_GLOBAL_RATE and load the
+        # profile store and embeddings the supervisor compiled instead of building them
         self.token = TELEGRAM_BOT_TOKEN
         self.base_url = f"https://api.telegram.org/bot{self.token}"
-        self.data_handler = DataHandler(USERS_CSV_PATH)
+        self.http = get_transport()  # Pooled keep-alive connections shared with AudioHandler
+        self.data_handler = DataHandler(  # Hot-reloaded profile base
+            USERS_CSV_PATH, PROFILE_RELOAD_INTERVAL, PROFILE_STORE_PATH, compile_store=compile_stores
+        )
+        self.data_handler.register_index(BM25_INDEX, BM25Index)  # Candidate retrieval for the fallback matcher
+        self.data_handler.register_index(  # Matching by meaning; without it BM25 alone ranks candidates
+            EMBEDDING_INDEX, partial(build_embedding_index, load_only=not compile_stores), optional=True
+        )
+        self.data_handler.register_index(FACET_INDEX, FacetIndex)  # Place and "open to" filters, facet counts
         self.chatgpt_handler = ChatGPTHandler(self.data_handler)
         self.database = Database()  # Initialize database
         self.audio_handler = AudioHandler()
-        self.user_sessions = {}
-        self.user_last_search_time = {}  # Track when each user last searched (24h limit)
-        self.last_update_id = 0
-        self.processed_updates = set()  # Track processed updates to prevent duplicates
+        self.media_cache = MediaCache(self.database)  # Telegram file_ids of uploaded media
+        self.user_sessions = SessionManager(  # LRU/TTL-bounded ChatGPT sessions
+            lambda: ChatGPTHandler(self.data_handler),
+            max_sessions=SESSION_MAX_USERS,
+            ttl_seconds=SESSION_TTL_SECONDS
+        )
+        self.search_quota = create_quota_store(  # Search limit per user (shared between workers)
+            QUOTA_BACKEND, SEARCH_QUOTA_PLANS, DEFAULT_SEARCH_PLAN, QUOTA_DB_PATH
+        )
+        self.processed_updates = UpdateDeduplicator(DEDUP_WINDOW_SIZE)  # Recent updates, to prevent duplicates
+        self.offset_tracker = OffsetTracker(self.database)  # Crash-safe resume point
+        self.last_update_id = self.offset_tracker.resume_offset
+        self._create_runtime(rate_share)
         
         # File lock to prevent multiple bot instances
+        # (supervisor workers skip it - the supervisor holds the lock for ingestion)
         self.lock_file = "/tmp/bmchatbot.lock"
         self.lock_fd = None
-        self._acquire_lock()
+        if single_instance:
+            self._acquire_lock()
+    
+    def _create_runtime(self, rate_share: float):
+        """Thread pools that handle updates, audio jobs and sends (the async runtime has its own)"""
+        self.dispatcher = UpdateDispatcher(
+            self.process_update,
+            max_workers=MAX_CONCURRENT_UPDATES,
+            max_queue_size=MAX_QUEUED_UPDATES,
+            on_complete=self._on_update_complete
+        )
+        self.audio_jobs = JobQueue(  # Background audio summaries
+            "audio",
+            workers=AUDIO_JOB_WORKERS,
+            max_pending=AUDIO_JOB_QUEUE_SIZE,
+            max_retries=AUDIO_JOB_MAX_RETRIES
+        )
+        self.outbound = OutboundSender(  # Rate-limited send queue for replies
+            self._api_call,
+            workers=OUTBOUND_WORKERS,
+            global_rate=TELEGRAM_GLOBAL_RATE * rate_share,
+            chat_rate=TELEGRAM_CHAT_RATE,
+            group_rate=TELEGRAM_GROUP_RATE,
+            chat_burst=TELEGRAM_CHAT_BURST,
+            max_retries=OUTBOUND_MAX_RETRIES
+        )
     
     def _acquire_lock(self):
         """Acquire file lock to prevent multiple bot instances"""
@@ -65,9 +236,7 @@ class SimpleTelegramBot:
     
     def get_user_session(self, user_id: int) -> ChatGPTHandler:
         """Get or create user session"""
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = ChatGPTHandler(self.data_handler)
-        return self.user_sessions[user_id]
+        return self.user_sessions.get(user_id)
     
     def log_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
         """Log user information to database"""
@@ -90,96 +259,90 @@ class SimpleTelegramBot:
         except Exception as e:
             logger.error(f"Error logging search for user {user_id}: {e}")
     
-    def can_user_search(self, user_id: int) -> tuple[bool, str]:
-        """Check if user can make a search (24h limit)"""
-        current_time = datetime.now()
+    def _format_remaining_time(self, seconds: float) -> str:
+        """Format the wait until the next search"""
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
         
-        if user_id not in self.user_last_search_time:
+        if hours > 0:
+            return f"{hours} год. {minutes} хв."
+        return f"{minutes} хв."
+    
+    def can_user_search(self, user_id: int) -> tuple[bool, str]:
+        """Check if user can make a search (24h limit) without using it up"""
+        result = self.search_quota.peek(user_id)
+        if result.allowed:
             return True, ""
-        
-        last_search = self.user_last_search_time[user_id]
-        time_passed = current_time - last_search
-        
-        if time_passed >= timedelta(hours=24):
+        return False, self._format_remaining_time(result.retry_after)
+    
+    def reserve_search(self, user_id: int) -> tuple[bool, str]:
+        """Atomically check and consume one search from the user's quota"""
+        result = self.search_quota.consume(user_id)
+        if result.allowed:
             return True, ""
-        
-        # Calculate remaining time
-        remaining_time = timedelta(hours=24) - time_passed
-        hours = int(remaining_time.total_seconds() // 3600)
-        minutes = int((remaining_time.total_seconds() % 3600) // 60)
-        
-        if hours > 0:
-            time_str = f"{hours} год. {minutes} хв."
+        return False, self._format_remaining_time(result.retry_after)
+    
+    def refund_search(self, user_id: int):
+        """Return a reserved search when no match was delivered"""
+        try:
+            self.search_quota.refund(user_id)
+        except Exception as e:
+            logger.error(f"Error refunding search for user {user_id}: {e}")
+    
+    def _api_call(self, method: str, data: dict = None, files: dict = None, timeout: int = 30) -> dict:
+        """
+        Make one Bot API request and return the decoded response.
+        `files` maps form field names to callables returning (filename,
+        content_type, chunks); they are called again for every attempt.
+        Raises on network errors.
+        """
+        url = f"{self.base_url}/{method}"
+        
+        if files:
+            content_type, body = iter_multipart(data, {field: source() for field, source in files.items()})
+            response = self.http.post(url, data=body, headers={'Content-Type': content_type}, timeout=timeout)
         else:
-            time_str = f"{minutes} хв."
-        
-        return False, time_str
-    
-    def _is_search_query(self, text: str) -> bool:
-        """Check if the message is a search query or other message"""
-        text_lower = text.lower().strip()
-        
-        # Non-search indicators
-        non_search_indicators = [
-            "дякую", "спасибі", "thank you", "thanks",
-            "привіт", "вітаю", "добрий день", "доброго дня", "hello", "hi",
-            "як справи", "що нового", "how are you",
-            "допоможи", "help", "допомога",
-            "що робиш", "що можна", "можливості",
-            "тест", "test", "перевірка",
-            "працює", "робота", "work",
-            "старт", "start", "почати",
-            "інформація", "information", "інфо", "info"
-        ]
-        
-        # Check for non-search indicators
-        for indicator in non_search_indicators:
-            if indicator in text_lower:
-                return False
-        
-        # Check for search keywords
-        search_keywords = [
-            "шукаю", "потрібен", "потрібні", "потрібна", "потрібно",
-            "експерт", "фахівець", "спеціаліст", "професіонал",
-            "маркетинг", "дизайн", "розробка", "програмування",
-            "інвестор", "інвестиції", "бізнес", "стартап",
-            "ментор", "консультант", "тренер", "коуч",
-            "продажі", "реклама", "PR", "брендинг",
-            "фінанси", "бухгалтер", "юрист", "HR",
-            "IT", "технології", "цифрові", "онлайн"
-        ]
-        
-        # If contains search keywords, it's likely a search query
-        for keyword in search_keywords:
-            if keyword in text_lower:
-                return True
+            response = self.http.post(url, json=data, timeout=timeout)
         
-        # If very short and no clear indicators, treat as non-search
-        if len(text_lower) < 10:
-            return False
+        try:
+            return response.json()
+        except ValueError:
+            return {"ok": False, "error_code": response.status_code, "description": response.text}
+    
+    def _send(self, chat_id: int, method: str, data: dict, files: dict = None, wait: bool = False):
+        """Enqueue a Bot API call on the outbound queue; with `wait` block for the response"""
+        future = self.outbound.submit(chat_id, method, data, files)
+        if wait:
+            return future.result()
+        return future
+    
+    def send_message(self, chat_id: int, text: str, parse_mode: str = "Markdown", wait: bool = False):
+        """
+        Send a message to a chat.
+        Returns a future for the API response, or the response itself with `wait=True`.
+        """
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode
+        }
         
-        # Default to search query for longer messages without clear non-search indicators
-        return True
+        return self._send(chat_id, "sendMessage", data, wait=wait)
     
-    def send_message(self, chat_id: int, text: str, parse_mode: str = "Markdown"):
-        """Send a message to a chat"""
-        url = f"{self.base_url}/sendMessage"
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, parse_mode: str = "Markdown",
+                          wait: bool = False):
+        """Replace the text of a previously sent message"""
         data = {
             "chat_id": chat_id,
+            "message_id": message_id,
             "text": text,
             "parse_mode": parse_mode
         }
         
-        try:
-            response = requests.post(url, json=data)
-            return response.json()
-        except Exception as e:
-            logger.error(f"Error sending message: {e}")
-            return None
+        return self._send(chat_id, "editMessageText", data, wait=wait)
     
-    def send_photo(self, chat_id: int, photo_url: str, caption: str = ""):
+    def send_photo(self, chat_id: int, photo_url: str, caption: str = "", wait: bool = False):
         """Send a photo to a chat"""
-        url = f"{self.base_url}/sendPhoto"
         data = {
             "chat_id": chat_id,
             "photo": photo_url,
@@ -187,57 +350,98 @@ class SimpleTelegramBot:
             "parse_mode": "Markdown"
         }
         
-        try:
-            logger.info(f"Sending photo to chat {chat_id}: {photo_url}")
-            response = requests.post(url, json=data)
-            result = response.json()
-            if response.status_code == 200:
+        def log_result(future):
+            result = future.result()
+            if result and result.get("ok"):
                 logger.info(f"✅ Photo sent successfully to chat {chat_id}")
             else:
-                logger.error(f"❌ Failed to send photo: HTTP {response.status_code}: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Error sending photo: {e}")
-            return None
+                logger.error(f"❌ Failed to send photo: {result}")
+        
+        logger.info(f"Sending photo to chat {chat_id}: {photo_url}")
+        future = self._send(chat_id, "sendPhoto", data)
+        future.add_done_callback(log_result)
+        return future.result() if wait else future
+    
+    def send_summary_audio(self, chat_id: int, summary_text: str) -> bool:
+        """
+        Send the audio of a summary to a chat, synthesizing it first unless
+        Telegram already has it. Sent as a voice note for AUDIO_FORMAT=ogg,
+        otherwise as an audio file.
+        """
+        if self.audio_handler.audio_format == "ogg":
+            method, field = "sendVoice", "voice"
+            data = {'chat_id': chat_id}
+        else:
+            method, field = "sendAudio", "audio"
+            data = {
+                'chat_id': chat_id,
+                'title': 'Підсумок збігу',
+                'performer': 'Business Match Bot'
+            }
+        
+        def prepare_upload():
+            # Runs on the calling (audio job) thread, so the outbound workers
+            # that send it only read a local file and never wait for TTS
+            path = self.audio_handler.synthesize(summary_text)
+            filename = self.audio_handler.audio_filename(summary_text)
+            return {field: lambda: (filename, self.audio_handler.content_type, self.audio_handler.iter_file(path))}
+        
+        asset_key = f"{method}:{self.audio_handler.content_key(summary_text)}"
+        result = self.send_cached_media(chat_id, method, field, asset_key, data, upload=prepare_upload)
+        if result and result.get("ok"):
+            return True
+        logger.error(f"❌ Failed to send audio: {result}")
+        return False
     
-    def send_audio(self, chat_id: int, audio_path: str):
-        """Send an audio file to a chat"""
-        url = f"{self.base_url}/sendAudio"
+    def send_cached_media(self, chat_id: int, method: str, field: str, asset_key: str, data: dict,
+                          source: str = None, upload: Callable[[], dict] = None):
+        """
+        Send media by its cached Telegram file_id, falling back to `source`
+        (URL) or an upload and remembering the file_id Telegram returns.
+        `upload` is only called when the media has to be uploaded, on the
+        calling thread, and returns the `files` of the request.
+        A file_id Telegram rejects is invalidated and the media sent again.
+        """
+        file_id = self.media_cache.get(asset_key)
+        if file_id:
+            result = self._send(chat_id, method, {**data, field: file_id}, wait=True)
+            if not is_invalid_file_id_error(result):
+                return result
+            self.media_cache.invalidate(asset_key, file_id)
+        
+        if upload is not None:
+            result = self._send(chat_id, method, data, files=upload(), wait=True)
+        else:
+            result = self._send(chat_id, method, {**data, field: source}, wait=True)
         
-        try:
-            with open(audio_path, 'rb') as audio_file:
-                files = {'audio': audio_file}
-                data = {
-                    'chat_id': chat_id,
-                    'title': 'Підсумок збігу',
-                    'performer': 'Business Match Bot'
-                }
-                
-                response = requests.post(url, files=files, data=data)
-                
-                if response.status_code == 200:
-                    logger.info(f"✅ Audio sent to chat {chat_id}")
-                    return True
-                else:
-                    logger.error(f"❌ Failed to send audio: {response.status_code} - {response.text}")
-                    return False
-                    
-        except Exception as e:
-            logger.error(f"❌ Error sending audio: {e}")
-            return False
+        file_id = extract_file_id(method, result)
+        if file_id:
+            self.media_cache.store(asset_key, file_id)
+        return result
+    
+    def send_banner(self, chat_id: int):
+        """Send the Business Match image (by file_id after the first upload)"""
+        data = {
+            "chat_id": chat_id,
+            "caption": BUSINESS_MATCH_IMAGE_CAPTION,
+            "parse_mode": "Markdown"
+        }
+        result = self.send_cached_media(chat_id, "sendPhoto", "photo", f"photo:{BUSINESS_MATCH_IMAGE_URL}",
+                                        data, source=BUSINESS_MATCH_IMAGE_URL)
+        if result and result.get("ok"):
+            logger.info(f"✅ Photo sent successfully to chat {chat_id}")
+        else:
+            logger.error(f"❌ Failed to send photo: {result}")
+        return result
     
     def send_typing(self, chat_id: int):
         """Send typing indicator"""
-        url = f"{self.base_url}/sendChatAction"
         data = {
             "chat_id": chat_id,
             "action": "typing"
         }
         
-        try:
-            requests.post(url, json=data)
-        except Exception as e:
-            logger.error(f"Error sending typing: {e}")
+        return self._send(chat_id, "sendChatAction", data)
     
     def get_updates(self):
         """Get new updates from Telegram"""
@@ -249,7 +453,7 @@ class SimpleTelegramBot:
         }
         
         try:
-            response = requests.get(url, params=params, timeout=35)
+            response = self.http.get(url, params=params, timeout=35)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -280,27 +484,10 @@ class SimpleTelegramBot:
         
         # Send Business Match image first
         logger.info(f"📸 Attempting to send Business Match image to chat {chat_id}")
-        # Use your Business Match image from Postimage
-        business_match_image_url = "https://i.postimg.cc/mtFChPhV/ChatGPT-Image-15-вер-2025-р-18-52-13.png"
-        logger.info(f"Using Business Match image URL: {business_match_image_url}")
-        self.send_photo(chat_id, business_match_image_url, caption="🚀 Business Match - Ваш асистент з нетворкінгу")
+        self.send_banner(chat_id)
         
         # Use the new greeting message directly
-        message = """Вітаємо у Business Match 🚀
-Я — ваш асистент зі структурованого нетворкінгу. У нашій базі понад 50 000+ перевірених професіоналів, відкритих до співпраці. Допоможу швидко знайти релевантних партнерів та можливості для розвитку бізнесу 📈
-
-🤝 Як це працює:
-Опишіть, кого шукаєте: галузь, роль, рівень, географія, формат співпраці.
-
-📌 Приклади запитів:
-• «Шукаю маркетологів для IT-стартапу»
-• «Потрібні інвестори для e-commerce проєкту»
-• «Хочу зустрітися з підприємцями у сфері охорони здоров'я»
-• «Шукаю ментора з digital-маркетингу»
-
-Я зіставлю ваш запит із базою та надам короткий список релевантних контактів із обґрунтуванням ✅"""
-        
-        self.send_message(chat_id, message)
+        self.send_message(chat_id, START_MESSAGE)
     
     def handle_text_message(self, chat_id: int, user_id: int, text: str):
         """Handle text messages"""
@@ -315,12 +502,7 @@ class SimpleTelegramBot:
         
         if not can_search:
             logger.info(f"🚫 Blocking user {user_id} due to 24h limit")
-            limit_message = (f"⏰ **Ліміт пошуку!**\n\n"
-                f"Ви вже зробили пошук менше ніж 24 години тому.\n"
-                f"**Доступно через:** {remaining_time}\n\n"
-                f"🚀 **Для необмеженого доступу встановіть додаток Business Match:**\n\n"
-                f"📱 [Business Match App](https://apps.apple.com/ua/app/business-match-social-app/id1547614364)\n\n"
-                f"✨ Там ви зможете робити необмежену кількість пошуків та знайти всіх експертів!")
+            limit_message = format_limit_message(remaining_time)
             
             self.send_message(chat_id, limit_message)
             self.log_message(user_id, limit_message, True, "text")
@@ -328,147 +510,90 @@ class SimpleTelegramBot:
         
         chatgpt_handler = self.get_user_session(user_id)
         
-        # Check if this is a search query or other message
-        is_search_query = self._is_search_query(text)
+        # Search, chitchat or unclear - one classification decides the path
+        intent = classify(text)
         
-        if not is_search_query:
-            # Handle non-search messages with ChatGPT
+        if intent.label == UNCLEAR:
+            logger.info(f"❓ Unclear message from user {user_id}")
+            self.send_message(chat_id, UNCLEAR_QUERY_MESSAGE)
+            return
+        
+        if intent.label == CHITCHAT:
+            # Canned reply for known chitchat, ChatGPT otherwise
             logger.info(f"💬 Handling non-search message from user {user_id}")
-            response = chatgpt_handler.handle_non_search_message(text)
+            response = chatgpt_handler.handle_non_search_message(text, intent)
             self.send_message(chat_id, response)
             return
         
         # This is a search query - use custom model
         logger.info(f"🔍 Handling search query from user {user_id}")
         
-        # Send typing indicator
-        self.send_typing(chat_id)
-        
-        # Send progress messages with delays
-        self.send_message(chat_id, "📥 **Отримання інформації...**")
-        import time
-        time.sleep(3)
-        
-        self.send_message(chat_id, "🤖 **Обробка інформації за допомогою AI...**")
-        time.sleep(3)
-        
-        self.send_message(chat_id, "🔍 **Пошук користувачів, які підходять під ваш запит...**")
-        time.sleep(3)
+        # Reserve the search up front so concurrent workers cannot both use the last one
+        can_search, remaining_time = self.reserve_search(user_id)
+        if not can_search:
+            logger.info(f"🚫 Blocking user {user_id} due to 24h limit")
+            limit_message = format_limit_message(remaining_time)
+            self.send_message(chat_id, limit_message)
+            self.log_message(user_id, limit_message, True, "text")
+            return
         
-        self.send_message(chat_id, "⏳ **Детальний аналіз збігів... (це може зайняти до 2 хвилин)**")
+        # Show progress on a single message edited while the model runs
+        progress = ProgressReporter(
+            send=lambda progress_text: self.send_message(chat_id, progress_text, wait=True),
+            edit=lambda message_id, progress_text: self.edit_message_text(chat_id, message_id, progress_text),
+            steps=PROGRESS_STEPS,
+            interval=PROGRESS_STEP_DELAY
+        )
         
         # Get matches from custom model with error handling
         logger.info(f"🔄 Calling custom model for user {user_id}...")
         try:
-            matches_response = chatgpt_handler.analyze_user_preferences(text)
+            with progress:
+                matches_response = chatgpt_handler.analyze_user_preferences(text)
             logger.info(f"✅ Custom model response received for user {user_id}")
         except Exception as e:
             logger.error(f"❌ Error calling custom model for user {user_id}: {e}")
-            self.send_message(chat_id, 
-                "😔 **Виникла помилка при обробці запиту.**\n\n"
-                "Спробуйте ще раз або зверніться до підтримки."
-            )
+            self.refund_search(user_id)
+            self.send_message(chat_id, SEARCH_ERROR_MESSAGE)
             return
         
-        # Check if query is unclear
-        if matches_response == "unclear_query":
-            self.send_message(chat_id,
-                "🤔 **Ваш запит не зовсім зрозумілий.**\n\n"
-                "Будь ласка, сформулюйте точніше, яких бізнес-професіоналів ви шукаєте.\n\n"
-                "**Приклади чітких запитів:**\n"
-                "• «Шукаю фахівців із маркетингу для IT-стартапу»\n"
-                "• «Потрібні інвестори для e-commerce проєкту»\n"
-                "• «Хочу зустрітися з підприємцями у сфері охорони здоров'я»\n"
-                "• «Шукаю менторів із digital-маркетингу»"
-            )
-            return
-        
-        try:
-            # Try to parse JSON response
-            import json
-            logger.info(f"🔍 Attempting to parse JSON response: {matches_response[:200]}...")
-            match_data = json.loads(matches_response)
-            logger.info(f"✅ Successfully parsed JSON for user {user_id}")
-            
-            # Send structured match information
-            match_message = f"💼 **Знайдений експерт: {match_data['name']}**\n"
-            match_message += f"🧮 **Збіг - {match_data.get('match_percentage', '85')}%**\n\n"
-            
-            match_message += f"📋 **Про експерта:**\n{match_data['description']}\n\n"
-            
-            # Add contact information if available
-            if match_data.get('contact_info') and match_data['contact_info'] != 'Не вказано':
-                match_message += f"📞 **Контактна інформація:** {match_data['contact_info']}\n\n"
-            
-            match_message += f"✨ **Чому корисний для вас:** {match_data['reason']}"
-            
-            self.send_message(chat_id, match_message)
-            logger.info(f"✅ Sent match result to user {user_id}")
-                
-        except (json.JSONDecodeError, KeyError) as e:
-            # Fallback to direct text format
-            logger.info(f"📝 Using direct text format for user {user_id}")
-            self.send_message(chat_id, matches_response)
-            logger.info(f"✅ Sent match result (text format) to user {user_id}")
+        self.send_message(chat_id, format_match_message(matches_response))
+        logger.info(f"✅ Sent match result to user {user_id}")
         
         # Log the search and result
         self.log_search(user_id, text, matches_response)
         
-        # Only update search time and send follow-up messages if we successfully sent a match
-        # Update last search time (24h limit)
-        self.user_last_search_time[user_id] = datetime.now()
-        logger.info(f"⏰ Updated search time for user {user_id}")
+        # The search reserved above is only kept because a match was sent
+        logger.info(f"⏰ Search quota used for user {user_id}")
         
         # Send combined 24h limit and app promotion message
         logger.info(f"📱 Sending combined message to user {user_id}")
-        combined_message = "Дякую, що скористались ботом. Ви маєте можливість робити один такий запит раз на 24 години.\n\n💡 Для доступу до більшої бази професіоналів та повного функціоналу встановіть додаток Business Match!\n\n📱 [Встановити Business Match](https://apps.apple.com/ua/app/business-match-social-app/id1547614364)"
-        self.send_message(chat_id, combined_message)
-        self.log_message(user_id, combined_message, True, "text")
+        self.send_message(chat_id, FOLLOW_UP_MESSAGE)
+        self.log_message(user_id, FOLLOW_UP_MESSAGE, True, "text")
         logger.info(f"✅ Sent combined message to user {user_id}")
         
-        # Generate and send audio summary
-        try:
-            logger.info(f"🎵 Generating audio summary for user {user_id}")
-            audio_path = self.audio_handler.generate_audio_summary(matches_response, text)
-            if audio_path:
-                logger.info(f"🎵 Sending audio summary to user {user_id}")
-                if self.send_audio(chat_id, audio_path):
-                    logger.info(f"✅ Audio summary sent to user {user_id}")
-                else:
-                    logger.error(f"❌ Failed to send audio summary to user {user_id}")
-                # Clean up audio file
-                self.audio_handler.cleanup_audio_file(audio_path)
-            else:
-                logger.error(f"❌ Failed to generate audio summary for user {user_id}")
-        except Exception as e:
-            logger.error(f"❌ Error with audio summary for user {user_id}: {e}")
+        # Audio summary is generated in the background and sent when ready
+        job_id = self.audio_jobs.submit(self.deliver_audio_summary, chat_id, user_id, matches_response, text)
+        if job_id is not None:
+            logger.info(f"🎵 Queued audio summary job {job_id} for user {user_id}")
+    
+    def deliver_audio_summary(self, chat_id: int, user_id: int, matches_response: str, text: str):
+        """
+        Background job: create the audio summary text and send its audio to the chat.
+        Raises if it could not be sent, so the job queue retries it and marks it failed.
+        """
+        started = time.monotonic()
+        logger.info(f"🎵 Generating audio summary for user {user_id}")
+        summary_text = self.audio_handler.create_summary(matches_response, text)
+        
+        if not self.send_summary_audio(chat_id, summary_text):
+            raise RuntimeError(f"audio summary for user {user_id} was not sent")
+        self.audio_handler.record_time_to_audio(time.monotonic() - started)
+        logger.info(f"✅ Audio summary sent to user {user_id}")
     
     def handle_help_command(self, chat_id: int):
         """Handle /help command"""
-        help_text = """
-*🤖 Допомога Business Match Bot*
-
-*Команди:*
-/start - Почати роботу з ботом та отримати інструкції
-/help - Показати це повідомлення допомоги
-/cancel - Скасувати поточну розмову
-
-*Як знайти бізнес-зв'язки:*
-Просто напишіть, що ви шукаєте! Наприклад:
-• "Шукаю експертів з маркетингу в IT-стартапах"
-• "Потрібні інвестори для мого e-commerce бізнесу"
-• "Хочу зустрітися з підприємцями в сфері охорони здоров'я"
-
-Бот проаналізує нашу базу з 500+ професіоналів і надасть вам топ-3 найкращих збігів з детальними поясненнями!
-
-*Функції:*
-✅ AI-збіги за допомогою ChatGPT
-✅ 500+ бізнес-професіоналів у базі даних
-✅ Детальний аналіз сумісності
-✅ Контактна інформація та посилання на соцмережі
-✅ Обробка природної мови
-"""
-        self.send_message(chat_id, help_text)
+        self.send_message(chat_id, HELP_TEXT)
     
     def process_update(self, update):
         """Process a single update"""
@@ -491,7 +616,7 @@ class SimpleTelegramBot:
             elif text.startswith("/help"):
                 self.handle_help_command(chat_id)
             elif text.startswith("/cancel"):
-                self.send_message(chat_id, "✅ Розмову скасовано. Використовуйте /start для початку нового пошуку!")
+                self.send_message(chat_id, CANCEL_MESSAGE)
             else:
                 # Handle regular text messages
                 if text.strip():
@@ -500,6 +625,68 @@ class SimpleTelegramBot:
         except Exception as e:
             logger.error(f"Error processing update: {e}")
     
+    def accept_update(self, update: dict, timeout: float = None) -> bool:
+        """
+        Deduplicate an incoming update (polling or webhook) and hand it to the dispatcher.
+        Returns False if the dispatcher queue stayed full for `timeout` seconds.
+        """
+        update_id = update["update_id"]
+        
+        # Skip if we already processed this update
+        if not self.processed_updates.add(update_id):
+            logger.info(f"🛡️ Skipping duplicate update {update_id}")
+            return True
+        
+        self.offset_tracker.begin(update)
+        
+        # Hand off to the worker pool (blocks when the dispatcher queue is full - backpressure)
+        if not self.dispatcher.submit(update, timeout=timeout):
+            self.offset_tracker.cancel(update_id)
+            self.processed_updates.discard(update_id)
+            return False
+        return True
+    
+    def _on_update_complete(self, update: dict):
+        """Commit the update offset once an update has been handled"""
+        self.offset_tracker.complete(update["update_id"])
+    
+    def _replay_pending_updates(self):
+        """Re-queue updates a previous process accepted but never finished"""
+        pending = self.offset_tracker.load_pending()
+        if pending:
+            logger.info(f"♻️ Replaying {len(pending)} unfinished updates from the previous run")
+        for update in pending:
+            self.processed_updates.add(update["update_id"])
+            self.dispatcher.submit(update)
+        self.last_update_id = self.offset_tracker.resume_offset
+    
+    def set_webhook(self) -> bool:
+        """Register the webhook URL with Telegram"""
+        data = {
+            "url": f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            "allowed_updates": ["message"],
+            "secret_token": WEBHOOK_SECRET_TOKEN
+        }
+        
+        try:
+            response = self.http.post(f"{self.base_url}/setWebhook", json=data, timeout=10)
+            result = response.json()
+            if result.get("ok"):
+                logger.info(f"🔗 Webhook set to {data['url']}")
+                return True
+            logger.error(f"❌ Failed to set webhook: {result}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Error setting webhook: {e}")
+            return False
+    
+    def delete_webhook(self):
+        """Remove any registered webhook so getUpdates polling works"""
+        try:
+            self.http.post(f"{self.base_url}/deleteWebhook", timeout=10)
+        except Exception as e:
+            logger.error(f"Error deleting webhook: {e}")
+    
     def run(self):
         """Main bot loop"""
         logger.info("🤖 Starting Business Match Telegram Bot...")
@@ -509,7 +696,7 @@ class SimpleTelegramBot:
         # Get bot info
         try:
             url = f"{self.base_url}/getMe"
-            response = requests.get(url)
+            response = self.http.get(url, timeout=10)
             bot_info = response.json()
             if bot_info.get("ok"):
                 bot_name = bot_info["result"]["first_name"]
@@ -522,8 +709,53 @@ class SimpleTelegramBot:
             logger.error(f"❌ Error connecting to Telegram: {e}")
             return
         
-        logger.info("🔄 Starting polling for messages...")
         logger.info("🛡️ Duplicate message protection enabled")
+        self.dispatcher.start()
+        self._replay_pending_updates()
+        logger.info(f"📍 Resuming after update {self.last_update_id}")
+        
+        try:
+            if UPDATE_MODE == "webhook":
+                self.run_webhook()
+            else:
+                self.run_polling()
+        finally:
+            # Cleanup on exit
+            self.dispatcher.shutdown()
+            self.audio_jobs.shutdown()
+            self.outbound.shutdown()
+            self.data_handler.close()
+            self._cleanup_lock()
+    
+    def run_webhook(self):
+        """Receive updates through the webhook HTTP endpoint"""
+        from werkzeug.serving import make_server
+        from webhook_server import create_webhook_app
+        
+        if not WEBHOOK_URL:
+            logger.error("❌ WEBHOOK_URL is not set - cannot start webhook mode")
+            return
+        if not WEBHOOK_SECRET_TOKEN:
+            logger.error("❌ WEBHOOK_SECRET_TOKEN is not set - refusing to accept unauthenticated webhook updates")
+            return
+        if not self.set_webhook():
+            return
+        
+        server = make_server(WEBHOOK_HOST, WEBHOOK_PORT, create_webhook_app(self), threaded=True)
+        logger.info(f"🌐 Listening for webhook updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("🛑 Bot stopped by user")
+        finally:
+            server.server_close()
+    
+    def run_polling(self):
+        """Receive updates through getUpdates long polling"""
+        self.delete_webhook()
+        logger.info("🔄 Starting polling for messages...")
+        last_stats_time = time.monotonic()
         
         while True:
             try:
@@ -539,21 +771,24 @@ class SimpleTelegramBot:
                 
                 # Process each update
                 for update in updates:
-                    update_id = update["update_id"]
-                    
-                    # Skip if we already processed this update
-                    if update_id in self.processed_updates:
-                        logger.info(f"🛡️ Skipping duplicate update {update_id}")
-                        self.last_update_id = update_id
-                        continue
-                    
-                    # Mark as processed and process
-                    self.processed_updates.add(update_id)
-                    self.last_update_id = update_id
-                    self.process_update(update)
+                    self.last_update_id = update["update_id"]
+                    self.accept_update(update)
                 
-                # Small delay to avoid overwhelming the API
-                time.sleep(1)
+                if time.monotonic() - last_stats_time >= DISPATCHER_STATS_INTERVAL:
+                    logger.info(f"📊 Dispatcher stats: {self.dispatcher.get_stats()}")
+                    logger.info(f"📤 Outbound queue stats: {self.outbound.get_stats()}")
+                    logger.info(f"🔌 HTTP stats: {self.http.get_stats()}")
+                    logger.info(f"👥 Session stats: {self.user_sessions.get_stats()}")
+                    logger.info(f"🎵 Audio job stats: {self.audio_jobs.get_stats()}")
+                    logger.info(f"💾 Audio stats: {self.audio_handler.get_stats()}")
+                    logger.info(f"🖼️ Media cache stats: {self.media_cache.get_stats()}")
+                    logger.info(f"📚 Profile stats: {self.data_handler.get_stats()}")
+                    logger.info(f"🧩 Prompt context stats: {matching_packer.get_stats()}")
+                    logger.info(f"💬 Canned reply stats: {get_reply_cache().get_stats()}")
+                    if self.chatgpt_handler.query_cache is not None:
+                        logger.info(f"🗃️ Search cache stats: {self.chatgpt_handler.query_cache.get_stats()}")
+                    logger.info(f"🔗 Search coalescing stats: {search_flights.get_stats()}")
+                    last_stats_time = time.monotonic()
                 
             except KeyboardInterrupt:
                 logger.info("🛑 Bot stopped by user")
@@ -561,9 +796,6 @@ class SimpleTelegramBot:
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
                 time.sleep(5)
-        
-        # Cleanup on exit
-        self._cleanup_lock()
 
 def main():
     """Start the bot"""
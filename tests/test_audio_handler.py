@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+
+from audio_cache import AudioCache, CacheWriter
+from audio_handler import AudioHandler
+
+
+def _handler():
+    # The memo key and field extraction need no API clients or cache directory
+    return AudioHandler.__new__(AudioHandler)
+
+
+def _match(name, reason):
+    return json.dumps({"name": name, "match_percentage": 90, "description": f"Про {name}",
+                       "reason": reason}, ensure_ascii=False)
+
+
+def test_different_matches_get_different_memo_keys():
+    handler = _handler()
+    olena = _match("Олена", "Маркетинг для стартапів")
+    taras = _match("Тарас", "Інвестиції у нерухомість")
+    assert handler._summary_memo_key(olena, "маркетолог") != handler._summary_memo_key(taras, "маркетолог")
+
+
+def test_memo_key_depends_on_query():
+    handler = _handler()
+    olena = _match("Олена", "Маркетинг для стартапів")
+    assert handler._summary_memo_key(olena, "маркетолог") != handler._summary_memo_key(olena, "дизайнер")
+    assert handler._summary_memo_key(olena, "маркетолог") == handler._summary_memo_key(olena, "маркетолог")
+
+
+def test_non_json_match_is_keyed_by_whole_text():
+    handler = _handler()
+    assert handler._summary_memo_key("Експерт А", "q") != handler._summary_memo_key("Експерт Б", "q")
+
+
+def test_fields_are_extracted_from_json_match():
+    fields = _handler()._extract_match_fields(_match("Олена", "Маркетинг"))
+    assert fields == ("Олена", "90%", "Про Олена", "Маркетинг")
+
+
+class _StreamResponse:
+    status = 200
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.content = self
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Session:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        return _StreamResponse(self.chunks)
+
+
+def _streaming_handler(tmp_path, monkeypatch, loop_thread):
+    from collections import deque
+
+    handler = _handler()
+    handler.api_key = "key"
+    handler.base_url = "https://tts.invalid"
+    handler.voice_id, handler.model_id = "voice", "model"
+    handler.voice_settings = {}
+    handler.audio_format, handler.extension, handler.content_type = "mp3", "mp3", "audio/mpeg"
+    handler.audio_cache = AudioCache(str(tmp_path))
+    handler._metrics_lock = threading.Lock()
+    handler._first_byte_times = deque()
+
+    # Cache writes must not run on the event loop thread
+    write = CacheWriter.write
+
+    def checked_write(self, chunk):
+        assert threading.get_ident() != loop_thread[0]
+        write(self, chunk)
+
+    monkeypatch.setattr(CacheWriter, "write", checked_write)
+    return handler
+
+
+def test_streamed_audio_is_cached_off_the_event_loop(tmp_path, monkeypatch):
+    loop_thread = [None]
+    handler = _streaming_handler(tmp_path, monkeypatch, loop_thread)
+    session = _Session([b"ab", b"cd", b"ef"])
+
+    async def collect():
+        loop_thread[0] = threading.get_ident()
+        return [chunk async for chunk in handler.stream_audio_async("текст", session)]
+
+    assert asyncio.run(collect()) == [b"ab", b"cd", b"ef"]
+    # The second request is served from the cache
+    assert b"".join(asyncio.run(collect())) == b"abcdef"
+    assert session.posts == 1
@@ -0,0 +1,21 @@
+from types import SimpleNamespace
+
+import job_queue
+from job_queue import FAILED, JobQueue
+from telegram_bot_simple import SimpleTelegramBot
+
+
+def test_unsent_audio_summary_is_retried_then_failed(monkeypatch):
+    monkeypatch.setattr(job_queue, "backoff_delay", lambda attempt: 0)
+    attempts = []
+    bot = SimpleNamespace(
+        audio_handler=SimpleNamespace(create_summary=lambda matches, text: "summary"),
+        send_summary_audio=lambda chat_id, summary_text: attempts.append(chat_id) or False,
+    )
+    jobs = JobQueue("audio", workers=1, max_retries=2)
+
+    job_id = jobs.submit(SimpleTelegramBot.deliver_audio_summary, bot, 1, 2, "{}", "query")
+    jobs.shutdown()
+
+    assert len(attempts) == 3
+    assert jobs.get_status(job_id)["status"] == FAILED
@@ -0,0 +1,29 @@
+from bm25_index import BM25Index
+from data_handler import USER_COLUMNS, UserRecord
+
+
+def _record(**values):
+    fields = {field: "" for field in USER_COLUMNS}
+    fields.update(values)
+    return UserRecord(**fields)
+
+
+RECORDS = [
+    _record(name="Reviewed", reviews="Great marketing advice, recommended"),
+    _record(name="Marketer", business_sector="Marketing"),
+    _record(name="Lawyer", business_sector="Legal", self_description="Contracts and compliance"),
+]
+
+
+def test_sector_hit_outranks_the_same_term_in_reviews():
+    ranking = BM25Index(RECORDS).search("marketing", k=5)
+    assert [doc_id for doc_id, _ in ranking] == [1, 0]
+    assert ranking[0][1] > ranking[1][1]
+
+
+def test_queries_without_indexed_terms_return_nothing():
+    index = BM25Index(RECORDS)
+    assert index.search("") == []
+    assert index.search("шукаю людину для") == []
+    assert index.search("the and of") == []
+    assert index.search("marketing", k=0) == []
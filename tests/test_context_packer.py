@@ -0,0 +1,59 @@
+from context_packer import (DATABASE_FORMAT, FIELD_LIMITS, MATCHING_FORMAT, ContextPacker, count_tokens)
+from data_handler import USER_COLUMNS, ProfileSnapshot, UserRecord
+
+
+def _record(**values):
+    fields = {field: "" for field in USER_COLUMNS}
+    fields.update(values)
+    return UserRecord(**fields)
+
+
+def _snapshot(records):
+    return ProfileSnapshot(1, "digest", None, tuple(records), {})
+
+
+LONG = _record(name="Long", business_sector="Consulting", achievements="Built companies " * 30,
+               companies="Acme " * 30)
+SHORT = _record(name="Short", business_sector="Design")
+
+
+def test_candidate_over_budget_is_skipped_for_a_shorter_one():
+    packer = ContextPacker(MATCHING_FORMAT)
+    snapshot = _snapshot([LONG, SHORT])
+    short_only = packer.pack(snapshot, [1]).tokens
+
+    packed = packer.pack(snapshot, [0, 1], token_budget=short_only + 50)
+    assert packed.doc_ids == [1]
+    assert packed.skipped == 1
+    assert "Short" in packed.text and "Long" not in packed.text
+
+
+def test_reviews_are_cut_to_their_limit():
+    reviews = "Reliable partner who always delivers on time and communicates clearly " * 5
+    packed = ContextPacker(DATABASE_FORMAT).pack(_snapshot([_record(name="R", reviews=reviews)]), [0])
+
+    line = next(line for line in packed.text.splitlines() if line.startswith("Reviews: "))
+    value = line[len("Reviews: "):]
+    assert value.endswith("…")
+    assert len(value) <= FIELD_LIMITS['reviews'] + 1
+
+
+def test_repeat_candidates_hit_the_snippet_cache():
+    packer = ContextPacker(MATCHING_FORMAT)
+    snapshot = _snapshot([LONG, SHORT])
+
+    first = packer.pack(snapshot, [0, 1])
+    assert packer.get_stats()['snippet_hit_rate'] == 0.0
+    second = packer.pack(snapshot, [0, 1])
+    assert second.text == first.text
+    assert packer.get_stats()['snippet_hit_rate'] == 0.5
+
+
+def test_tokens_never_exceed_the_budget():
+    records = [LONG, SHORT] * 10
+    snapshot = _snapshot(records)
+    packer = ContextPacker(MATCHING_FORMAT)
+    for budget in (30, 60, 100, 200, 400, 800, 2000):
+        packed = packer.pack(snapshot, range(len(records)), token_budget=budget)
+        assert packed.tokens <= budget
+        assert count_tokens(packed.text) <= budget
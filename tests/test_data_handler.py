@@ -0,0 +1,33 @@
+import os
+import shutil
+
+from data_handler import DataHandler
+
+USERS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "users.csv")
+
+
+def _touch_changed(path):
+    with open(path, "ab") as f:
+        f.write(b"\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_worker_waits_for_the_compiled_store(tmp_path):
+    csv_path = str(tmp_path / "users.csv")
+    store_path = str(tmp_path / "profiles.store")
+    shutil.copy(USERS_CSV, csv_path)
+
+    supervisor = DataHandler(csv_path, store_path=store_path)
+    worker = DataHandler(csv_path, store_path=store_path, compile_store=False)
+    assert worker.snapshot()._df is None  # Loaded from the store the supervisor wrote
+
+    _touch_changed(csv_path)
+    stored_at = os.stat(store_path).st_mtime_ns
+    assert not worker.reload()
+    assert os.stat(store_path).st_mtime_ns == stored_at  # The worker never compiles
+
+    assert supervisor.reload()
+    assert worker.reload()
+    assert worker.snapshot().digest == supervisor.snapshot().digest
+    assert worker.snapshot()._df is None
@@ -0,0 +1,79 @@
+import os
+import shutil
+
+import numpy as np
+
+from data_handler import USER_COLUMNS, DataHandler, UserRecord
+from embedding_index import (EMBEDDING_INDEX, EmbeddingStore, HashingEmbedder, build_embedding_index,
+                             profile_text)
+
+USERS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "users.csv")
+
+
+def _record(**values):
+    fields = {field: "" for field in USER_COLUMNS}
+    fields.update(values)
+    return UserRecord(**fields)
+
+
+RECORDS = [
+    _record(name="A", business_sector="Marketing", self_description="Brand strategy and social media campaigns"),
+    _record(name="B", business_sector="Legal", self_description="Corporate lawyer for startups and contracts"),
+    _record(name="C", business_sector="Finance", self_description="Investment banking and venture capital deals"),
+]
+
+
+class _CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=256)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_near_identical_profile_ranks_first(tmp_path):
+    index = build_embedding_index(RECORDS, HashingEmbedder(), EmbeddingStore(str(tmp_path)))
+
+    ranking = index.search("Corporate lawyer for startups, contracts", k=2)
+    assert ranking[0][0] == 1
+    assert len(ranking) == 2
+    assert ranking[0][1] > ranking[1][1]
+
+
+def test_stored_matrix_is_memory_mapped_not_recomputed(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    build_embedding_index(RECORDS, HashingEmbedder(dim=256), store)
+
+    embedder = _CountingEmbedder()
+    index = build_embedding_index(RECORDS, embedder, store)
+    assert embedder.embedded == []
+    assert isinstance(index.matrix, np.memmap)
+
+
+def test_changed_profiles_force_a_rebuild(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    first = build_embedding_index(RECORDS, HashingEmbedder(dim=256), store)
+
+    changed = RECORDS[:2] + [_record(name="C", business_sector="Design", self_description="Product designer")]
+    embedder = _CountingEmbedder()
+    index = build_embedding_index(changed, embedder, store)
+    assert index.dataset_key != first.dataset_key
+    # Unchanged profiles keep their stored vectors
+    assert embedder.embedded == [profile_text(changed[2])]
+    assert index.search("product designer", k=1)[0][0] == 2
+
+
+def test_failed_embedding_leaves_the_index_out(tmp_path):
+    class _Down(HashingEmbedder):
+        def embed(self, texts):
+            raise ConnectionError("embeddings API down")
+
+    csv_path = str(tmp_path / "users.csv")
+    shutil.copy(USERS_CSV, csv_path)
+    data_handler = DataHandler(csv_path)
+    builder = lambda records: build_embedding_index(records, _Down(), EmbeddingStore(str(tmp_path / "emb")))
+
+    assert not data_handler.register_index(EMBEDDING_INDEX, builder, optional=True)
+    assert EMBEDDING_INDEX not in data_handler.snapshot().indexes
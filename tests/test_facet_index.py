@@ -0,0 +1,24 @@
+from data_handler import USER_COLUMNS, UserRecord
+from facet_index import FacetIndex
+
+
+def _record(location, open_to=""):
+    values = dict.fromkeys(USER_COLUMNS, "")
+    values.update(name="Test", location=location, open_to=open_to)
+    return UserRecord(*(values[column] for column in USER_COLUMNS))
+
+
+def _index():
+    return FacetIndex([_record("Kyiv, Ukraine"), _record("Lviv, Ukraine"), _record("Warsaw, Poland")])
+
+
+def test_place_is_matched():
+    assert _index().match_query("Шукаю інвестора з Києва") == {'city': ['kyiv']}
+    assert _index().match_query("lawyer in Warsaw")['city'] == ['warsaw']
+
+
+def test_negated_place_is_not_matched():
+    index = _index()
+    assert 'city' not in index.match_query("Шукаю інвестора, але не з Києва")
+    assert 'city' not in index.match_query("developer, not in Kyiv")
+    assert index.match_query("не з Києва, а зі Львова")['city'] == ['lviv']
@@ -0,0 +1,23 @@
+import pytest
+
+from intent_classifier import CHITCHAT, LABELLED_EXAMPLES, SEARCH, UNCLEAR, classify
+
+
+@pytest.mark.parametrize("text, label, kind", LABELLED_EXAMPLES)
+def test_labelled_examples(text, label, kind):
+    assert classify(text) == (label, kind)
+
+
+@pytest.mark.parametrize("text", ["PR", "IT", "HR", "Need a PR manager", "шукаю HR-а"])
+def test_uppercase_acronyms_are_searches(text):
+    assert classify(text).label == SEARCH
+
+
+@pytest.mark.parametrize("text, label", [
+    ("does it work", CHITCHAT),   # English "it" is not IT
+    ("hr", UNCLEAR),
+    ("PRIVATE", UNCLEAR),         # Acronyms only match as whole words
+    ("ITALY", UNCLEAR),
+])
+def test_acronyms_need_capitals_and_a_word_boundary(text, label):
+    assert classify(text).label == label
@@ -0,0 +1,21 @@
+from media_cache import is_invalid_file_id_error
+
+
+def _error(description, code=400):
+    return {"ok": False, "error_code": code, "description": description}
+
+
+def test_rejected_file_ids_are_recognised():
+    assert is_invalid_file_id_error(_error("Bad Request: wrong file identifier/HTTP URL specified"))
+    assert is_invalid_file_id_error(_error("Bad Request: wrong remote file identifier specified: "
+                                           "Wrong string length"))
+    assert is_invalid_file_id_error(_error("Bad Request: invalid file_id"))
+
+
+def test_other_errors_keep_the_file_id():
+    assert not is_invalid_file_id_error(_error("Bad Request: can't parse entities: "
+                                               "Can't find end of the entity starting at byte offset 12"))
+    assert not is_invalid_file_id_error(_error("Bad Request: chat not found"))
+    assert not is_invalid_file_id_error(_error("Forbidden: bot was blocked by the user", 403))
+    assert not is_invalid_file_id_error({"ok": True, "result": {}})
+    assert not is_invalid_file_id_error(None)
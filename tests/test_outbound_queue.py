@@ -0,0 +1,20 @@
+from outbound_queue import OutboundSender
+
+
+def test_rate_limited_request_fails_after_max_retries():
+    calls = []
+
+    def api_call(method, data, files):
+        calls.append(method)
+        return {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}}
+
+    sender = OutboundSender(api_call, workers=1, global_rate=1000, chat_rate=1000, chat_burst=1000, max_retries=2)
+    try:
+        result = sender.submit(1, "sendMessage", {"text": "hi"}).result(timeout=5)
+        assert result["error_code"] == 429
+        assert len(calls) == 3
+
+        # The chat's queue is free again
+        assert sender.submit(1, "sendMessage", {"text": "again"}).result(timeout=5)["error_code"] == 429
+    finally:
+        sender.shutdown(wait=False)
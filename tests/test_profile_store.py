@@ -0,0 +1,27 @@
+import facet_index
+import profile_store
+from data_handler import USER_COLUMNS, UserRecord
+
+
+def _records():
+    values = {field: "" for field in USER_COLUMNS}
+    values.update(name="Оксана", location="Vinnytsia, Ukraine", open_to="🤝 Partnership")
+    return [UserRecord(**values)]
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "profiles.bin")
+    profile_store.write_store(path, "digest", _records())
+
+    records = profile_store.load_store(path, "digest")
+    assert list(records) == _records()
+    assert records.facet_members["city"][0][:2] == ("vinnytsia", "Vinnytsia")
+    assert profile_store.load_store(path, "other digest") is None
+
+
+def test_store_with_other_facet_definitions_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles.bin")
+    profile_store.write_store(path, "digest", _records())
+
+    monkeypatch.setattr(facet_index, "FACET_NORMALIZER_VERSION", facet_index.FACET_NORMALIZER_VERSION + 1)
+    assert profile_store.load_store(path, "digest") is None
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+from progress_reporter import AsyncProgressReporter, ProgressReporter
+
+
+def test_work_starts_before_the_first_step_is_sent():
+    release = threading.Event()
+    sent = []
+
+    def send(text):
+        release.wait(5)
+        sent.append(text)
+        return {"ok": True, "result": {"message_id": 7}}
+
+    progress = ProgressReporter(send, lambda message_id, text: sent.append(text), ["one", "two"], interval=60)
+    with progress:
+        # Runs while the first send is still blocked
+        assert sent == []
+        release.set()
+    assert sent == ["one"]
+    assert progress.message_id == 7
+
+
+def test_async_work_starts_before_the_first_step_is_sent():
+    sent = []
+
+    async def send(text):
+        await asyncio.sleep(0.05)
+        sent.append(text)
+        return {"ok": True, "result": {"message_id": 7}}
+
+    async def edit(message_id, text):
+        sent.append(text)
+
+    async def main():
+        async with AsyncProgressReporter(send, edit, ["one", "two"], interval=60):
+            assert sent == []
+            await asyncio.sleep(0.1)
+        return sent
+
+    assert asyncio.run(main()) == ["one"]
+
+
+def test_async_result_ready_at_once_sends_nothing():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+        return {"ok": True, "result": {"message_id": 7}}
+
+    async def main():
+        async with AsyncProgressReporter(send, send, ["one", "two"], interval=60):
+            pass
+
+    asyncio.run(main())
+    assert sent == []
@@ -0,0 +1,31 @@
+import pytest
+
+from query_cache import QueryCache, normalize_query
+
+
+@pytest.mark.parametrize("first, second", [
+    ("I need a designer for my startup", "I am a designer looking for a startup"),
+    ("Шукаю інвестора для стартапу", "Я інвестор, шукаю стартап"),
+    ("Шукаю дизайнера", "Шукають дизайнера"),
+    ("Розробник з Києва", "Розробник не з Києва"),
+    ("Маркетолог без досвіду", "Маркетолог з досвідом"),
+])
+def test_searches_with_different_meaning_get_different_keys(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("шукаю інвестора", "Шукаю інвестора!"),
+    ("Шукаю   ІНВЕСТОРА", "шукаю інвестора."),
+    ("Need a designer, for my startup", "need a designer for my startup"),
+])
+def test_case_punctuation_and_spacing_are_ignored(first, second):
+    assert normalize_query(first) == normalize_query(second)
+
+
+def test_key_includes_dataset_and_prompt_version(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.db"), ttl_seconds=60, max_entries=10)
+    cache.store(cache.lookup("Шукаю інвестора", "data-1", "prompt-1"), "answer")
+    assert cache.lookup("шукаю інвестора!", "data-1", "prompt-1").result == "answer"
+    assert cache.lookup("шукаю інвестора", "data-2", "prompt-1").result is None
+    assert cache.lookup("шукаю інвестора", "data-1", "prompt-2").result is None
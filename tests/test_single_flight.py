@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", fn))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flights.get_stats()['in_flight'] == 0:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["result"] * 8
+    assert flights.get_stats()['shared'] == 7
+
+
+def test_leader_error_reaches_every_waiter():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError("model down")
+
+    errors = []
+
+    def call():
+        try:
+            flights.do("key", fn)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ["model down"] * 4
+    # Nothing is kept, so the next caller runs the call again
+    assert flights.do("key", lambda: "retried") == "retried"
+
+
+def test_waiter_times_out_without_starting_another_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    leader = threading.Thread(target=lambda: flights.do("key", fn))
+    leader.start()
+    while not calls:
+        time.sleep(0.01)
+    with pytest.raises(TimeoutError):
+        flights.do("key", fn, timeout=0.05)
+    release.set()
+    leader.join()
+
+    assert calls == [1]
+    assert flights.get_stats()['timeouts'] == 1
+
+
+def test_async_callers_share_one_call():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fn) for _ in range(8)))
+
+    assert asyncio.run(main()) == ["result"] * 8
+    assert calls == [1]
+
+
+def test_async_leader_error_reaches_every_waiter():
+    flights = AsyncSingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        raise ValueError("model down")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fn) for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(result) for result in results] == ["model down"] * 4
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_async_leader_hands_the_call_to_a_waiter():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("key", fn))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flights.do("key", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await asyncio.wait_for(waiter, 1)
+        assert leader.cancelled()
+        return result
+
+    assert asyncio.run(main()) == "result"
+    assert calls == [1, 1]
@@ -0,0 +1,39 @@
+import pytest
+
+import webhook_server
+
+
+class _Bot:
+    def __init__(self):
+        self.accepted = []
+
+    def accept_update(self, update, timeout=None):
+        self.accepted.append(update)
+        return True
+
+
+def test_no_request_is_valid_without_a_configured_secret(monkeypatch):
+    monkeypatch.setattr(webhook_server, "WEBHOOK_SECRET_TOKEN", None)
+    assert not webhook_server.is_valid_secret_token(None)
+    assert not webhook_server.is_valid_secret_token("anything")
+
+
+def test_app_refuses_to_start_without_a_secret(monkeypatch):
+    monkeypatch.setattr(webhook_server, "WEBHOOK_SECRET_TOKEN", "")
+    with pytest.raises(ValueError):
+        webhook_server.create_webhook_app(_Bot())
+
+
+def test_only_the_matching_header_is_accepted(monkeypatch):
+    monkeypatch.setattr(webhook_server, "WEBHOOK_SECRET_TOKEN", "s3cret")
+    bot = _Bot()
+    client = webhook_server.create_webhook_app(bot).test_client()
+    update = {"update_id": 1, "message": {"text": "hi"}}
+
+    assert client.post(webhook_server.WEBHOOK_PATH, json=update).status_code == 401
+    assert client.post(webhook_server.WEBHOOK_PATH, json=update,
+                       headers={webhook_server.SECRET_TOKEN_HEADER: "wrong"}).status_code == 401
+    assert bot.accepted == []
+    assert client.post(webhook_server.WEBHOOK_PATH, json=update,
+                       headers={webhook_server.SECRET_TOKEN_HEADER: "s3cret"}).status_code == 200
+    assert bot.accepted == [update]
@@ -0,0 +1,165 @@
+"""
+Text analysis shared by the search indexes.
+Ukrainian/English tokenization, stop words and light suffix stemming,
+plus a small Ukrainian -> English crosswalk: profiles list their sectors
+in English while most queries are written in Ukrainian.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*(?:-[^\W_]+)*")
+_APOSTROPHES = str.maketrans({"ʼ": "'", "’": "'", "`": "'"})
+
+# Tokens shorter than this are dropped ("IT", "AI", "HR" are kept)
+MIN_TOKEN_LENGTH = 2
+
+STOP_WORDS = frozenset("""
+    і й та а але або чи не ні що це як так теж також ще вже
+    в у з із зі до для на по від при про без через над під між за
+    я ти ми ви він вона воно вони мене мені мною нам нас вам вас їх його її
+    мій моя моє мої наш наша наше наші свій своя свої
+    який яка яке які хто кого кому чий де коли
+    шукаю шукаємо шукати потрібен потрібна потрібне потрібні потрібно треба
+    знайти хочу хочемо можна може людина людину людей когось
+    a an the and or but not of for to in on at by with from about as
+    i me my we our you your he she they them who whom which that this
+    is are was be been am need needs looking look find want someone
+""".split())
+
+UKRAINIAN_SUFFIXES = sorted("""
+    ами ями ові еві ого ому ими іми ості ість ння
+    ах ях ам ям ом ем ою ею ів їв ій ий ої ні ти
+    а я о е у ю і и ь ї
+""".split(), key=len, reverse=True)
+
+# Shortest stem a suffix may be stripped down to
+MIN_STEM_LENGTH = 4
+
+# Ukrainian stem prefix -> English words used in the profile data
+CROSSWALK = {
+    "маркет": ["marketing"],
+    "реклам": ["advertising", "marketing"],
+    "контент": ["content"],
+    "смм": ["smm", "targeting"],
+    "таргет": ["targeting"],
+    "дизайн": ["design"],
+    "розроб": ["it", "software"],
+    "програм": ["it", "software"],
+    "айті": ["it"],
+    "інвест": ["investor", "investment", "venture"],
+    "венчур": ["venture"],
+    "фінанс": ["finances"],
+    "бухгалт": ["accounting"],
+    "юрист": ["legal"],
+    "юридич": ["legal"],
+    "консалт": ["consulting"],
+    "консульт": ["consulting"],
+    "продаж": ["sales"],
+    "рекрут": ["hr", "recruitment"],
+    "кадр": ["hr", "recruitment"],
+    "нерухом": ["real", "estate"],
+    "будівн": ["construction"],
+    "освіт": ["education"],
+    "навчан": ["education"],
+    "ресторан": ["horeca"],
+    "готел": ["horeca", "hotel"],
+    "туриз": ["tourism"],
+    "крипт": ["cryptocurrency"],
+    "блокчейн": ["defi", "web3"],
+    "штучн": ["ai"],
+    "подій": ["event"],
+    "івент": ["event"],
+    "виробн": ["production"],
+    "медиц": ["healthcare"],
+    "здоров": ["healthcare"],
+    "краси": ["beauty"],
+    "косметол": ["beauty"],
+    "логіст": ["transport"],
+    "транспорт": ["transport"],
+    "роздріб": ["retail"],
+    "оптов": ["wholesale"],
+    "аграр": ["agriculture"],
+    "сільськ": ["agriculture"],
+    "енергет": ["energy"],
+    "спорт": ["sport"],
+    "фітнес": ["fitness"],
+    "медіа": ["media"],
+    "продукт": ["product"],
+    "аутсорс": ["outsource"],
+    "партнер": ["partnership"],
+    "ментор": ["mentoring"],
+    "волонт": ["volunteering"],
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, unify apostrophes and Unicode forms"""
+    return unicodedata.normalize("NFKC", text).translate(_APOSTROPHES).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Words of a text, lowercased, without stop words; hyphenated words also yield their parts"""
+    tokens = []
+    for word in TOKEN_RE.findall(normalize(text)):
+        for token in ([word, *word.split("-")] if "-" in word else (word,)):
+            if len(token) >= MIN_TOKEN_LENGTH and token not in STOP_WORDS:
+                tokens.append(token)
+    return tokens
+
+
+def _is_cyrillic(token: str) -> bool:
+    return "Ѐ" <= token[0] <= "ӿ"
+
+
+@lru_cache(maxsize=100000)
+def stem(token: str) -> str:
+    """Strip one inflectional suffix, keeping at least MIN_STEM_LENGTH characters"""
+    if _is_cyrillic(token):
+        for suffix in UKRAINIAN_SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                return token[:-len(suffix)]
+        return token
+
+    if token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        token = token[:-1]
+    for suffix in ("ing", "ed"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith("e") and len(token) > MIN_STEM_LENGTH:
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Index terms of a text: tokenized and stemmed"""
+    return [stem(token) for token in tokenize(text)]
+
+
+def _crosswalk_terms() -> List[tuple]:
+    return [(prefix, tuple(stem(word) for word in words)) for prefix, words in CROSSWALK.items()]
+
+
+_CROSSWALK_TERMS = _crosswalk_terms()
+
+
+def expand_terms(terms: Iterable[str]) -> List[str]:
+    """Query terms plus the English terms of matching Ukrainian stems"""
+    expanded = []
+    for term in terms:
+        expanded.append(term)
+        if _is_cyrillic(term):
+            for prefix, targets in _CROSSWALK_TERMS:
+                if term.startswith(prefix):
+                    expanded.extend(targets)
+    return expanded
+
+
+def analyze_query(text: str) -> List[str]:
+    """Index terms of a search query, including crosswalk expansions"""
+    return expand_terms(analyze(text))
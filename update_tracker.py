@@ -0,0 +1,119 @@
+"""
+Update bookkeeping for the Telegram bot.
+Bounded de-duplication of update ids and crash-safe offset tracking
+backed by the SQLite database.
+"""
+
+import json
+import threading
+import logging
+from collections import deque
+from typing import List
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+OFFSET_STATE_KEY = "update_offset"
+
+
+class UpdateDeduplicator:
+    """
+    Sliding window of the most recent update ids.
+    Memory stays flat: once `max_size` ids are remembered the oldest is forgotten.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(1, max_size)
+        self._order = deque()
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def add(self, update_id: int) -> bool:
+        """Remember an update id; returns False if it was already seen"""
+        with self._lock:
+            if update_id in self._ids:
+                return False
+            self._ids.add(update_id)
+            self._order.append(update_id)
+            if len(self._order) > self.max_size:
+                self._ids.discard(self._order.popleft())
+            return True
+
+    def discard(self, update_id: int):
+        """Forget an update id (e.g. when it could not be queued)"""
+        with self._lock:
+            if update_id in self._ids:
+                self._ids.discard(update_id)
+                self._order.remove(update_id)
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class OffsetTracker:
+    """
+    Tracks which updates are handled and persists the resume point.
+
+    Every accepted update is journaled in `pending_updates` until it has been
+    handled. The committed offset is the highest update id below which every
+    accepted update has been handled, and it only moves forward after an
+    update completes. On restart the journal is replayed and polling resumes
+    after the newest update the previous process saw.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._max_seen = int(database.get_bot_state(OFFSET_STATE_KEY, 0))
+        self.committed_offset = self._max_seen
+
+    def load_pending(self) -> List[dict]:
+        """Updates accepted by a previous process but never handled"""
+        updates = [json.loads(payload) for payload in self.database.get_pending_updates()]
+        with self._lock:
+            for update in updates:
+                self._in_flight.add(update["update_id"])
+                self._max_seen = max(self._max_seen, update["update_id"])
+        return updates
+
+    @property
+    def resume_offset(self) -> int:
+        """Last update id already received - polling continues after it"""
+        return self._max_seen
+
+    def begin(self, update: dict):
+        """Journal an accepted update before it is queued"""
+        update_id = update["update_id"]
+        self.database.add_pending_update(update_id, json.dumps(update, ensure_ascii=False))
+        with self._lock:
+            self._in_flight.add(update_id)
+            self._max_seen = max(self._max_seen, update_id)
+
+    def cancel(self, update_id: int):
+        """Drop an update that could not be queued"""
+        with self._lock:
+            self._in_flight.discard(update_id)
+        self.database.remove_pending_update(update_id)
+
+    def complete(self, update_id: int):
+        """Mark an update handled and advance the committed offset"""
+        self.database.remove_pending_update(update_id)
+        with self._lock:
+            self._in_flight.discard(update_id)
+            if self._in_flight:
+                offset = min(self._in_flight) - 1
+            else:
+                offset = self._max_seen
+            if offset <= self.committed_offset:
+                return
+            try:
+                # Written under the lock so offsets are never persisted out of order
+                self.database.set_bot_state(OFFSET_STATE_KEY, offset)
+                self.committed_offset = offset
+            except Exception as e:
+                logger.error(f"Error saving update offset {offset}: {e}")
@@ -0,0 +1,63 @@
+"""
+Webhook ingestion for the Telegram bot.
+Telegram POSTs each update as JSON; the endpoint checks the secret token
+header and hands the update straight to the bot's dispatcher.
+
+Local testing - POST a recorded update:
+    curl -X POST http://localhost:8080/telegram/webhook \
+         -H "Content-Type: application/json" \
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET_TOKEN" \
+         -d @update.json
+"""
+
+import hmac
+import logging
+from flask import Flask, request, jsonify
+from config import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# How long a webhook request may wait for room in a full dispatcher queue
+# before asking Telegram to redeliver later
+SUBMIT_TIMEOUT = 5
+
+
+def is_valid_secret_token(header_value: str) -> bool:
+    """
+    Check the secret token header Telegram sends with every webhook request.
+    Without a configured secret nothing is accepted.
+    """
+    if not WEBHOOK_SECRET_TOKEN:
+        return False
+    return hmac.compare_digest(header_value or "", WEBHOOK_SECRET_TOKEN)
+
+
+def create_webhook_app(bot) -> Flask:
+    """Create the Flask app that receives Telegram updates for `bot`"""
+    if not WEBHOOK_SECRET_TOKEN:
+        raise ValueError("WEBHOOK_SECRET_TOKEN is required in webhook mode")
+    app = Flask(__name__)
+
+    @app.route(WEBHOOK_PATH, methods=['POST'])
+    def telegram_webhook():
+        if not is_valid_secret_token(request.headers.get(SECRET_TOKEN_HEADER)):
+            logger.warning(f"🚫 Rejected webhook request with invalid secret token from {request.remote_addr}")
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        update = request.get_json(silent=True)
+        if not isinstance(update, dict) or "update_id" not in update:
+            return jsonify({'error': 'Invalid update'}), 400
+
+        if not bot.accept_update(update, timeout=SUBMIT_TIMEOUT):
+            # Non-2xx makes Telegram retry the delivery later
+            return jsonify({'error': 'Busy'}), 503
+
+        return jsonify({'ok': True})
+
+    @app.route('/health')
+    def health():
+        return jsonify({'ok': True, 'dispatcher': bot.dispatcher.get_stats()})
+
+    return app